@@ -1,7 +1,7 @@
 # Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
 # SPDX-License-Identifier: Apache-2.0
 
-from aws_cdk                         import Duration, aws_logs as logs, RemovalPolicy
+from aws_cdk                         import aws_logs as logs, RemovalPolicy
 from aws_cdk.aws_stepfunctions       import (
     StateMachine, 
     Parallel, 
@@ -9,6 +9,7 @@ from aws_cdk.aws_stepfunctions       import (
     Condition, 
     Wait,
     WaitTime, 
+    JsonPath,
     DefinitionBody, 
     LogOptions, 
     LogLevel
@@ -115,8 +116,9 @@ class PipelineMachineConstruct(Construct):
     def __get_process_step(self):
 
         parallel_state = Parallel(
-            scope = self,
-            id    = 'process' 
+            scope       = self,
+            id          = 'process',
+            result_path = JsonPath.DISCARD # keep the promote result, standby reads its standbySeconds
             )
 
         extract_step_begin = self.__get_process_chain(Process.EXTRACT)
@@ -200,5 +202,5 @@ class PipelineMachineConstruct(Construct):
         return Wait(
             scope = self,
             id    = Manager.STANDBY,
-            time  = WaitTime.duration(Duration.seconds(60))
+            time  = WaitTime.seconds_path('$.Payload.standbySeconds') # adapted to the backlog by the promote manager
         )
@@ -18,6 +18,7 @@ class Manager:
     PROCESS = 'process'
     CHECKUP = 'checkup'
     STANDBY = 'standby'
+    DISPATCH = 'dispatch'
 
 class PipelineManagerConstruct(Construct):
     def __init__(
@@ -27,6 +28,8 @@ class PipelineManagerConstruct(Construct):
         prefix : str,
         source : Path,
         common : Dict,
+        mode   : str = 'polling',
+        standby_max_seconds : int = 120,
         **kwargs,
     ) -> None:
 
@@ -36,6 +39,8 @@ class PipelineManagerConstruct(Construct):
         self.__prefix = prefix
         self.__source = source
         self.__common = common
+        self.__mode   = mode
+        self.__standby_max_seconds = standby_max_seconds
 
         self.__manager_lambdas = {}
 
@@ -44,6 +49,9 @@ class PipelineManagerConstruct(Construct):
         self.__create_restart_lambda()
         self.__create_promote_lambda()
 
+        if  self.__mode == 'event':
+            self.__create_dispatch_lambda()
+
     def get_manager_lambdas(self):
         """
         Returns constructed management lambda functions
@@ -52,6 +60,7 @@ class PipelineManagerConstruct(Construct):
             'startup' : aws_lambda.Function
             'breakup' : aws_lambda.Function
             'promote' : aws_lambda.Function
+            'dispatch': aws_lambda.Function (event mode only)
         }
         """
 
@@ -69,7 +78,12 @@ class PipelineManagerConstruct(Construct):
         self.__manager_lambdas[Manager.RESTART] = self.__create_lambda_function(Manager.RESTART, {})
 
     def __create_promote_lambda(self):
-        self.__manager_lambdas[Manager.PROMOTE] = self.__create_lambda_function(Manager.PROMOTE, {})
+        self.__manager_lambdas[Manager.PROMOTE] = self.__create_lambda_function(Manager.PROMOTE, {
+            'STANDBY_MAX_SECONDS' : str(self.__standby_max_seconds),
+        })
+
+    def __create_dispatch_lambda(self):
+        self.__manager_lambdas[Manager.DISPATCH] = self.__create_lambda_function(Manager.DISPATCH, {})
 
     def __create_lambda_function(self, manager, environ):
 
@@ -33,6 +33,21 @@ class Aspect:
     ACTOR = 'actor'
     AWAIT = 'await'
 
+class Bedrock:
+  # regions the cross region inference profiles of a geography route requests to
+    GEOGRAPHIES = {
+        'us'     : 'us-*',
+        'us-gov' : 'us-gov-*',
+        'eu'     : 'eu-*',
+        'apac'   : 'ap-*',
+        'jp'     : 'ap-northeast-*',
+        'au'     : 'ap-southeast-*',
+        'ca'     : 'ca-*',
+        'global' : '*',
+    }
+
+    DEFAULT_MODEL_ID = 'anthropic.claude-sonnet-4-6' # rhubarb's default model, used when EXTRACT_MODEL_ID is empty
+
 class PipelineProcessConstruct(Construct):
 
     def __init__(
@@ -46,6 +61,7 @@ class PipelineProcessConstruct(Construct):
         bucket,
         document_bucket_name,
         resource_bucket_name,
+        mode = 'polling',
         **kwargs,
     ) -> None:
 
@@ -60,6 +76,7 @@ class PipelineProcessConstruct(Construct):
         self.__resource_bucket_name = resource_bucket_name
         self.__bucket = bucket
         self.__liquid = liquid
+        self.__mode   = mode
 
         self.__stage_queues = {}
         self.__stage_topics = {}
@@ -74,6 +91,19 @@ class PipelineProcessConstruct(Construct):
         self.__create_stage_augment(stage = Process.AUGMENT)
         self.__create_stage_catalog(stage = Process.CATALOG)
 
+    def get_stage_queues(self):
+        """
+        Returns the constructed stage queues
+        {
+            'augment' : aws_sqs.Queue
+            'catalog' : aws_sqs.Queue
+            .
+            .
+        }
+        """
+
+        return self.__stage_queues
+
     def get_stage_actor_lambdas(self):
         """
         Returns the constructed lambda functions
@@ -237,12 +267,99 @@ class PipelineProcessConstruct(Construct):
         self.__stage_actor_lambdas[Process.EXTRACT].role.add_to_policy(
             statement = aws_iam.PolicyStatement(
                 effect    = aws_iam.Effect.ALLOW,
-                actions   = ["bedrock:InvokeModel"],
-                resources=[f'arn:aws:bedrock:{Aws.REGION}::foundation-model/anthropic.claude-3-sonnet-20240229-v1:0',]
+                actions   = ["bedrock:InvokeModel", "bedrock:InvokeModelWithResponseStream"],
+              # the extraction, routing and language models configured in cdk.json, through their inference profile
+                resources = self.__model_resources(self.__model_ids())
+            )
+        )
+
+        if  self.__common.get('EXTRACT_MODE') == 'batch':
+            self.__arm_batch_inference(stage)
+
+    def __arm_batch_inference(self, stage):
+
+      # batch jobs read their input from and write their output to the store under batch/
+        self.__bucket.grant_read_write(self.__srole_bedrock, 'batch/*')
+
+        self.__srole_bedrock.add_to_policy(
+            statement = aws_iam.PolicyStatement(
+                effect    = aws_iam.Effect.ALLOW,
+                actions   = ['bedrock:InvokeModel'],
+                resources = self.__model_resources(self.__model_ids()[:1])
+            )
+        )
+
+        begin = self.__stage_begin_lambdas[stage]
+        wait  = self.__stage_await_lambdas[stage]
+
+        begin.add_environment('BATCH_ROLE_ARN', self.__srole_bedrock.role_arn)
+
+        self.__srole_bedrock.grant_pass_role(begin)
+
+        begin.role.add_to_policy(
+            statement = aws_iam.PolicyStatement(
+                effect    = aws_iam.Effect.ALLOW,
+                actions   = ['bedrock:CreateModelInvocationJob'],
+                resources = [f'arn:aws:bedrock:{Aws.REGION}:{Aws.ACCOUNT_ID}:model-invocation-job/*',
+                             *self.__model_resources(self.__model_ids()[:1])]
             )
         )
 
+        wait.role.add_to_policy(
+            statement = aws_iam.PolicyStatement(
+                effect    = aws_iam.Effect.ALLOW,
+                actions   = ['bedrock:GetModelInvocationJob'],
+                resources = [f'arn:aws:bedrock:{Aws.REGION}:{Aws.ACCOUNT_ID}:model-invocation-job/*']
+            )
+        )
+
+
+
+    def __model_ids(self) -> List[str]:
+        """
+        Foundation ids of the models the extract stage invokes, EXTRACT_MODEL_ID first, then the routing and language models
+        """
+
+        models = [self.__common.get('EXTRACT_MODEL_ID') or Bedrock.DEFAULT_MODEL_ID]
+
+        models += self.__common.get('EXTRACT_ROUTE_MODELS', '').split(',')
+        models += [pair.split('=', 1)[-1] for pair in self.__common.get('EXTRACT_LANGUAGE_MODELS', '').split(',')]
+
+        ids = []
+
+        for model in [model.strip() for model in models if model.strip()]:
+
+            geography, _, rest = model.partition('.')
+            model              = rest if geography in Bedrock.GEOGRAPHIES and '.' in rest else model
+
+            if  model not in ids:
+                ids.append(model)
+
+        return ids
+
+    def __model_resources(self, models: List[str]) -> List[str]:
+        """
+        ARNs of the models invoked through the EXTRACT_CROSS_REGION inference profile, its profile and the foundation
+        models in the regions it routes to, or the foundation models in this region when it is 'none'
+        """
+
+        geography = self.__common.get('EXTRACT_CROSS_REGION', 'us')
+
+        if  geography not in Bedrock.GEOGRAPHIES:
+            return [f'arn:aws:bedrock:{Aws.REGION}::foundation-model/{model}' for model in models]
+
+        resources = []
+
+        for model in models:
+
+            resources += [f'arn:aws:bedrock:{Aws.REGION}:{Aws.ACCOUNT_ID}:inference-profile/{geography}.{model}',
+                          f'arn:aws:bedrock:{Bedrock.GEOGRAPHIES[geography]}::foundation-model/{model}']
+
+          # global profiles are authorized against the foundation model without a region
+            if  geography == 'global':
+                resources += [f'arn:aws:bedrock:::foundation-model/{model}']
 
+        return resources
 
     def __create_stage_operate(self, stage):
 
@@ -267,7 +384,9 @@ class PipelineProcessConstruct(Construct):
             scope      = self.__scope,
             id         = f'{self.__prefix}-queue-{stage}',
             queue_name = f'{self.__prefix}-queue-{stage}',
-            enforce_ssl=True
+            enforce_ssl=True,
+          # event source mappings require the visibility timeout to cover the await lambda timeout
+            visibility_timeout = Duration.minutes(15) if self.__mode == 'event' else None
         )
 
         return self.__stage_queues[stage]
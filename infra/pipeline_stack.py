@@ -3,9 +3,10 @@
 
 from aws_cdk import (
     aws_s3, aws_lambda, aws_dynamodb, Stack, RemovalPolicy, 
-    BundlingOptions,  Aws, DockerImage
+    BundlingOptions,  Aws, DockerImage, Duration
 
 )
+from aws_cdk.aws_lambda_event_sources import DynamoEventSource, SqsEventSource
 
 from constructs import Construct
 from pathlib import Path
@@ -40,6 +41,53 @@ class PipelineStack(Stack):
         self.__liquid = liquid
         self.__resource_bucket_name = resource_bucket_name
 
+      # 'polling' runs every stage on the state machine cycle, 'event' drives transitions from stream and queue events
+        self.__mode = (self.node.try_get_context('ENVIRONMENTS') or {}).get('PIPELINE_MODE', 'polling')
+
+      # 'true' runs the reshape step in the operate actor, documents go from operate straight to augment
+        self.__fuse_reshape = str((self.node.try_get_context('ENVIRONMENTS') or {}).get('FUSE_RESHAPE', 'false')).lower()
+
+      # 'true' hands the extracted tables from operate to reshape as Parquet, the review JSON written only for A2I
+        self.__columnar_tables = str((self.node.try_get_context('ENVIRONMENTS') or {}).get('COLUMNAR_TABLES', 'false')).lower()
+
+      # 'gzip' or 'zstd' compresses the JSON artifacts of the stages in the store from the given size on, 'none' stores them as they are
+        self.__artifact_encoding           = str((self.node.try_get_context('ENVIRONMENTS') or {}).get('ARTIFACT_ENCODING', 'none')).lower()
+        self.__artifact_encoding_min_bytes = str((self.node.try_get_context('ENVIRONMENTS') or {}).get('ARTIFACT_ENCODING_MIN_BYTES', '4096'))
+
+      # 'ondemand' extracts each document with its own Bedrock call, 'batch' submits backlogs as batch inference jobs
+        self.__extract_mode     = (self.node.try_get_context('ENVIRONMENTS') or {}).get('EXTRACT_MODE', 'ondemand')
+        self.__extract_model_id = (self.node.try_get_context('ENVIRONMENTS') or {}).get('EXTRACT_MODEL_ID', 'anthropic.claude-sonnet-4-6')
+
+      # cross region inference profile the models are invoked through, 'us' as rhubarb, 'eu', 'apac', 'global' or 'none'
+        self.__extract_cross_region = str((self.node.try_get_context('ENVIRONMENTS') or {}).get('EXTRACT_CROSS_REGION', 'us')).lower()
+
+      # comma separated models tried from the cheapest, escalating when the output fails its checks, '' to use one model
+        self.__extract_route_models = (self.node.try_get_context('ENVIRONMENTS') or {}).get('EXTRACT_ROUTE_MODELS', '')
+
+      # 'true' streams the extraction into the store as it arrives, aborting on schema violations or runaway output
+        self.__extract_stream = str((self.node.try_get_context('ENVIRONMENTS') or {}).get('EXTRACT_STREAM', 'false')).lower()
+
+      # 'true' marks the schema and instructions as a cacheable prompt prefix, schemas may override with 'x-prompt-cache'
+        self.__prompt_cache = str((self.node.try_get_context('ENVIRONMENTS') or {}).get('PROMPT_CACHE', 'false')).lower()
+
+      # 'enabled' answers duplicates of already extracted documents from cache/extract/ in the store without calling Bedrock
+        self.__result_cache = str((self.node.try_get_context('ENVIRONMENTS') or {}).get('RESULT_CACHE', 'disabled')).lower()
+
+      # 'true' detects the language of each document from its text layer to pick its prompt, output budget and model
+        self.__language_detection     = str((self.node.try_get_context('ENVIRONMENTS') or {}).get('LANGUAGE_DETECTION', 'true')).lower()
+        self.__extract_language_models = (self.node.try_get_context('ENVIRONMENTS') or {}).get('EXTRACT_LANGUAGE_MODELS', '')
+
+      # 'true' extracts born digital PDFs from their text layer with a text only prompt when its confidence is high enough
+        self.__extract_native_text            = str((self.node.try_get_context('ENVIRONMENTS') or {}).get('EXTRACT_NATIVE_TEXT', 'false')).lower()
+        self.__extract_native_text_confidence = str((self.node.try_get_context('ENVIRONMENTS') or {}).get('EXTRACT_NATIVE_TEXT_CONFIDENCE', '0.95'))
+
+      # pages per range when extracting long PDFs in parallel ranges, '0' extracts whole documents
+        self.__extract_chunk_pages = str((self.node.try_get_context('ENVIRONMENTS') or {}).get('EXTRACT_CHUNK_PAGES', '0'))
+
+      # client side Bedrock budgets per model shared by every actor, '0' leaves the quota to Bedrock throttling
+        self.__bedrock_requests_per_minute = str((self.node.try_get_context('ENVIRONMENTS') or {}).get('BEDROCK_REQUESTS_PER_MINUTE', '0'))
+        self.__bedrock_tokens_per_minute   = str((self.node.try_get_context('ENVIRONMENTS') or {}).get('BEDROCK_TOKENS_PER_MINUTE',   '0'))
+
         self.__bucket_name = f'{self.__prefix}-store-document-{self.__suffix}'
 
         self.__bucket = aws_s3.Bucket(
@@ -51,6 +99,18 @@ class PipelineStack(Stack):
             auto_delete_objects      = True,
             versioned=True,
             enforce_ssl=True,
+            lifecycle_rules          = [
+                aws_s3.LifecycleRule(
+                    prefix                        = 'bus/', # oversized stage queue message bodies
+                    expiration                    = Duration.days(14),
+                    noncurrent_version_expiration = Duration.days(1),
+                ),
+                aws_s3.LifecycleRule(
+                    prefix                        = 'cache/', # content addressed actor results, time to live
+                    expiration                    = Duration.days(30),
+                    noncurrent_version_expiration = Duration.days(1),
+                )
+            ],
             cors                     = [
                 aws_s3.CorsRule(
                     allowed_methods=[
@@ -119,6 +179,7 @@ class PipelineStack(Stack):
             partition_key   = aws_dynamodb.Attribute(name = table_pk, type = aws_dynamodb.AttributeType.STRING),
           # sort_key        = aws_dynamodb.Attribute(name = table_sk, type = aws_dynamodb.AttributeType.STRING), # do not want sk -> access item with just DocumentID
             removal_policy  = RemovalPolicy.DESTROY,
+            stream          = aws_dynamodb.StreamViewType.NEW_AND_OLD_IMAGES if self.__mode == 'event' else None,
         )
 
         self.__mcp_table_pipeline.add_global_secondary_index(
@@ -128,6 +189,16 @@ class PipelineStack(Stack):
             projection_type = aws_dynamodb.ProjectionType.ALL,
         )
 
+      # Bedrock requests and tokens per minute budgets shared by the concurrent actors, one item per bucket
+        self.__mcp_table_limiter = aws_dynamodb.Table(
+            scope           = self,
+            id              = f'{self.__prefix}-table-limiter',
+            table_name      = f'{self.__prefix}-table-limiter',
+            partition_key   = aws_dynamodb.Attribute(name = 'Bucket', type = aws_dynamodb.AttributeType.STRING),
+            billing_mode    = aws_dynamodb.BillingMode.PAY_PER_REQUEST,
+            removal_policy  = RemovalPolicy.DESTROY,
+        )
+
         self.__mcp_store_document = self.__bucket
 
         self.__common_variables = {
@@ -138,6 +209,25 @@ class PipelineStack(Stack):
             'SUFFIX'         : self.__suffix,
             'ACCOUNT'        : Aws.ACCOUNT_ID,
             'REGION'         : Aws.REGION,
+            'PIPELINE_MODE'  : self.__mode,
+            'FUSE_RESHAPE'   : self.__fuse_reshape,
+            'COLUMNAR_TABLES' : self.__columnar_tables,
+            'ARTIFACT_ENCODING' : self.__artifact_encoding,
+            'ARTIFACT_ENCODING_MIN_BYTES' : self.__artifact_encoding_min_bytes,
+            'EXTRACT_MODE'   : self.__extract_mode,
+            'EXTRACT_MODEL_ID' : self.__extract_model_id,
+            'EXTRACT_CROSS_REGION' : self.__extract_cross_region,
+            'EXTRACT_CHUNK_PAGES' : self.__extract_chunk_pages,
+            'EXTRACT_ROUTE_MODELS' : self.__extract_route_models,
+            'EXTRACT_STREAM' : self.__extract_stream,
+            'PROMPT_CACHE'   : self.__prompt_cache,
+            'RESULT_CACHE'   : self.__result_cache,
+            'LANGUAGE_DETECTION' : self.__language_detection,
+            'EXTRACT_LANGUAGE_MODELS' : self.__extract_language_models,
+            'EXTRACT_NATIVE_TEXT' : self.__extract_native_text,
+            'EXTRACT_NATIVE_TEXT_CONFIDENCE' : self.__extract_native_text_confidence,
+            'BEDROCK_REQUESTS_PER_MINUTE' : self.__bedrock_requests_per_minute,
+            'BEDROCK_TOKENS_PER_MINUTE'   : self.__bedrock_tokens_per_minute,
         }
 
       # Constructs Pipeline Stage Process Lambdas
@@ -150,7 +240,8 @@ class PipelineStack(Stack):
             bucket = self.__mcp_store_document,
             document_bucket_name = self.__bucket_name,
             resource_bucket_name = self.__resource_bucket_name,
-            liquid = self.__liquid
+            liquid = self.__liquid,
+            mode   = self.__mode
         )
 
       # Constructs Pipeline Progress Manager Lambdas
@@ -159,7 +250,9 @@ class PipelineStack(Stack):
             id     = f'{self.__prefix}-pipeline-manager',
             prefix = self.__prefix,
             source = self.__source,
-            common = self.__common_variables
+            common = self.__common_variables,
+            mode   = self.__mode,
+            standby_max_seconds = 300 if self.__mode == 'event' else 120 # only sweeps in event mode
         )
 
       # Constructs Pipeline Startup Trigger Lambdas
@@ -189,6 +282,43 @@ class PipelineStack(Stack):
         )
 
         pipeline_trigger_construct.arm_s3_trigger()
+
+        if  self.__mode == 'event':
+            self.__arm_event_sources(pipeline_process_construct, pipeline_manager_construct)
+
+    def __arm_event_sources(self,
+                            pipeline_process_construct : PipelineProcessConstruct,
+                            pipeline_manager_construct : PipelineManagerConstruct):
+
+        dispatch_lambda = pipeline_manager_construct.get_manager_lambdas()['dispatch']
+
+      # table stream → dispatch manager promotes SUCCESS documents and launches begin processors for WAITING ones
+        dispatch_lambda.add_event_source(
+            DynamoEventSource(
+                table               = self.__mcp_table_pipeline,
+                starting_position   = aws_lambda.StartingPosition.LATEST,
+                batch_size          = 100,
+                max_batching_window = Duration.seconds(1),
+                retry_attempts      = 3,
+                filters             = [
+                    aws_lambda.FilterCriteria.filter({'eventName' : aws_lambda.FilterRule.or_('INSERT', 'MODIFY')})
+                ]
+            )
+        )
+
+        for lambda_function in pipeline_process_construct.get_stage_begin_lambdas().values():
+            lambda_function.grant_invoke(dispatch_lambda)
+
+      # actor completion messages → await processors, as soon as they are published
+        for stage, lambda_function in pipeline_process_construct.get_stage_await_lambdas().items():
+            lambda_function.add_event_source(
+                SqsEventSource(
+                    queue                      = pipeline_process_construct.get_stage_queues()[stage],
+                    batch_size                 = 10,
+                    max_batching_window        = Duration.seconds(1),
+                    report_batch_item_failures = True
+                )
+            )
       
 
     def __grant_persistence_permissions(self,
@@ -199,12 +329,17 @@ class PipelineStack(Stack):
         for lambda_function in pipeline_manager_construct.get_manager_lambdas().values() :
             self.__mcp_table_pipeline.grant_read_write_data(lambda_function)
 
+      # promote manager sizes the standby from the stage queue depths
+        for queue in pipeline_process_construct.get_stage_queues().values() :
+            queue.grant(pipeline_manager_construct.get_manager_lambdas()['promote'], 'sqs:GetQueueUrl', 'sqs:GetQueueAttributes')
+
         for lambda_function in pipeline_process_construct.get_stage_await_lambdas().values() :
             self.__mcp_table_pipeline.grant_read_write_data(lambda_function)
             self.__mcp_store_document.grant_read_write(lambda_function)
 
         for lambda_function in pipeline_process_construct.get_stage_actor_lambdas().values() :
             self.__mcp_table_pipeline.grant_read_write_data(lambda_function)
+            self.__mcp_table_limiter.grant_read_write_data(lambda_function)
             self.__mcp_store_document.grant_read_write(lambda_function)
 
         for lambda_function in pipeline_process_construct.get_stage_begin_lambdas().values() :
@@ -0,0 +1,73 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+"""
+Content-Encoding of the artifacts stored by S3Uri, gzip against zstd on an extraction and on the review document
+converted from it.
+
+Synthetic invoices with many line items are encoded with each codec at the level Codec uses, reporting the bytes
+stored, the share saved and the seconds to encode and decode, and checking that decoding brings the bytes back.
+
+    python -m bench.artifact_encoding --items 100 1000 10000
+"""
+
+from argparse import ArgumentParser
+from json     import dumps
+from time     import perf_counter
+
+from shared.storage  import Codec, ContentEncoding
+from shared.textract import TextractFormat
+
+def invoice(items: int) -> dict:
+
+    return {
+        'invoice_number' : 'INV-0001',
+        'invoice_date'   : '2024-06-05',
+        'vendor'         : {'name' : 'AWSomecompany d.o.o.', 'address' : {'street' : 'Domovinskog rata 1/B', 'city' : 'Solin'}},
+        'line_items'     : [
+            {'item_code' : f'{index:06d}', 'description' : f'Item {index % 50}', 'quantity' : index % 7 + 1, 'unit_price' : 12.5, 'total_price' : 12.5 * (index % 7 + 1)}
+            for index in range(items)
+        ],
+        'totals'         : {'subtotal' : 1000.0, 'tax' : 250.0, 'total' : 1250.0},
+    }
+
+def timed(function):
+
+    started = perf_counter()
+    result  = function()
+
+    return result, perf_counter() - started
+
+if  __name__ == '__main__':
+
+    parser = ArgumentParser(description = 'gzip against zstd Content-Encoding of stage artifacts')
+
+    parser.add_argument('--items', type = int, nargs = '+', default = [100, 1000, 10000], help = 'line items per invoice')
+
+    args = parser.parse_args()
+
+    print(f'{"items":>6} {"artifact":>10} {"encoding":>8} {"KiB":>9} {"saved":>6} {"encode s":>9} {"decode s":>9} {"same":>5}')
+
+    for items in args.items:
+
+        doc       = invoice(items)
+        artifacts = {
+            'extract' : dumps(doc).encode(),
+            'review'  : dumps(TextractFormat.Convert(TextractFormat.Events(doc), 'invoice.pdf')).encode(),
+        }
+
+        for name, body in artifacts.items():
+
+            print(f'{items:>6} {name:>10} {"none":>8} {len(body) / 1024:>9.1f}')
+
+            for encoding in [ContentEncoding.GZIP, ContentEncoding.ZSTD]:
+
+                stored, encode  = timed(lambda: Codec.Encode(body, encoding))
+                decoded, decode = timed(lambda: b''.join(Codec.Decode([stored], encoding)))
+
+                print(
+                    f'{items:>6} {name:>10} {encoding:>8} {len(stored) / 1024:>9.1f} {1 - len(stored) / len(body):>6.1%} '
+                    f'{encode:>9.4f} {decode:>9.4f} {str(decoded == body):>5}'
+                )
+
+        print()
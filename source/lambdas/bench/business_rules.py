@@ -0,0 +1,169 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+"""
+Business rules of the operate stage, compiled into column operations over the line item frame, against the same
+rules applied value by value in Python.
+
+The sample rules in data/invoice_rules.json run over synthetic Croatian invoices with many line items, amounts and
+dates written as strings the way a decimal comma locale writes them. Compilation, each rule and the value by value
+baseline are timed, and both outputs compared. Tables under RULES_VECTOR_ROWS rows are transformed value by value by
+the compiled rules as well, RULES_VECTOR_ROWS=0 times the column operations at every size.
+
+    python -m bench.business_rules --items 100 10000 100000
+"""
+
+from argparse import ArgumentParser
+from datetime import datetime
+from json     import load
+from os.path  import dirname, join
+from re       import sub
+from time     import perf_counter
+from unicodedata import normalize
+
+from shared.rules    import RuleSet
+from shared.tables   import Tables
+from shared.textract import TextractFormat
+
+DATA = join(dirname(__file__), '..', '..', '..', 'data')
+
+def invoice(items: int) -> dict:
+
+    return {
+        'invoice_number' : 'RN-2024-0001',
+        'issue_date'     : '05.06.2024.',
+        'due_date'       : '5. 7. 2024.',
+        'issuer'         : {'name' : ' AWSomecompany  d.o.o.', 'address' : 'Domovinskog rata 1/B, Solin', 'identifier' : ''},
+        'line_items'     : [
+            {
+                'product_id'       : f'ＰＲ-{index:06d}',
+                'description'      : f'  Artikl   {index} ',
+                'quantity'         : f'{index % 7 + 1}',
+                'unit_price'       : '1.234,50 €',
+                'discount'         : '0,00',
+                'discounted_price' : '1.234,50',
+                'tax_rate'         : '25,00',
+                'total_price'      : f'{1234.5 * (index % 7 + 1):,.2f}'.replace(',', ' ').replace('.', ','),
+            }
+            for index in range(items)
+        ],
+        'totals'         : {'subtotal' : '', 'discount' : '0,00', 'tax' : '', 'total' : ''},
+    }
+
+# region Value by value
+
+def number(value):
+
+    if  not isinstance(value, str):
+        return value
+
+    text = sub(r'[^\d,\-]', '', normalize('NFKC', value).replace('.', '')).replace(',', '.')
+
+    try:
+        return float(text) if '.' in text else int(text)
+    except ValueError:
+        return value
+
+def date(value):
+
+    text = sub(r'\s*([./-])\s*', r'\1', normalize('NFKC', value).strip().rstrip('.'))
+
+    for pattern in ['%Y-%m-%d', '%d.%m.%Y', '%d/%m/%Y']:
+        try:
+            return datetime.strptime(text, pattern).strftime('%Y-%m-%d')
+        except ValueError:
+            pass
+
+    return value
+
+def by_value(doc: dict, vendors: dict) -> dict:
+
+    for item in doc['line_items']:
+
+        for key in ['product_id', 'description']:
+            item[key] = ' '.join(normalize('NFKC', item[key]).split())
+
+        for key in ['quantity', 'unit_price', 'discount', 'discounted_price', 'tax_rate', 'total_price']:
+            item[key] = number(item[key])
+
+        if  item['total_price'] is None:
+            item['total_price'] = round(item['quantity'] * item['discounted_price'], 2)
+
+    for key in ['subtotal', 'discount', 'tax', 'total']:
+        doc['totals'][key] = number(doc['totals'][key])
+
+    if  doc['totals']['subtotal'] in (None, ''):
+        doc['totals']['subtotal'] = round(sum(item['total_price'] for item in doc['line_items']), 2)
+
+    doc['issue_date'] = date(doc['issue_date'])
+    doc['due_date']   = date(doc['due_date'])
+
+    if  not doc['issuer']['identifier']:
+        doc['issuer']['identifier'] = vendors.get(' '.join(normalize('NFKC', doc['issuer']['name']).casefold().split()), '')
+
+    return doc
+
+# endregion
+
+if  __name__ == '__main__':
+
+    parser = ArgumentParser(description = 'Compiled column rules against value by value rules')
+
+    parser.add_argument('--items', type = int, nargs = '+', default = [100, 10000, 100000], help = 'line items per invoice')
+    parser.add_argument('--rules', default = join(DATA, 'invoice_rules.json'), help = 'rules file')
+
+    args = parser.parse_args()
+    body = load(open(args.rules))
+
+    # the baseline's vendor table, names and aliases normalized as the lookup rule does
+    lookup  = next(spec for spec in body['rules'] if spec['type'] == 'lookup')
+    vendors = {
+        ' '.join(normalize('NFKC', name).casefold().split()) : entry['identifier']
+        for entry in lookup['entries'] for name in [entry['name'], *entry.get('aliases', [])]
+    }
+
+    started = perf_counter()
+    rules   = RuleSet(Name = 'invoice', Body = body, ETag = '')
+    compile = perf_counter() - started
+
+    print(f'compiled {len(rules.Rules)} rules in {compile * 1000:.1f} ms, once per warm container\n')
+    print(f'{"items":>7} {"rule":<20} {"ms":>9} {"changes":>8} {"faults":>7}')
+
+    # a warm container has run the rules before, the first run pays for lazy imports and regex compilation
+    rules.Apply(Tables(rules.Tables).Read(TextractFormat.Events(invoice(10))).Frames, 'hr')
+
+    for items in args.items:
+
+        doc, copy = invoice(items), invoice(items)
+
+        started = perf_counter()
+        tables  = Tables(rules.Tables).Read(TextractFormat.Events(doc))
+        read    = perf_counter() - started
+
+        results = rules.Apply(tables.Frames, 'hr')
+
+        started = perf_counter()
+        events  = list(tables.Events())
+        written = perf_counter() - started
+
+        print(f'{items:>7} {"(frames)":<20} {read * 1000:>9.1f}')
+
+        for result in results:
+            print(f'{items:>7} {result.Name:<20} {result.Seconds * 1000:>9.1f} {result.Changes:>8} {result.Faults:>7}')
+
+        print(f'{items:>7} {"(events)":<20} {written * 1000:>9.1f}')
+
+        started  = perf_counter()
+        by_value(copy, vendors)
+        baseline = perf_counter() - started
+
+        total = read + sum(result.Seconds for result in results) + written
+
+        print(f'{items:>7} {"compiled total":<20} {total * 1000:>9.1f}')
+        print(f'{items:>7} {"value by value":<20} {baseline * 1000:>9.1f}')
+
+        # both outputs hold the same values
+        compiled = TextractFormat.Convert(iter(events), 'bench')
+        expected = TextractFormat.Convert(TextractFormat.Events(copy), 'bench')
+
+        print(f'{items:>7} {"same output":<20} {str(compiled == expected):>9}\n')
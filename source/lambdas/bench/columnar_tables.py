@@ -0,0 +1,93 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+"""
+Tables handed from the operate stage to the reshape stage, as the review table JSON operate used to write, as the
+JSON of the extraction and as Parquet, reporting bytes stored, seconds to write and seconds for reshape to read
+the tables back as frames, and checking that all three bring the same review format back.
+
+    python -m bench.columnar_tables --items 1000 10000 100000
+"""
+
+from argparse import ArgumentParser
+from io       import BytesIO
+from time     import perf_counter
+
+import pyarrow.parquet as pq
+
+from shared.defines  import dumps, loads
+from shared.tables   import Columnar, Tables
+from shared.textract import TextractFormat
+
+DOCUMENT = 'statement.pdf'
+
+class Sink:
+    """
+    Stands in for S3Uri.Writer
+    """
+
+    def __init__(self):
+        self.parts = []
+
+    def Write(self, data: bytes):
+        self.parts.append(data)
+
+    def Body(self) -> bytes:
+        return b''.join(self.parts)
+
+def statement(items: int) -> dict:
+
+    return {
+        'account'      : {'holder' : 'AWSomecompany d.o.o.', 'iban' : 'HR1210010051863000160'},
+        'period'       : '2024-06',
+        'transactions' : [
+            {'date' : f'2024-06-{index % 30 + 1:02d}', 'reference' : f'TX-{index:08d}', 'description' : f'Payment {index % 97}', 'amount' : round(index * 1.25 % 1000, 2), 'balance' : round(index * 3.5, 2)}
+            for index in range(items)
+        ],
+        'totals'       : {'credit' : 1000.0, 'debit' : 250.0},
+    }
+
+def timed(function):
+
+    started = perf_counter()
+    result  = function()
+
+    return result, perf_counter() - started
+
+if  __name__ == '__main__':
+
+    parser = ArgumentParser(description = 'Review JSON, extraction JSON and Parquet tables handed from operate to reshape')
+
+    parser.add_argument('--items', type = int, nargs = '+', default = [1000, 10000, 100000], help = 'transactions per statement')
+
+    args = parser.parse_args()
+
+    print(f'{"items":>7} {"format":>8} {"KiB":>9} {"write s":>8} {"read s":>8} {"same":>5}')
+
+    for items in args.items:
+
+        tables   = Tables().Read(TextractFormat.Events(statement(items)))
+        expected = dumps(TextractFormat.Convert(tables.Events(), DOCUMENT))
+
+        # review: the converted document, reshape loads and frames it again
+        sink = Sink()
+        _, write = timed(lambda: TextractFormat.Write(tables.Events(), DOCUMENT, sink))
+        body     = sink.Body()
+        _, read  = timed(lambda: loads(body))
+        print(f'{items:>7} {"review":>8} {len(body) / 1024:>9.1f} {write:>8.3f} {read:>8.3f} {str(body.decode() == expected):>5}')
+
+        # json: the tables as an extraction, scanned back into frames
+        sink = Sink()
+        _, write     = timed(lambda: tables.Write(sink))
+        body         = sink.Body()
+        frames, read = timed(lambda: Tables().Read(TextractFormat.Scan([body])))
+        same         = dumps(TextractFormat.Convert(frames.Events(), DOCUMENT)) == expected
+        print(f'{items:>7} {"json":>8} {len(body) / 1024:>9.1f} {write:>8.3f} {read:>8.3f} {str(same):>5}')
+
+        # parquet: a file per frame, decoded into frames without parsing text
+        files, write = timed(lambda: {name : Columnar.Serialize(Columnar.Encode(frame)) for name, frame in tables.Frames.items()})
+        frames, read = timed(lambda: {name : Columnar.Decode(pq.read_table(BytesIO(file))) for name, file in files.items()})
+        copy         = Tables()
+        copy.order, copy.arrays, copy.Frames = tables.order, tables.arrays, frames
+        same         = dumps(TextractFormat.Convert(copy.Events(), DOCUMENT)) == expected
+        print(f'{items:>7} {"parquet":>8} {sum(map(len, files.values())) / 1024:>9.1f} {write:>8.3f} {read:>8.3f} {str(same):>5}\n')
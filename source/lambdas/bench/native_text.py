@@ -0,0 +1,107 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+"""
+Rendered pages against the text layer over the sample documents in data/.
+
+Each sample, repeated into longer documents, is extracted once from its pages and once from its text layer, and the
+text layer confidence, latency, input and output tokens of both paths are reported, with the share of the top level
+fields on which their outputs agree. Run from source/lambdas, as a module of the bench package.
+
+Simulated model, no AWS calls, latency grows with the input and output tokens of each request:
+    python -m bench.native_text --pages 1 4 8
+
+Bedrock, with credentials and EXTRACT_MODEL_ID or the rhubarb default model:
+    python -m bench.native_text --bedrock --pages 1
+"""
+
+from argparse import ArgumentParser
+from base64   import b64decode
+from glob     import glob
+from json     import dumps, load
+from os.path  import basename, dirname, join
+from time     import sleep, time
+
+from bench.page_extraction import repeat
+from shared.inference  import Inference
+from shared.pdf        import Pdf
+from shared.textlayer  import NativeText
+
+DATA = join(dirname(__file__), '..', '..', '..', 'data')
+
+class SimulatedModel:
+    """
+    Answers an extraction request after a latency of base + input tokens / input_rate + output tokens / tokens_per_second,
+    a rendered page costing Inference.PageTokens input tokens and the vision encoder per_page seconds
+    """
+
+    def __init__(self, base = 1.0, per_page = 0.8, input_rate = 8000.0, tokens_per_second = 60.0, output_tokens = 900, speedup = 1.0):
+
+        self.base              = base
+        self.per_page          = per_page
+        self.input_rate        = input_rate
+        self.tokens_per_second = tokens_per_second
+        self.output_tokens     = output_tokens
+        self.speedup           = speedup # divides the sleeps, reported latencies are scaled back
+
+    def __call__(self, request, model_id = None):
+
+        content = request['messages'][0]['content']
+        pages   = sum(Pdf.PageCount(b64decode(block['source']['data'])) for block in content if block['type'] == 'document')
+        tokens  = Inference.EstimateTokens(request) - request['max_tokens']
+
+        sleep((self.base + pages * self.per_page + tokens / self.input_rate + self.output_tokens / self.tokens_per_second) / self.speedup)
+
+        body = {'invoice_number' : 'INV-1', 'line_items' : []}
+
+        return {'content' : [{'type' : 'text', 'text' : f'```json\n{dumps(body)}\n```'}], 'usage' : {'input_tokens' : tokens, 'output_tokens' : self.output_tokens}}
+
+def extract(content, media_type, schema, invoke, max_tokens):
+
+    started  = time()
+    response = invoke(Inference.Request(content, media_type, schema, max_tokens = max_tokens))
+
+    return Inference.ParseOutput(response), Inference.Usage(response), time() - started
+
+def agreement(first, second) -> float:
+
+    if  not isinstance(first, dict) or not isinstance(second, dict):
+        return 0.0
+
+    keys = set(first) | set(second)
+
+    return sum(1 for key in keys if first.get(key) == second.get(key)) / len(keys) if keys else 1.0
+
+if  __name__ == '__main__':
+
+    parser = ArgumentParser(description = 'Rendered pages against the text layer over the sample documents')
+
+    parser.add_argument('--pages',      type = int, nargs = '+', default = [1, 4, 8], help = 'document lengths to build')
+    parser.add_argument('--max-tokens', type = int, default = 5000, help = 'output tokens per request')
+    parser.add_argument('--speedup',    type = float, default = 20.0, help = 'simulated model runs this much faster than reported')
+    parser.add_argument('--bedrock',    action = 'store_true', help = 'call Bedrock instead of the simulated model')
+
+    args   = parser.parse_args()
+    schema = load(open(join(DATA, 'invoice_schema.json')))
+    invoke = Inference.Invoke if args.bedrock else SimulatedModel(speedup = args.speedup)
+    scale  = 1.0 if args.bedrock else args.speedup
+
+    print(f'{"document":<24} {"pages":>5} {"path":>5} {"conf":>5} {"analyze":>8} {"seconds":>8} {"in tokens":>10} {"out tokens":>10} {"agree":>6}')
+
+    for path in sorted(glob(join(DATA, '*.pdf'))):
+        for pages in args.pages:
+
+            content = repeat(path, pages)
+
+            started = time()
+            layer   = NativeText.Analyze(content)
+            analyze = time() - started
+
+            image, image_usage, image_elapsed = extract(content, 'application/pdf', schema, invoke, args.max_tokens)
+            text,  text_usage,  text_elapsed  = extract(layer.Text.encode('utf-8'), NativeText.MediaType, schema, invoke, args.max_tokens)
+
+            # model time is scaled back from the simulation, the local analysis of the text layer is not
+            for name, usage, elapsed, local in [('image', image_usage, image_elapsed, 0.0), ('text', text_usage, text_elapsed, analyze)]:
+
+                print(f'{basename(path):<24} {pages:>5} {name:>5} {layer.Confidence:>5.2f} {local:>8.3f} {elapsed * scale + local:>8.1f} '
+                      f'{usage["input_tokens"]:>10} {usage["output_tokens"]:>10} {agreement(image, text):>6.2f}')
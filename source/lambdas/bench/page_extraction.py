@@ -0,0 +1,133 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+"""
+Whole document against page range extraction over the sample documents in data/.
+
+The single page samples are repeated into longer documents, each is extracted whole and in page ranges of every
+chunk size, and latency, tokens, merged line items and truncation are reported.
+
+Simulated model, no AWS calls, latency grows with the pages and output tokens of each request:
+    python -m bench.page_extraction --pages 1 4 8 16 --chunks 1 2 4
+
+Bedrock, with credentials and EXTRACT_MODEL_ID or the rhubarb default model:
+    python -m bench.page_extraction --bedrock --pages 4 --chunks 1 2
+"""
+
+from argparse import ArgumentParser
+from base64   import b64decode
+from glob     import glob
+from io       import BytesIO
+from json     import dumps, load
+from os.path  import basename, dirname, join
+from re       import search
+from time     import sleep, time
+
+from pypdfium2 import PdfDocument
+
+from shared.extraction import PageExtraction
+from shared.inference  import Inference
+
+DATA = join(dirname(__file__), '..', '..', '..', 'data')
+
+class SimulatedModel:
+    """
+    Answers an extraction request after a latency of base + pages * per_page + output tokens / tokens_per_second,
+    with one line item per page and output cut off at max_tokens like a real model
+    """
+
+    def __init__(self, base = 1.5, per_page = 0.8, tokens_per_second = 60.0, tokens_per_page = 700, speedup = 1.0):
+
+        self.base              = base
+        self.per_page          = per_page
+        self.tokens_per_second = tokens_per_second
+        self.tokens_per_page   = tokens_per_page
+        self.speedup           = speedup # divides the sleeps, reported latencies are scaled back
+
+    def __call__(self, request):
+
+        content = request['messages'][0]['content']
+        pages   = PdfDocument(b64decode(content[0]['source']['data']))
+        count   = len(pages)
+        first   = int((search(r'pages (\d+) to', content[1]['text']) or [None, 1])[1])
+
+        needed  = 150 + count * self.tokens_per_page
+        output  = min(needed, request['max_tokens'])
+
+        sleep((self.base + count * self.per_page + output / self.tokens_per_second) / self.speedup)
+
+        body = {
+            'invoice_number' : 'INV-1',
+            'line_items'     : [{'description' : f'page {first + n}', 'total_price' : 1.0} for n in range(count)],
+        }
+
+        # a cut off answer is not valid JSON, like a real truncated completion
+        text = f'```json\n{dumps(body)}\n```' if output == needed else f'```json\n{dumps(body)[:output]}'
+
+        return {'content' : [{'type' : 'text', 'text' : text}], 'usage' : {'input_tokens' : 1600 * count, 'output_tokens' : output}}
+
+def repeat(path, pages):
+
+    source = PdfDocument(path)
+    target = PdfDocument.new()
+
+    for _ in range(pages):
+        target.import_pages(source, [0])
+
+    buffer = BytesIO()
+    target.save(buffer)
+
+    return buffer.getvalue()
+
+def extract_whole(content, schema, invoke, max_tokens):
+
+    started  = time()
+    response = invoke(Inference.Request(content, 'application/pdf', schema, max_tokens = max_tokens))
+    output   = Inference.ParseOutput(response)
+
+    return output, Inference.Usage(response), time() - started
+
+if  __name__ == '__main__':
+
+    parser = ArgumentParser(description = 'Whole document against page range extraction over the sample documents')
+
+    parser.add_argument('--pages',      type = int, nargs = '+', default = [1, 4, 8, 16], help = 'document lengths to build')
+    parser.add_argument('--chunks',     type = int, nargs = '+', default = [1, 2, 4],     help = 'pages per range')
+    parser.add_argument('--workers',    type = int, default = 4,    help = 'ranges extracted at a time')
+    parser.add_argument('--max-tokens', type = int, default = 5000, help = 'output tokens per request')
+    parser.add_argument('--speedup',    type = float, default = 20.0, help = 'simulated model runs this much faster than reported')
+    parser.add_argument('--bedrock',    action = 'store_true', help = 'call Bedrock instead of the simulated model')
+
+    args   = parser.parse_args()
+    schema = load(open(join(DATA, 'invoice_schema.json')))
+    model  = None if args.bedrock else SimulatedModel(speedup = args.speedup)
+    invoke = Inference.Invoke if args.bedrock else model
+    scale  = 1.0 if args.bedrock else args.speedup
+
+    print(f'{"document":<24} {"pages":>5} {"chunk":>5} {"requests":>8} {"seconds":>8} {"in tokens":>10} {"out tokens":>10} {"items":>5} {"valid":>5}')
+
+    for path in sorted(glob(join(DATA, '*.pdf'))):
+        for pages in args.pages:
+
+            content = repeat(path, pages)
+
+            output, usage, elapsed = extract_whole(content, schema, invoke, args.max_tokens)
+            items = len(output.get('line_items', [])) if output else 0
+
+            print(f'{basename(path):<24} {pages:>5} {"whole":>5} {1:>8} {elapsed * scale:>8.1f} '
+                  f'{usage["input_tokens"]:>10} {usage["output_tokens"]:>10} {items:>5} {str(output is not None):>5}')
+
+            for chunk in args.chunks:
+
+                if  chunk >= pages:
+                    continue
+
+                try:
+                    result = PageExtraction.Run(content, schema, chunk_pages = chunk, workers = args.workers, max_tokens = args.max_tokens, invoke = invoke)
+                except Exception:
+                    print(f'{basename(path):<24} {pages:>5} {chunk:>5} {"-":>8} {"-":>8} {"-":>10} {"-":>10} {0:>5} {"False":>5}')
+                    continue
+
+                print(f'{basename(path):<24} {pages:>5} {chunk:>5} {result["chunks"]:>8} {result["elapsed"] * scale:>8.1f} '
+                      f'{result["token_usage"]["input_tokens"]:>10} {result["token_usage"]["output_tokens"]:>10} '
+                      f'{len(result["output"].get("line_items", [])):>5} {"True":>5}')
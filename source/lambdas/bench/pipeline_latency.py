@@ -0,0 +1,189 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+"""
+End-to-end per document latency of the polling and event pipeline modes.
+
+Simulates both modes locally with the same arrivals and actor service times:
+    python -m bench.pipeline_latency --documents 500 --arrival-seconds 300
+
+With --fused also simulates both with the reshape step run in the operate actor (FUSE_RESHAPE), one stage less:
+    python -m bench.pipeline_latency --fused
+
+Measures a deployed pipeline from the stamps recorded on its documents, from ingestion to the last stage finishing:
+    python -m bench.pipeline_latency --table
+"""
+
+from argparse   import ArgumentParser
+from datetime   import datetime
+from heapq      import heappush, heappop
+from random     import Random
+from statistics import mean, quantiles
+
+STAGES = ['extract', 'operate', 'reshape', 'augment', 'catalog']
+
+# mean actor seconds per stage, augment stands in for the human review
+SERVICE_SECONDS = {'extract' : 25.0, 'operate' : 2.0, 'reshape' : 2.0, 'augment' : 120.0, 'catalog' : 3.0}
+
+class Simulation:
+
+    def __init__(self, documents, arrival_seconds, seed = 7, fused = False):
+
+        random        = Random(seed)
+        self.arrivals = sorted(random.uniform(0, arrival_seconds) for _ in range(documents))
+        self.service  = [
+            {stage : random.lognormvariate(0, 0.4) * SERVICE_SECONDS[stage] for stage in STAGES}
+            for _ in range(documents)
+        ]
+        self.stages   = STAGES
+
+        # fused, the operate actor also does the work of the reshape actor, none of its time is saved
+        if  fused:
+
+            self.stages = [stage for stage in STAGES if stage != 'reshape']
+
+            for service in self.service:
+                service['operate'] += service.pop('reshape')
+
+    def polling(self, standby = 60.0, promote = 1.0, begin = 1.0, wait = 20.0, budget = 60.0):
+        """
+        Startup → Promote → Process (begin then long-polling await per stage, in parallel) → Standby → Promote ...
+        """
+
+        stage_of = [0] * len(self.arrivals)              # index into self.stages
+        state_of = [None] * len(self.arrivals)           # None not arrived, waiting, running, success
+        done_at  = [None] * len(self.arrivals)
+        finish   = {}                                    # document → completion time of its running actor
+        clock    = self.arrivals[0]
+
+        while None in done_at:
+
+            for n, arrival in enumerate(self.arrivals):
+                if  state_of[n] is None and arrival <= clock:
+                    state_of[n] = 'waiting'
+
+            clock += promote
+
+            for n in range(len(self.arrivals)):
+                if  state_of[n] == 'success' and stage_of[n] < len(self.stages) - 1:
+                    stage_of[n], state_of[n] = stage_of[n] + 1, 'waiting'
+
+            branch_ends = []
+
+            for s, stage in enumerate(self.stages):
+
+                start = clock + begin
+
+                for n in range(len(self.arrivals)):
+                    if  stage_of[n] == s and state_of[n] == 'waiting':
+                        state_of[n], finish[n] = 'running', start + self.service[n][stage]
+
+                # await: long poll until idle for one wait period or the drain budget runs out
+                current, deadline = start + begin, start + begin + budget
+                pending = sorted((finish[n], n) for n in finish if stage_of[n] == s and state_of[n] == 'running')
+
+                for completed, n in pending:
+
+                    if  completed > deadline or completed - current > wait:
+                        break
+
+                    current     = max(current, completed)
+                    state_of[n] = 'success'
+                    del finish[n]
+
+                    if  s == len(self.stages) - 1:
+                        done_at[n] = current
+
+                branch_ends.append(min(deadline, current + wait))
+
+            clock = max(branch_ends) + standby
+
+        return [done - arrival for done, arrival in zip(done_at, self.arrivals)]
+
+    def event(self, stream = 0.7, invoke = 0.3, queue = 0.5):
+        """
+        Stream → dispatch → begin → actor → queue → await → stream → dispatch promotes → stream → dispatch → begin ...
+        """
+
+        events = []
+
+        for n, arrival in enumerate(self.arrivals):
+            heappush(events, (arrival, n, 0))
+
+        done_at = [None] * len(self.arrivals)
+
+        while events:
+
+            clock, n, s = heappop(events)
+
+            started   = clock + stream + invoke + invoke                       # WAITING record → dispatch → begin → actor
+            completed = started + self.service[n][self.stages[s]] + queue + invoke # message → await marks SUCCESS
+
+            if  s == len(self.stages) - 1:
+                done_at[n] = completed
+            else:
+                heappush(events, (completed + stream + invoke, n, s + 1))     # SUCCESS record → dispatch promotes
+
+        return [done - arrival for done, arrival in zip(done_at, self.arrivals)]
+
+def measure_table():
+    """
+    Latency of finished documents in the deployed pipeline table, from the S3 event stamp to the last FinalStamp
+    """
+
+    from shared.database import Database
+
+    latencies = []
+
+    for document in Database.GetDocuments(stages = [STAGES[-1]], states = ['success']):
+
+        created = datetime.fromisoformat(document.Stamp.replace('Z', ''))
+        stamps  = [getattr(document, f'{stage.title()}Map').FinalStamp for stage in STAGES]
+        stamps  = [datetime.fromisoformat(stamp) for stamp in stamps if stamp]
+
+        if  stamps:
+            latencies.append((max(stamps) - created).total_seconds())
+
+    return latencies
+
+def report(name, latencies):
+
+    if  len(latencies) < 2:
+        print(f'{name:>13} : {len(latencies)} documents, not enough to report')
+        return
+
+    p50, p90, p99 = (quantiles(latencies, n = 100)[p - 1] for p in (50, 90, 99))
+
+    print(f'{name:>13} : documents = {len(latencies):5d}, mean = {mean(latencies):8.1f}s, '
+          f'p50 = {p50:8.1f}s, p90 = {p90:8.1f}s, p99 = {p99:8.1f}s')
+
+if  __name__ == '__main__':
+
+    parser = ArgumentParser(description = 'Per document end-to-end latency of the polling and event pipeline modes')
+
+    parser.add_argument('--documents',       type = int,   default = 200,   help = 'simulated documents')
+    parser.add_argument('--arrival-seconds', type = float, default = 300.0, help = 'window over which documents arrive')
+    parser.add_argument('--standby-seconds', type = float, default = 60.0,  help = 'polling mode standby wait')
+    parser.add_argument('--seed',            type = int,   default = 7)
+    parser.add_argument('--fused', action = 'store_true', help = 'also simulate with reshape fused into operate')
+    parser.add_argument('--table', action = 'store_true', help = 'measure the deployed pipeline table instead of simulating')
+
+    args = parser.parse_args()
+
+    if  args.table:
+
+        report('table', measure_table())
+
+    else:
+
+        simulation = Simulation(args.documents, args.arrival_seconds, seed = args.seed)
+
+        report('polling', simulation.polling(standby = args.standby_seconds))
+        report('event',   simulation.event())
+
+        if  args.fused:
+
+            simulation = Simulation(args.documents, args.arrival_seconds, seed = args.seed, fused = True)
+
+            report('polling fused', simulation.polling(standby = args.standby_seconds))
+            report('event fused',   simulation.event())
@@ -0,0 +1,163 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+"""
+Conversion of extractions into the human review table format, the recursive convert_to_textract_format the
+operate and reshape actors duplicated against the single pass TextractFormat.
+
+Synthetic invoices with many line items and deeply nested objects are converted three ways, reporting seconds and
+peak memory of each and checking that all three produce the same JSON text:
+    legacy  - json.loads, the recursive conversion, json.dumps
+    convert - TextractFormat.Convert of the loaded object
+    stream  - TextractFormat.Write from the text in 64 KiB chunks, written to a counting sink
+
+    python -m bench.textract_format --items 1000 10000 --depth 50 500
+"""
+
+from argparse    import ArgumentParser
+from json        import dumps, loads
+from time        import perf_counter
+from tracemalloc import get_traced_memory, start, stop
+
+from shared.textract import TextractFormat
+
+DOCUMENT = 'invoice.pdf'
+
+# region Legacy
+
+def flatten_json(nested_json, parent_key='', sep='_'):
+    items = []
+    for key, value in nested_json.items():
+        new_key = f"{parent_key}{sep}{key}" if parent_key else key
+        if isinstance(value, dict):
+            items.extend(flatten_json(value, new_key, sep=sep).items())
+        else:
+            items.append((new_key, value))
+    return dict(items)
+
+def convert_to_textract_format(doc, doc_id, bucket):
+    output_data = {"numPages": 1, "pages": [{"pageNumber": 1, "tables": []}], "tableTypes": [],
+                   "metadata": {"sourceDocumentUrl": f's3://{bucket}/acquire/{doc_id}'}}
+    attributes = {}
+    doc = flatten_json(doc, parent_key='', sep='_')
+    for key, val in doc.items():
+        if isinstance(val, list):
+            output_data["pages"][0]["tables"].append(create_table(key, val))
+        else:
+            attributes[key] = val
+    if attributes:
+        output_data["pages"][0]["tables"].append(create_form_table("formdata", attributes))
+    for table in output_data["pages"][0]["tables"]:
+        output_data["tableTypes"].append({"name": table["tableType"], "columnTypes": table["columnTypes"]})
+    return output_data
+
+def create_form_table(table_name, data):
+    form_table = {"name": table_name, "tableType": "Form", "columnTypes": ["Key", "Value"], "rows": []}
+    for key, value in data.items():
+        form_table["rows"].append([
+            {"text": key, "confidence": 99.9, "boundingBox": {"top": 0.0, "left": 0.0, "width": 0.1, "height": 0.02}, "tag": f"{key.lower()}-key"},
+            {"text": value, "confidence": 99.9, "boundingBox": {"top": 0.0, "left": 0.2, "width": 0.3, "height": 0.02}, "tag": f"{key.lower()}-value"},
+        ])
+    return form_table
+
+def create_table(table_name, data):
+    table = {"tableType": "Table", "name": table_name, "columnTypes": list(data[0].keys()), "rows": []}
+    for idx, item in enumerate(data):
+        table["rows"].append([
+            {"text": val, "confidence": 99.9, "boundingBox": {"top": 0.0, "left": 0.0, "width": 0.0, "height": 0.0}, "tag": f"row-{idx}-r-br"}
+            for val in item.values()
+        ])
+    return table
+
+# endregion
+
+class Sink:
+    """
+    Stands in for S3Uri.Writer, keeps the text written only when asked to
+    """
+
+    def __init__(self, keep = False):
+
+        self.keep  = keep
+        self.parts = []
+        self.Bytes = 0
+
+    def Write(self, data: bytes):
+
+        self.Bytes += len(data)
+
+        if  self.keep:
+            self.parts.append(data)
+
+def invoice(items: int, depth: int) -> dict:
+
+    nested = {'value' : 'leaf'}
+
+    for level in range(depth):
+        nested = {f'level{level}' : nested, f'note{level}' : f'note {level}'}
+
+    return {
+        'invoice_number' : 'INV-0001',
+        'invoice_date'   : '2024-06-05',
+        'vendor'         : {'name' : 'AWSomecompany', 'address' : {'street' : 'Domovinskog rata 1/B', 'city' : 'Solin'}},
+        'line_items'     : [
+            {'item_code' : f'{index:06d}', 'description' : f'Item {index}', 'quantity' : index % 7 + 1, 'unit_price' : 12.5, 'total_price' : 12.5 * (index % 7 + 1)}
+            for index in range(items)
+        ],
+        'nested'         : nested,
+        'totals'         : {'subtotal' : 1000.0, 'tax' : 250.0, 'total' : 1250.0},
+    }
+
+def measure(function):
+    """
+    Timed untraced, tracing allocations slows the conversions unevenly, then run again for the peak memory
+    """
+
+    started = perf_counter()
+    result  = function()
+    elapsed = perf_counter() - started
+
+    start()
+    function()
+    _, peak = get_traced_memory()
+    stop()
+
+    return result, elapsed, peak
+
+if  __name__ == '__main__':
+
+    parser = ArgumentParser(description = 'Recursive against single pass conversion into the human review format')
+
+    parser.add_argument('--items',  type = int, nargs = '+', default = [1000, 10000], help = 'line items per invoice')
+    parser.add_argument('--depth',  type = int, nargs = '+', default = [10, 500],     help = 'nesting depth of an object of the invoice')
+    parser.add_argument('--bucket', default = 'store-document', help = 'bucket of the source document url')
+
+    args = parser.parse_args()
+
+    TextractFormat.Metadata = staticmethod(lambda document_id, source = None: {'sourceDocumentUrl' : f's3://{args.bucket}/acquire/{document_id}'})
+
+    print(f'{"items":>6} {"depth":>5} {"method":>8} {"seconds":>8} {"peak MiB":>9} {"same":>5}')
+
+    for items in args.items:
+        for depth in args.depth:
+
+            text   = dumps(invoice(items, depth)).encode()
+            chunks = [text[offset:offset + TextractFormat.ChunkBytes] for offset in range(0, len(text), TextractFormat.ChunkBytes)]
+
+            try:
+                legacy, elapsed, peak = measure(lambda: dumps(convert_to_textract_format(loads(text), DOCUMENT, args.bucket)))
+                print(f'{items:>6} {depth:>5} {"legacy":>8} {elapsed:>8.3f} {peak / 2 ** 20:>9.1f} {"-":>5}')
+            except RecursionError:
+                legacy = None
+                print(f'{items:>6} {depth:>5} {"legacy":>8} {"recursion limit":>18}')
+
+            converted, elapsed, peak = measure(lambda: dumps(TextractFormat.Convert(TextractFormat.Events(loads(text)), DOCUMENT)))
+            print(f'{items:>6} {depth:>5} {"convert":>8} {elapsed:>8.3f} {peak / 2 ** 20:>9.1f} {str(legacy in (None, converted)):>5}')
+
+            _, elapsed, peak = measure(lambda: TextractFormat.Write(TextractFormat.Scan(iter(chunks)), DOCUMENT, Sink()))
+
+            # written again to compare the text, outside of the measurement
+            sink = Sink(keep = True)
+            TextractFormat.Write(TextractFormat.Scan(iter(chunks)), DOCUMENT, sink)
+
+            print(f'{items:>6} {depth:>5} {"stream":>8} {elapsed:>8.3f} {peak / 2 ** 20:>9.1f} {str(b"".join(sink.parts).decode() == converted):>5}')
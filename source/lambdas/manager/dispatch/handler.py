@@ -0,0 +1,53 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+from shared.defines  import *
+from shared.environ  import *
+from shared.loggers  import Logger
+from shared.database import Database
+from shared.action   import Action
+
+NEXT_STAGE = dict(STAGE_TRANSITIONS)
+
+# augment begins are paced by pending human loops and left to the sweeping state machine
+DISPATCH_STAGES = [stage for stage in STAGE_TRANSITIONS_ORDER if stage != Stage.AUGMENT]
+
+def lambda_handler(event, context):
+    """
+    Event mode pipeline dispatcher, invoked with the pipeline table stream.
+    Promotes documents as soon as they reach SUCCESS and launches the begin processor of stages receiving WAITING documents.
+    """
+
+    stages = set()
+
+    for record in event.get('Records', []):
+
+        images   = record.get('dynamodb', {})
+        current  = images.get('NewImage', {}).get('StageState', {}).get('S', '')
+        previous = images.get('OldImage', {}).get('StageState', {}).get('S', '')
+
+        if  not current or current == previous:
+            continue
+
+        document_id  = images['Keys']['DocumentID']['S']
+        stage, state = current.lower().split(HASH)
+
+        if  state == State.SUCCESS and stage in NEXT_STAGE:
+
+            Database.TransitionDocument(
+                document_id = document_id,
+                expected    = current,
+                promoted    = f'{NEXT_STAGE[stage]}{HASH}{State.WAITING}'.title()
+            )
+
+        if  state == State.WAITING and stage in DISPATCH_STAGES:
+
+            stages.add(stage)
+
+    for stage in sorted(stages):
+
+        Logger.info(f'Dispatch Manager : Launching Begin Processor for Stage = {stage}')
+
+        Action.Invoke(function_name = STAGE_BEGIN(stage), payload_bytes = b'{}')
+
+    return None
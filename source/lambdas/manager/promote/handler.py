@@ -1,25 +1,89 @@
 # Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
 # SPDX-License-Identifier: MIT-0
 
+from shared.bus      import Bus
 from shared.database import Database
-from shared.defines import Stage
-
-STAGE_TRANSITIONS_ORDER = [
-                        #    Stage.ACQUIRE,
-                        #    Stage.CONVERT,
-                            Stage.EXTRACT,
-                            Stage.OPERATE,
-                            Stage.RESHAPE,
-                            Stage.AUGMENT,
-                            Stage.CATALOG
-                           ]
-
-def lambda_handler(context, event):
-    for index in range(len(STAGE_TRANSITIONS_ORDER) - 1):
-        current_stage, next_stage = STAGE_TRANSITIONS_ORDER[index], STAGE_TRANSITIONS_ORDER[index + 1]
-        Database.PromoteDocument(current_stage, next_stage)
+from shared.defines  import State, STAGE_TRANSITIONS_ORDER
+from shared.environ  import STANDBY_MIN_SECONDS, STANDBY_MAX_SECONDS, STANDBY_IDLE_CYCLES, STAGE_TRANSITIONS
+from shared.loggers  import Logger
+from shared.metrics  import Metrics
+
+from time import time
+
+def get_backlog():
+    """
+    Documents each stage still has to work on, and the actor results queued for its await processor
+    """
+
+    return {
+        stage : {
+            'waiting' : Database.CountDocuments([stage], [State.WAITING, State.HOLDING]),
+            'running' : Database.CountDocuments([stage], [State.RUNNING]),
+            'queued'  : Bus.GetDepth(stage),
+        }
+        for stage in STAGE_TRANSITIONS_ORDER
+    }
+
+def get_standby(backlog, promoted, rate, previous):
+    """
+    Seconds to stand by before the next cycle and the number of consecutive idle cycles
+
+    - documents waiting, results queued or promoted this cycle → spin at the minimum
+    - only running documents → back off, but never past the expected gap between completions at rate per second
+    - nothing at all → back off, the caller breaks up after enough idle cycles
+    """
+
+    waiting = sum(counts['waiting'] + counts['queued'] for counts in backlog.values())
+    running = sum(counts['running']                    for counts in backlog.values())
+
+    backoff = min(max(previous.get('standbySeconds', STANDBY_MIN_SECONDS) * 2, STANDBY_MIN_SECONDS), STANDBY_MAX_SECONDS)
+
+    if  waiting or promoted:
+        return STANDBY_MIN_SECONDS, 0
+
+    if  running:
+
+        if  rate:
+            backoff = min(backoff, max(round(1 / rate), STANDBY_MIN_SECONDS))
+
+        return backoff, 0
+
+    return backoff, previous.get('idleCycles', 0) + 1
+
+def lambda_handler(event, context):
+
+    # the state machine passes the previous promote result through process and standby
+    previous = (event or {}).get('Payload') or {}
+    promoted = time()
+    elapsed  = promoted - previous.get('promotedAt', promoted)
+
+    # transitions only ever move SUCCESS documents to WAITING, so all of them can run in one pass
+    counts = Database.PromoteDocuments(transitions = STAGE_TRANSITIONS)
+
+    # completion rate smoothed over the recent cycles
+    rate             = counts['Promoted'] / elapsed if elapsed else 0
+    rate             = (rate + previous['completionRate']) / 2 if 'completionRate' in previous else rate
+
+    backlog          = get_backlog()
+    standby, idle    = get_standby(backlog, counts['Promoted'], rate, previous)
+    process_document = idle < STANDBY_IDLE_CYCLES
+
+    Logger.info(f'Promote : Promoted = {counts["Promoted"]}, Standby = {standby}s, IdleCycles = {idle}, Backlog = {backlog}')
+
+    Metrics.Emit({'Manager' : 'promote'}, {
+        'Promoted'       : counts['Promoted'],
+        'Waiting'        : sum(c['waiting'] for c in backlog.values()),
+        'Running'        : sum(c['running'] for c in backlog.values()),
+        'Queued'         : sum(c['queued']  for c in backlog.values()),
+        'StandbySeconds' : standby,
+        }, units = {'StandbySeconds' : 'Seconds'})
 
     return {
-        'restartPipeline' : False,
-        'processDocument' : True,
+        'restartPipeline'    : False,
+        'processDocument'    : process_document,
+        'promoteDocument'    : counts,
+        'standbySeconds'     : standby,
+        'idleCycles'         : idle,
+        'promotedAt'         : promoted,
+        'completionRate'     : rate,
         }
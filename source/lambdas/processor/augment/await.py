@@ -26,79 +26,99 @@ class AugmentAwaitProcessor(AwaitProcessor):
         Process completion events from asynchronous requests coming through the stage event bus.
         '''
 
-        for wrapper in Bus.GetMessages(stage = self.stage):
+        Database.Cache.Clear()
 
-            message                        = DotMap(**loads(wrapper.body))
-            message.detail                 = DotMap(**message.detail)
-            message.detail.humanLoopOutput = DotMap(**message.detail.humanLoopOutput)
-            message.documentID             = message.detail.humanLoopName.split('--')[1].replace('-', '.')
-            document                       = Database.GetDocument(document_id = message.documentID)
+        with Bus.Consumer(stage = self.stage, context = self.context, budgetSeconds = self.drainSeconds, records = self.records) as consumer:
 
-            print("message: ", message)
+            for batch in consumer.Batches():
 
-            if not document:
+                messages = [(wrapper, self.parseMessage(wrapper)) for wrapper in batch]
 
-                Logger.info(
-                    f'{self.stage.title()} Await Processor : Received A2I Callback for DocumentID = {message.documentID}, '
-                    f'Unable to Find in Database'
-                )
-                wrapper.delete()
-                continue
+                Database.Prefetch(document_ids = [message.documentID for _, message in messages])
 
-            if  message.detail.humanLoopStatus in (A2IHumanLoopStatus.Completed, A2IHumanLoopStatus.Stopped):
+                for wrapper, message in messages:
 
-                outputS3Uri = S3Uri.FromUrl(message.detail.humanLoopOutput.outputS3Uri)
-                outputJSON  = outputS3Uri.GetJSON()
+                    document = Database.GetDocument(document_id = message.documentID)
 
-                flowName    = search(r':flow-definition/([^/]+)', outputJSON.get('flowDefinitionArn', '')).group(1)
+                    print("message: ", message)
 
+                    if not document:
 
-                for order, humanAnswer in enumerate(outputJSON.get('humanAnswers', [])):
+                        Logger.info(
+                            f'{self.stage.title()} Await Processor : Received A2I Callback for DocumentID = {message.documentID}, '
+                            f'Unable to Find in Database'
+                        )
+                        consumer.Ack(wrapper)
+                        continue
 
-                    Logger.info(
-                        f'{self.stage.title()} Await Processor : Received A2I Callback for DocumentID = {message.documentID}, '
-                        f'Processing Human Answer from Workflow → {flowName}'
-                    )
+                    if  message.detail.humanLoopStatus in (A2IHumanLoopStatus.Completed, A2IHumanLoopStatus.Stopped):
+
+                        outputS3Uri = S3Uri.FromUrl(message.detail.humanLoopOutput.outputS3Uri)
+                        outputJSON  = outputS3Uri.GetJSON()
+
+                        flowName    = search(r':flow-definition/([^/]+)', outputJSON.get('flowDefinitionArn', '')).group(1)
+
+
+                        for order, humanAnswer in enumerate(outputJSON.get('humanAnswers', [])):
+
+                            Logger.info(
+                                f'{self.stage.title()} Await Processor : Received A2I Callback for DocumentID = {message.documentID}, '
+                                f'Processing Human Answer from Workflow → {flowName}'
+                            )
                     
-                    Logger.pretty(humanAnswer, f'Human Answer {order}')
+                            Logger.pretty(humanAnswer, f'Human Answer {order}')
+
+                            answerContent    =   humanAnswer.get('answerContent', {})
+                            answerSubmission = answerContent.get('submission',  '{}')
+                            answerTabularHIL = loads(answerSubmission)
 
-                    answerContent    =   humanAnswer.get('answerContent', {})
-                    answerSubmission = answerContent.get('submission',  '{}')
-                    answerTabularHIL = loads(answerSubmission)
+                            S3Uri(Bucket = STORE_BUCKET,
+                                  Object = f'{STAGE}/{document.DocumentID}/{flowName}/{order}.json').PutJSON(answerTabularHIL)
 
-                    S3Uri(Bucket = STORE_BUCKET,
-                          Object = f'{STAGE}/{document.DocumentID}/{flowName}/{order}.json').PutJSON(answerTabularHIL)
+                        document.State                 = State.SUCCESS
+                        document.CurrentMap.FinalStamp = GetCurrentStamp()
+                        document.CurrentMap.StageS3Uri = S3Uri(Bucket = STORE_BUCKET,
+                                                               Prefix = f'{STAGE}/{document.DocumentID}/{flowName}') # point to directory as more than one possible answer
 
-                document.State                 = State.SUCCESS
-                document.CurrentMap.FinalStamp = GetCurrentStamp()
-                document.CurrentMap.StageS3Uri = S3Uri(Bucket = STORE_BUCKET,
-                                                       Prefix = f'{STAGE}/{document.DocumentID}/{flowName}') # point to directory as more than one possible answer
+                        Logger.info(
+                            f'{self.stage.title()} Await Processor : Received A2I Callback for DocumentID = {message.documentID}, '
+                            f'Status is PASS'
+                        )
 
-                Logger.info(
-                    f'{self.stage.title()} Await Processor : Received A2I Callback for DocumentID = {message.documentID}, '
-                    f'Status is PASS'
-                )
+                    else:
 
-            else:
+                        document.State                 = State.FAILURE
+                        document.CurrentMap.ActorGrade = FAIL
+                        document.CurrentMap.Exceptions = [dumps(message.toDict(), indent = 4)]
+                        document.CurrentMap.FinalStamp = GetCurrentStamp()
 
-                document.State                 = State.FAILURE
-                document.CurrentMap.ActorGrade = FAIL
-                document.CurrentMap.Exceptions = [dumps(message.toDict(), indent = 4)]
-                document.CurrentMap.FinalStamp = GetCurrentStamp()
+                        self.processCallbackEventsMore(message)
 
-                self.processCallbackEventsMore(message)
+                        Logger.info(
+                            f'{self.stage.title()} Await Processor : Received A2I Callback for DocumentID = {message.documentID}, '
+                            f'Status is FAIL'
+                        )
 
-                Logger.info(
-                    f'{self.stage.title()} Await Processor : Received A2I Callback for DocumentID = {message.documentID}, '
-                    f'Status is FAIL'
-                )
+                    Database.UpdateDocument(document)
+
+                    consumer.Ack(wrapper)
+
+        self.failures = consumer.Failures()
+
+    def parseMessage(self, wrapper) -> DotMap:
+        '''
+        Parse an A2I human loop status change event, the DocumentID is encoded in the human loop name
+        '''
 
-            Database.PutDocument(document)
+        message                        = DotMap(**loads(Bus.GetBody(wrapper)))
+        message.detail                 = DotMap(**message.detail)
+        message.detail.humanLoopOutput = DotMap(**message.detail.humanLoopOutput)
+        message.documentID             = message.detail.humanLoopName.split('--')[1].replace('-', '.')
 
-            wrapper.delete()
+        return message
 
 def lambda_handler(event, context):
-    AugmentAwaitProcessor(stage = STAGE, timeoutMinutes = 300).process()
+    return AugmentAwaitProcessor(stage = STAGE, timeoutMinutes = 300, context = context, records = event.get('Records')).process()
 
 if __name__ == '__main__':
 
@@ -43,7 +43,8 @@ class AugmentBeginProcessor(BeginProcessor):
             humanLoopID   = Sanatize(document.DocumentID.replace('.', '-'))
             humanLoopName = Sanatize(f'{flowName}--{humanLoopID}--{humanLoopTime}').lower()
 
-            sourceS3Uri = S3Uri(Bucket = STORE_BUCKET, Object = document.ReshapeMap.StageS3Uri.Object)
+            # operate writes the reshaped document itself when the reshape stage is fused into it
+            sourceS3Uri = S3Uri(Bucket = STORE_BUCKET, Object = document.ReshapeMap.StageS3Uri.Object or document.OperateMap.StageS3Uri.Object)
             content = sourceS3Uri.GetJSON()
 
             response = A2IClient.start_human_loop(
@@ -106,7 +107,7 @@ class AugmentBeginProcessor(BeginProcessor):
 
                 rateLimited = True
 
-            Database.PutDocument(document)
+            Database.UpdateDocument(document)
 
             if  rateLimited:
                 break
@@ -53,7 +53,8 @@ def lambda_handler(event, context):
         message.ActorGrade = Grade.PASS
         message.FinalStamp = GetCurrentStamp()
 
-    Bus.PutMessage(stage = STAGE, message_body = message.to_json())
+    with Bus.Publisher(stage = STAGE) as publisher:
+        publisher.PutMessage(message_body = message.to_json())
 
     return None
 
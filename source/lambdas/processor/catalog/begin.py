@@ -12,7 +12,8 @@ from shared.bus       import Bus
 
 def lambda_handler(event, context):
 
-    BeginProcessor(stage = STAGE, actor = STAGE_ACTOR, retryLimit = 30).process()
+    BeginProcessor(stage = STAGE, actor = STAGE_ACTOR, retryLimit = 30, maxWorkers = 16, maxInFlight = 1000,
+                   claimDocuments = PIPELINE_MODE == PipelineMode.EVENT).process()
 
 if  __name__ == '__main__':
 
@@ -18,50 +18,219 @@ from shared.bus      import Bus
 from shared.storage  import S3Uri
 from shared.loggers import Logger
 from shared.clients import BedrockClient, S3Client
-from rhubarb import DocAnalysis
+from shared.schemas import Schemas, Schema
+from shared.results import ResultCache, CacheStatus
+from shared.inference import Inference
+from shared.extraction import PageExtraction
+from shared.limiter import RateLimiter
+from shared.routing import ModelRouter, Heuristics
+from shared.streaming import StreamExtraction
+from shared.language import LanguageDetector, Detection
+from shared.textlayer import NativeText, TextLayer
+from shared.metrics import Metrics
+from rhubarb import DocAnalysis, LanguageModels
 
 
 import json
 import boto3
+import time
 
+# created once per container, warm invocations reuse its clients and credentials
+session = boto3.Session()
 
 class ProcessImage():
-    def generateJson(self, document: Document):
-        try:
 
-            document.CurrentMap.StageS3Uri = S3Uri(Bucket=STORE_BUCKET, Prefix=f'acquire/{document.DocumentID}')            
-            session = boto3.Session()
+    def __init__(self):
+        self.cacheStatus = CacheStatus.OFF
+        self.pageChunks  = 0
+        self.failure     = None
+        self.attempts    = [] # one record per model tried when routing
+        self.streamed    = None # result of a streamed extraction, its output is already in the store
+        self.tokenUsage  = {}
+        self.detection   = Detection() # language of the document, selects the prompt, output budget and model
+        self.textLayer   = TextLayer() # text layer of a born digital PDF, extracted in place of its pages when usable
+
+    @property
+    def Path(self) -> str:
+        return 'text' if self.textLayer.Usable else 'image'
+
+    def getContent(self, document: Document, content: bytes):
+        """
+        What the model is sent and its media type, the text layer when usable, otherwise the document itself
+        """
+
+        if  self.textLayer.Usable:
+            return self.textLayer.Text.encode('utf-8'), NativeText.MediaType
+
+        return content, Inference.MediaType(document.DocumentID)
+
+    def getOutputUri(self, document: Document) -> S3Uri:
+        return S3Uri(Bucket=STORE_BUCKET, Object=f'{STAGE}/{document.DocumentID.split(".")[0]}.json')
+
+    def modelId(self, model_id: str = None) -> str:
+        """
+        Foundation id of the model extracting the document, the one given, the model of its language or Inference.ModelId
+        """
+
+        return Inference.Foundation(model_id or self.detection.ModelId or Inference.ModelId())
+
+    def getCacheKey(self, schema: Schema, source: S3Uri, content: bytes = b''):
+        """
+        Everything the extraction output depends on: the source bytes, schema, prompt, model and inference parameters,
+        the bytes hashed from content when they were loaded
+        """
+
+        model = ','.join(ModelRouter.Models) if ModelRouter.Enabled() else self.modelId()
+
+        return ResultCache.Key(
+            source      = ResultCache.SourceHash(source, content),
+            schema      = schema.Hash,
+            prompt      = ResultCache.Hash(self.detection.Prompt),
+            model       = model,
+            max_tokens  = self.detection.MaxTokens,
+            temperature = 0,
+            chunk_pages = PageExtraction.ChunkPages,
+            path        = self.Path,
+        )
+
+    def isRhubarb(self, model_id: str) -> bool:
+        """
+        Whether rhubarb can invoke the foundation model id, it only knows the models of its LanguageModels and the us
+        and global inference profiles, any other model or geography is invoked directly through Inference
+        """
+
+        return model_id in {model.value for model in LanguageModels} and Inference.CrossRegion in ('us', 'global', '')
+
+    def getAnalysis(self, document: Document, model_id: str) -> DocAnalysis:
+        """
+        Rhubarb analysis of the document, model_id is a foundation id rhubarb prefixes with the CrossRegion profile
+        """
+
+        return DocAnalysis(
+            file_path=document.CurrentMap.StageS3Uri.Url,
+            max_tokens=self.detection.MaxTokens,
+            temperature=0,
+            boto3_session=session,
+            modelId=LanguageModels(model_id),
+            cross_region_inference=Inference.CrossRegion or None
+        )
+
+    def extract(self, document: Document, schema: Schema, content: bytes, model_id: str = None):
+
+        model_id = self.modelId(model_id)
+
+        # long PDFs are extracted in page ranges concurrently and merged, anything else in one request
+        if  PageExtraction.Applies(content):
+
+            resp = PageExtraction.Run(
+                content, schema.Body, max_tokens=self.detection.MaxTokens, model_id=model_id, cache=schema.Cached, prompt=self.detection.Prompt
+            )
+
+            self.pageChunks = resp['chunks']
 
-            response = S3Client.get_object(Bucket=STORE_BUCKET, Key=f'schema/invoice_schema.json')
-            schema_content =  response['Body'].read().decode('utf-8')
-            schema = json.loads(schema_content)
+            return resp
 
+        # rhubarb builds its own request from the pages, a text layer, a cacheable prefix of schema and instructions or
+        # a model rhubarb cannot invoke needs the request built here
+        if  self.textLayer.Usable or schema.Cached or not self.isRhubarb(model_id):
 
-            da = DocAnalysis(
-                file_path=document.CurrentMap.StageS3Uri.Url,
-                max_tokens=5000,
-                temperature=0,
-                boto3_session=session
-            )
-            
-
-            resp = da.run(
-                message='''Extract all textual and numerical information from the provided document with maximum accuracy and comprehensiveness.
-                        Output Instructions:
-                            Use the schema provided. Please in your generated output include only generated json nothing else
-                        
-                        Example Output Format:
-                        {'abc': 123, "bcd": [], cda: {}, dca: "abc"}
-                        ''',
-                output_schema= schema
+            content, media_type = self.getContent(document, content or document.SourceS3Uri.Get())
+
+            response = Inference.Invoke(
+                Inference.Request(
+                    content, media_type, schema.Body, max_tokens=self.detection.MaxTokens, prompt=self.detection.Prompt, cache=schema.Cached
+                ),
+                model_id
             )
+
+            output = Inference.ParseOutput(response)
+
+            if  output is None:
+                raise Exception(f'{STAGE} Actor : DocumentID = {document.DocumentID}, Model Returned No JSON')
+
+            return {'output' : output, 'token_usage' : Inference.Usage(response)}
+
+        da = self.getAnalysis(document, model_id)
+
+        # rhubarb reports usage but neither rate limits nor survives a second throttle, the limiter does both
+        return RateLimiter.For(model_id).Call(
+            lambda: da.run(
+                message=self.detection.Prompt,
+                output_schema= schema.Body
+            ),
+            tokens = Inference.PageTokens + self.detection.MaxTokens,
+            usage  = lambda resp: resp['token_usage'],
+        )
+
+    def generateJson(self, document: Document, schema: Schema):
+        try:
+
+            # wherever the trigger found it, acquire/<priority>/<schema>/ uploads included
+            document.CurrentMap.StageS3Uri = document.SourceS3Uri
+
+            content = document.SourceS3Uri.Get() \
+                      if PageExtraction.ChunkPages or StreamExtraction.Enabled or schema.Cached or LanguageDetector.Enabled or NativeText.Enabled else b''
+
+            # long PDFs split into page ranges are extracted from their pages, the others from their text layer when
+            # it is complete and readable
+            if  NativeText.Enabled and not PageExtraction.Applies(content):
+                self.textLayer = NativeText.Analyze(content)
+
+            # detected locally from the PDF text layer, before anything is sent to Bedrock
+            if  LanguageDetector.Enabled:
+                self.detection = LanguageDetector.Run(content, self.textLayer.Pages)
+
+
+            # duplicates of an already extracted document are answered from the store without calling Bedrock
+            if  ResultCache.Enabled:
+
+                key    = self.getCacheKey(schema, document.CurrentMap.StageS3Uri, content)
+                cached = ResultCache.Get(STAGE, key)
+
+                self.cacheStatus = CacheStatus.MISS if cached is None else CacheStatus.HIT
+
+                if  cached is not None:
+                    return cached['output']
+
+            # the cheaper model first, the larger ones only for outputs failing the schema or plausibility checks
+            if  ModelRouter.Enabled():
+
+                resp, self.attempts = ModelRouter.Route(
+                    extract = lambda model_id: self.extract(document, schema, content, model_id),
+                    check   = lambda output: schema.Validate(output) + Heuristics.Check(output, schema.Body),
+                )
+
+            elif StreamExtraction.Enabled and not PageExtraction.Applies(content):
+
+                # written to the store as it arrives, only the top level fields are held and nothing is cached
+                self.streamed = StreamExtraction(schema.Body).Run(
+                    *self.getContent(document, content), self.getOutputUri(document),
+                    max_tokens=self.detection.MaxTokens, model_id=self.modelId(), cache=schema.Cached, prompt=self.detection.Prompt
+                )
+
+                self.tokenUsage = self.streamed['token_usage']
+
+                return self.streamed['output']
+
+            else:
+
+                resp = self.extract(document, schema, content)
         
-            response_body = resp['output']
+            response_body   = resp['output']
+            self.tokenUsage = resp.get('token_usage') or {}
+
+            # an output failing the schema or plausibility checks is extracted again for its next duplicate
+            if  ResultCache.Enabled and not schema.Validate(response_body) + Heuristics.Check(response_body, schema.Body):
+                ResultCache.Put(STAGE, key, {'output' : response_body, 'token_usage' : resp.get('token_usage')})
     
 
-        except (
-            # handle bedrock or S3 error
-        ) as e:
+        except Exception as e:
+
+            # Bedrock still throttling after every retry, or any other Bedrock or S3 error, fails the document now
+            # instead of leaving it running until the await processor times it out
+            Logger.error(f'{STAGE} Actor : DocumentID = {document.DocumentID}, Extraction Failed > {str(e)}')
+
+            self.failure = e
 
             return None
 
@@ -75,17 +244,107 @@ def lambda_handler(event, context):
     message  = Message(DocumentID = document.DocumentID)
 
 
-    result = ProcessImage().generateJson(document)
+    process  = ProcessImage()
+    started  = time.time()
+
+    try:
+
+        # served from the warm container, revalidated against the store by ETag once its time to live expires
+        schema = Schemas.Get(document.ExtractMap.SchemaName)
+        result = process.generateJson(document, schema)
+
+    except Exception as e:
+
+        # a schema missing from the store, e.g. a misspelled acquire/<priority>/<schema>/ folder, fails the document
+        # now instead of leaving it running until the await processor times it out
+        Logger.error(f'{STAGE} Actor : DocumentID = {document.DocumentID}, Schema = {document.ExtractMap.SchemaName} Not Loaded > {str(e)}')
+
+        process.failure = e
+
+    elapsed  = time.time() - started
 
 
     Logger.info(f'{STAGE} Actor : Started Processing DocumentID = {document.DocumentID}')
 
-    key = f'{document.DocumentID.split('.')[0]}.json'
+    message.MapUpdates.Throttles = RateLimiter.Emit(STAGE).get('Throttles', 0)
+
+    if  process.failure is not None:
+
+        message.ActorGrade = Grade.FAIL
+        message.FinalStamp = GetCurrentStamp()
+
+        Bus.PutMessage(stage = STAGE, message_body = message.to_json())
+
+        Logger.info(f'{STAGE} Actor : Stopped Processing DocumentID = {document.DocumentID}, Grade = FAIL')
+
+        return FAIL
+
+    # a streamed output was validated value by value as it arrived, its result holds array lengths only
+    faults = process.streamed['faults'] if process.streamed else schema.Validate(result)
+
+    for fault in faults:
+        Logger.warning(f'{STAGE} Actor : DocumentID = {document.DocumentID}, Schema = {schema.Name}, Fault > {fault}')
+
+    message.MapUpdates.SchemaName  = schema.Name
+    message.MapUpdates.SchemaFault = len(faults)
+    message.MapUpdates.ResultCache = process.cacheStatus
+    message.MapUpdates.PageChunks  = process.pageChunks
+
+    message.MapUpdates.Path           = process.Path
+    message.MapUpdates.TextConfidence = int(process.textLayer.Confidence * 100)
+
+    message.MapUpdates.Language    = process.detection.Language
+    message.MapUpdates.Script      = process.detection.Script
+    message.MapUpdates.MaxTokens   = process.detection.MaxTokens
+
+    message.MapUpdates.PromptCacheRead  = process.tokenUsage.get('cache_read_input_tokens',     0)
+    message.MapUpdates.PromptCacheWrite = process.tokenUsage.get('cache_creation_input_tokens', 0)
+
+    if  process.attempts:
+
+        message.MapUpdates.ModelId   = process.attempts[-1]['ModelId']
+        message.MapUpdates.Escalated = len(process.attempts) - 1
+        message.MapUpdates.Attempts  = process.attempts
+
+    Metrics.Emit({'Stage' : STAGE}, {
+        'ResultCacheHit'   : int(process.cacheStatus == CacheStatus.HIT),
+        'ResultCacheMiss'  : int(process.cacheStatus == CacheStatus.MISS),
+        'RouteAccepted'    : int(len(process.attempts) == 1),
+        'RouteEscalated'   : int(len(process.attempts) > 1),
+        'PromptCacheRead'  : message.MapUpdates.PromptCacheRead,
+        'PromptCacheWrite' : message.MapUpdates.PromptCacheWrite,
+        })
+
+    Metrics.Emit({'Stage' : STAGE, 'Language' : process.detection.Language}, {
+        'LanguageDocuments'    : 1,
+        'LanguageMaxTokens'    : process.detection.MaxTokens,
+        'LanguageOutputTokens' : process.tokenUsage.get('output_tokens', 0),
+        })
+
+    # latency and tokens per path, text layer against rendered pages
+    Metrics.Emit({'Stage' : STAGE, 'Path' : process.Path}, {
+        'PathDocuments'    : 1,
+        'PathLatency'      : int(elapsed * 1000),
+        'PathInputTokens'  : process.tokenUsage.get('input_tokens',  0),
+        'PathOutputTokens' : process.tokenUsage.get('output_tokens', 0),
+        }, units = {'PathLatency' : 'Milliseconds'})
+
+    if  process.streamed:
+
+        Metrics.Emit({'Stage' : STAGE}, {
+            'StreamFirstByte' : process.streamed['first_byte'] or 0,
+            'StreamElapsed'   : process.streamed['elapsed'],
+            'StreamBytes'     : process.streamed['bytes'],
+        }, units = {'StreamFirstByte' : 'Seconds', 'StreamElapsed' : 'Seconds', 'StreamBytes' : 'Bytes'})
+
+    else:
+
+        key = f'{document.DocumentID.split(".")[0]}.json'
 
 
-    json_string = json.dumps(result)
+        json_string = json.dumps(result)
 
-    Store.PutFile(STAGE, key, json_string.encode('utf-8'))
+        Store.PutFile(STAGE, key, json_string.encode('utf-8'))
 
     message.MapUpdates.StageS3Uri = S3Uri(Bucket = STORE_BUCKET, Prefix = f'{STAGE}/{document.DocumentID}')
 
@@ -6,10 +6,14 @@ from shared.environ import *
 from shared.helpers import *
 
 from shared.processor import AwaitProcessor
+from shared.batch     import BatchAwaitProcessor
 
 def lambda_handler(event, context):
 
-    AwaitProcessor(stage = STAGE, timeoutMinutes = 30).process()
+    if  EXTRACT_MODE == ExtractMode.BATCH:
+        return BatchAwaitProcessor(stage = STAGE, timeoutMinutes = 30, context = context, records = event.get('Records')).process()
+
+    return AwaitProcessor(stage = STAGE, timeoutMinutes = 30, context = context, records = event.get('Records')).process()
 
 if  __name__ == '__main__':
 
@@ -6,13 +6,21 @@ from shared.environ import *
 from shared.helpers import *
 
 from shared.processor import BeginProcessor
+from shared.batch     import BatchBeginProcessor
 from shared.database  import Database
 from shared.action    import Action
 from shared.bus       import Bus
 
 def lambda_handler(event, context):
 
-    BeginProcessor(stage = STAGE, actor = STAGE_ACTOR, retryLimit = 30).process()
+    if  EXTRACT_MODE == ExtractMode.BATCH:
+
+        BatchBeginProcessor(stage = STAGE, actor = STAGE_ACTOR, retryLimit = 30, maxWorkers = 16, maxInFlight = 100,
+                            claimDocuments = PIPELINE_MODE == PipelineMode.EVENT).process()
+        return
+
+    BeginProcessor(stage = STAGE, actor = STAGE_ACTOR, retryLimit = 30, maxWorkers = 16, maxInFlight = 100,
+                   claimDocuments = PIPELINE_MODE == PipelineMode.EVENT).process()
 
 if  __name__ == '__main__':
 
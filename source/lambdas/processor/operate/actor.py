@@ -5,12 +5,17 @@ from shared.defines import *
 from shared.environ import *
 from shared.helpers import GetCurrentStamp
 from shared.loggers import Logger
+from shared.metrics import Metrics
 
 from shared.document import Document
 from shared.storage  import S3Uri
 from shared.message  import Message
 from shared.bus      import Bus
+from shared.textract import TextractFormat
+from shared.rules    import Rules
+from shared.tables   import Tables, TablesFormat, Columnar
 
+from time      import monotonic
 from traceback import print_exc
 from typing    import List
 
@@ -24,21 +29,54 @@ def lambda_handler(event, context):
     documentName = document.ExtractMap.StageS3Uri.Prefix.split('.')[0]
     print('documentName', documentName)
     
+    results     = []
+    handoff     = ''
     sourceS3Uri = S3Uri(Bucket = STORE_BUCKET, Object = f'{documentName}.json')
     outputS3Uri = S3Uri(Bucket = STORE_BUCKET, Object = f'{STAGE}/{document.DocumentID}/humanInTheLoop-Operated.json')
 
+    # fused, only the reshaped document is stored, where the reshape actor would have written it
+    if  FUSE_RESHAPE:
+        outputS3Uri = S3Uri(Bucket = STORE_BUCKET, Object = f'{Stage.RESHAPE}/{document.DocumentID}/humanInTheLoop-Reshaped.json')
+
     try:
 
         print('sourceS3Uri: ', sourceS3Uri.Url)
 
-        hil_document = sourceS3Uri.GetJSON()
-        hil_document = convert_to_textract_format(hil_document, document.DocumentID)
+        rules  = Rules.Get(document.ExtractMap.SchemaName)
+        events = TextractFormat.Read(sourceS3Uri)
 
-        print(hil_document)
+        # tables and fields gathered into frames, for business rules and the columnar tables
+        if  rules.Rules or Columnar.Enabled:
 
-        # apply some busniness rules
-        
-        outputS3Uri.PutJSON(body = hil_document)
+            tables = Tables(None if Columnar.Enabled else rules.Tables).Read(events)
+            events = tables.Events()
+
+            # the time left for writing the output reserved
+            if  rules.Rules:
+                deadline = monotonic() + context.get_remaining_time_in_millis() / 1000 - Rules.Reserve if context else None
+                results  = rules.Apply(tables.Frames, document.ExtractMap.Language, deadline)
+
+        # the operated tables handed to reshape, or stored alongside the reshaped document when fused, reshape reads
+        # the extraction when neither rules nor columnar tables changed it
+        if  Columnar.Enabled:
+            handoff = TablesFormat.PARQUET
+            Columnar.Write(tables, Tables.Location(document.DocumentID, handoff))
+
+        elif rules.Rules and not FUSE_RESHAPE:
+            handoff = TablesFormat.JSON
+            with Tables.Location(document.DocumentID, handoff).Writer('application/json') as writer:
+                tables.Write(writer)
+
+        # the review format is only written for A2I, here when fused, by reshape from the handed off tables otherwise
+        if  FUSE_RESHAPE or not handoff:
+
+            # converted as it is read and written row by row, fused with the reshape step's empty headerColumnTypes
+            # on each table
+            with outputS3Uri.Writer('application/json') as writer:
+                TextractFormat.Write(events, document.DocumentID, writer, header_column_types = FUSE_RESHAPE, source = document.SourceS3Uri)
+
+        else:
+            outputS3Uri = Tables.Location(document.DocumentID, handoff)
 
         Logger.info(f'{STAGE} Actor : Stopped Processing DocumentID = {document.DocumentID}')
 
@@ -52,142 +90,26 @@ def lambda_handler(event, context):
 
         message.ActorGrade = FAIL
     
-    message.MapUpdates.StageS3Uri = outputS3Uri
-    message.FinalStamp            = GetCurrentStamp()
+    message.MapUpdates.StageS3Uri   = outputS3Uri
+    message.MapUpdates.Reshaped     = int(FUSE_RESHAPE)
+    message.MapUpdates.Tables       = handoff
+    message.MapUpdates.RulesApplied = sum(1 for result in results if not result.Skipped and not result.Error)
+    message.MapUpdates.RuleChanges  = sum(result.Changes for result in results)
+    message.MapUpdates.RuleFaults   = sum(result.Faults for result in results)
+    message.FinalStamp              = GetCurrentStamp()
 
     Bus.PutMessage(stage = STAGE, message_body = message.to_json())
 
-def flatten_json(nested_json, parent_key='', sep='_'):
-    """
-    Flattens a nested json file so that nested keys are collapsed into a single key.
-    For example, the nested key 'contact' having 'phone' will become 'contact_phone'.
-
-    :param nested_json: A nested json object.
-    :param parent_key: The base key from which keys will be built.
-    :param sep: Separator between nested keys.
-    :return: A new dictionary with flattened keys and values.
-    """
-    items = []
-    for key, value in nested_json.items():
-        new_key = f"{parent_key}{sep}{key}" if parent_key else key
-        if isinstance(value, dict):
-            items.extend(flatten_json(value, new_key, sep=sep).items())
-        else:
-            items.append((new_key, value))
-    return dict(items)
-
-
-def convert_to_textract_format(doc, doc_id):
-    output_data = {
-        "numPages": 1,
-        "pages": [
-            {
-                "pageNumber": 1,
-                "tables": []
-            }
-        ],
-        "tableTypes":[],
-        "metadata": {
-            "sourceDocumentUrl": f's3://{STORE_BUCKET}/acquire/{doc_id}'
-        }
-    }
-
-    attributes = {}
-
-    doc = flatten_json(doc, parent_key='', sep='_')
-
-    for key, val in doc.items():
-        if isinstance(val, dict):
-            form = create_form_table(key, val)
-            output_data["pages"][0]["tables"].append(form)
-            
-        
-        if isinstance(val, list):
-            table = create_table(key, val)
-            output_data["pages"][0]["tables"].append(table)
-
-        else:
-            attributes[key] = val
-    
-    if attributes:
-        form = create_form_table("formdata", attributes)
-        output_data["pages"][0]["tables"].append(form)
-    
-    for  table in output_data["pages"][0]["tables"]:
-        output_data["tableTypes"].append({
-            "name": table["tableType"],
-            "columnTypes": table["columnTypes"]
-        })
-
-    return output_data
-
-# Function to create a form table
-def create_form_table(table_name, data):
-    form_table = {
-        "name": table_name,
-        "tableType": "Form",
-        "columnTypes": ["Key", "Value"],
-        "rows": []
-    }
-    for key, value in data.items():
-        row = [
-            {
-                "text": key,
-                "confidence": 99.9,
-                "boundingBox": {
-                    "top": 0.0,
-                    "left": 0.0,
-                    "width": 0.1,
-                    "height": 0.02
-                },
-                "tag": f"{key.lower()}-key"
-            },
-            {
-                "text": value,
-                "confidence": 99.9,
-                "boundingBox": {
-                    "top": 0.0,
-                    "left": 0.2,
-                    "width": 0.3,
-                    "height": 0.02
-                },
-                "tag": f"{key.lower()}-value"
-            }
-        ]
-        form_table["rows"].append(row)
-    return form_table
-
-def create_table(table_name, data):
-    table = {
-        "tableType": "Table",
-        "name": table_name, 
-        "columnTypes": [],
-        "rows": []
-    }
-
-
-    for key, val in data[0].items():
-        table["columnTypes"].append(key)
-
-    for idx, item in enumerate(data):
-        table_row = []
-        for key, val in item.items():
-            table_row.append({
-                "text": val,
-                "confidence": 99.9,
-                "boundingBox": {
-                    "top": 0.0,
-                    "left": 0.0,
-                    "width": 0.0,
-                    "height": 0.0
-                },
-                "tag": f"row-{idx}-r-br"
-            })
-        
-        table["rows"].append(table_row)
-
-    return table
+    # per rule, so a slow rule shows in its latency rather than as a stage timeout
+    for result in results:
 
+        Metrics.Emit({'Stage' : STAGE, 'Rule' : result.Name}, {
+            'RuleLatency' : int(result.Seconds * 1000),
+            'RuleChanges' : result.Changes,
+            'RuleFaults'  : result.Faults,
+            'RuleSkipped' : int(result.Skipped),
+            'RuleErrors'  : int(bool(result.Error)),
+        }, units = {'RuleLatency' : 'Milliseconds'})
 
 if  __name__ == '__main__':
 
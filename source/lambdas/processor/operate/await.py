@@ -9,7 +9,7 @@ from shared.processor import AwaitProcessor
 
 def lambda_handler(event, context):
 
-    AwaitProcessor(stage = STAGE, timeoutMinutes = 30).process()
+    return AwaitProcessor(stage = STAGE, timeoutMinutes = 30, context = context, records = event.get('Records')).process()
 
 if  __name__ == '__main__':
 
@@ -10,6 +10,8 @@ from shared.document import Document
 from shared.storage  import S3Uri
 from shared.message  import Message
 from shared.bus      import Bus
+from shared.textract import TextractFormat
+from shared.tables   import Tables, TablesFormat, Columnar
 
 from traceback import print_exc
 from typing    import List
@@ -31,18 +33,22 @@ def lambda_handler(event, context):
 
         print('sourceS3Uri: ', sourceS3Uri.Url)
 
-        hil_document = sourceS3Uri.GetJSON()
-        hil_document = convert_to_textract_format(hil_document, document.DocumentID)
+        handoff = document.OperateMap.Tables
 
-        print(hil_document)
+        # the tables operate handed off, the extraction when it changed nothing
+        if  handoff == TablesFormat.PARQUET:
+            events = Columnar.Read(Tables.Location(document.DocumentID, handoff)).Events()
 
-        # Add empty tableType and headerColumnTypes to each page table
-        # (this is where A2I annotation values will go)
-        for page in hil_document['pages']:
-            for table in page['tables']:
-                table['headerColumnTypes'] = {}
+        elif handoff == TablesFormat.JSON:
+            events = TextractFormat.Read(Tables.Location(document.DocumentID, handoff))
+
+        else:
+            events = TextractFormat.Read(sourceS3Uri)
 
-        outputS3Uri.PutJSON(body = hil_document)
+        # converted as it is read and written row by row, with an empty headerColumnTypes on each table
+        # (this is where A2I annotation values will go)
+        with outputS3Uri.Writer('application/json') as writer:
+            TextractFormat.Write(events, document.DocumentID, writer, header_column_types = True, source = document.SourceS3Uri)
 
         Logger.info(f'{STAGE} Actor : Stopped Processing DocumentID = {document.DocumentID}')
 
@@ -61,138 +67,6 @@ def lambda_handler(event, context):
 
     Bus.PutMessage(stage = STAGE, message_body = message.to_json())
 
-def flatten_json(nested_json, parent_key='', sep='_'):
-    """
-    Flattens a nested json file so that nested keys are collapsed into a single key.
-    For example, the nested key 'contact' having 'phone' will become 'contact_phone'.
-
-    :param nested_json: A nested json object.
-    :param parent_key: The base key from which keys will be built.
-    :param sep: Separator between nested keys.
-    :return: A new dictionary with flattened keys and values.
-    """
-    items = []
-    for key, value in nested_json.items():
-        new_key = f"{parent_key}{sep}{key}" if parent_key else key
-        if isinstance(value, dict):
-            items.extend(flatten_json(value, new_key, sep=sep).items())
-        else:
-            items.append((new_key, value))
-    return dict(items)
-
-
-def convert_to_textract_format(doc, doc_id):
-    output_data = {
-        "numPages": 1,
-        "pages": [
-            {
-                "pageNumber": 1,
-                "tables": []
-            }
-        ],
-        "tableTypes":[],
-        "metadata": {
-            "sourceDocumentUrl": f's3://{STORE_BUCKET}/acquire/{doc_id}'
-        }
-    }
-
-    attributes = {}
-
-    doc = flatten_json(doc, parent_key='', sep='_')
-
-    for key, val in doc.items():
-        if isinstance(val, dict):
-            form = create_form_table(key, val)
-            output_data["pages"][0]["tables"].append(form)
-            
-        
-        if isinstance(val, list):
-            table = create_table(key, val)
-            output_data["pages"][0]["tables"].append(table)
-
-        else:
-            attributes[key] = val
-    
-    if attributes:
-        form = create_form_table("formdata", attributes)
-        output_data["pages"][0]["tables"].append(form)
-    
-    for  table in output_data["pages"][0]["tables"]:
-        output_data["tableTypes"].append({
-            "name": table["tableType"],
-            "columnTypes": table["columnTypes"]
-        })
-
-    return output_data
-
-# Function to create a form table
-def create_form_table(table_name, data):
-    form_table = {
-        "name": table_name,
-        "tableType": "Form",
-        "columnTypes": ["Key", "Value"],
-        "rows": []
-    }
-    for key, value in data.items():
-        row = [
-            {
-                "text": key,
-                "confidence": 99.9,
-                "boundingBox": {
-                    "top": 0.0,
-                    "left": 0.0,
-                    "width": 0.1,
-                    "height": 0.02
-                },
-                "tag": f"{key.lower()}-key"
-            },
-            {
-                "text": value,
-                "confidence": 99.9,
-                "boundingBox": {
-                    "top": 0.0,
-                    "left": 0.2,
-                    "width": 0.3,
-                    "height": 0.02
-                },
-                "tag": f"{key.lower()}-value"
-            }
-        ]
-        form_table["rows"].append(row)
-    return form_table
-
-def create_table(table_name, data):
-    table = {
-        "tableType": "Table",
-        "name": table_name, 
-        "columnTypes": [],
-        "rows": []
-    }
-
-
-    for key, val in data[0].items():
-        table["columnTypes"].append(key)
-
-    for idx, item in enumerate(data):
-        table_row = []
-        for key, val in item.items():
-            table_row.append({
-                "text": val,
-                "confidence": 99.9,
-                "boundingBox": {
-                    "top": 0.0,
-                    "left": 0.0,
-                    "width": 0.0,
-                    "height": 0.0
-                },
-                "tag": f"row-{idx}-r-br"
-            })
-        
-        table["rows"].append(table_row)
-
-    return table
-
-
 if  __name__ == '__main__':
 
     lambda_handler({'DocumentID': '001'}, None)
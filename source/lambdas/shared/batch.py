@@ -0,0 +1,422 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+from shared.defines import *
+from shared.environ import *
+from shared.helpers import *
+from shared.loggers import Logger
+
+from shared.database  import Database
+from shared.document  import Document
+from shared.message   import Message
+from shared.bus       import Bus
+from shared.store     import Store
+from shared.storage   import S3Uri
+from shared.clients   import BedrockJobClient, S3Client
+from shared.schemas   import Schemas
+from shared.inference import Inference
+from shared.processor import BeginProcessor, AwaitProcessor
+
+from botocore.exceptions import ClientError
+from concurrent.futures  import ThreadPoolExecutor
+from datetime            import datetime, timezone
+from time                import strftime
+from uuid                import uuid4
+
+class JobStatus:
+    COMPLETED = 'Completed'
+    PARTIAL   = 'PartiallyCompleted'
+    FAILED    = 'Failed'
+    STOPPED   = 'Stopped'
+    EXPIRED   = 'Expired'
+
+    FINISHED  = [COMPLETED, PARTIAL, FAILED, STOPPED, EXPIRED]
+
+class BedrockBatchRunner:
+    """
+    Bedrock batch inference jobs
+    """
+
+    def Submit(self, name: str, model_id: str, input_uri: S3Uri, output_uri: S3Uri) -> str:
+
+        return BedrockJobClient.create_model_invocation_job(
+            jobName          = name,
+            roleArn          = BatchJob.RoleArn,
+            modelId          = Inference.Profile(model_id),
+            inputDataConfig  = {'s3InputDataConfig'  : {'s3Uri' : input_uri.Url, 's3InputFormat' : 'JSONL'}},
+            outputDataConfig = {'s3OutputDataConfig' : {'s3Uri' : output_uri.Url}},
+            timeoutDurationInHours = BatchJob.TimeoutHours,
+        )['jobArn']
+
+    def Describe(self, job_arn: str) -> Dict:
+        """
+        Status of the job and the object its record outputs are written to, <output>/<job id>/<input name>.out
+        """
+
+        job = BedrockJobClient.get_model_invocation_job(jobIdentifier = job_arn)
+
+        input_key  = job['inputDataConfig']['s3InputDataConfig']['s3Uri'].split('/', 3)[3]
+        output_key = job['outputDataConfig']['s3OutputDataConfig']['s3Uri'].split('/', 3)[3]
+
+        return {
+            'status' : job['status'],
+            'input'  : S3Uri(Bucket = STORE_BUCKET, Object = input_key),
+            'output' : S3Uri(Bucket = STORE_BUCKET, Object = f'{output_key.rstrip("/")}/{job_arn.split("/")[-1]}/{input_key.split("/")[-1]}.out'),
+        }
+
+class LocalBatchRunner:
+    """
+    Stand-in for Bedrock batch inference when testing, answers every record at submission and writes the output
+    in the batch output format. Records are answered by respond(modelInput), which invokes the model on demand
+    unless replaced, e.g. with a canned response.
+    """
+
+    def __init__(self, respond = None):
+
+        self.respond = respond or (lambda model_input : Inference.Invoke(model_input, BatchJob.ModelId))
+
+    def Submit(self, name: str, model_id: str, input_uri: S3Uri, output_uri: S3Uri) -> str:
+
+        job_arn = f'local/{input_uri.Key}'
+
+        with self.Describe(job_arn)['output'].Writer('application/jsonl') as writer:
+
+            for line in input_uri.Lines():
+
+                record = loads(line)
+
+                try:
+                    record['modelOutput'] = self.respond(record['modelInput'])
+                except Exception as e:
+                    record['error'] = {'errorMessage' : str(e)}
+
+                writer.Write(f'{dumps(record)}\n'.encode('utf-8'))
+
+        return job_arn
+
+    def Describe(self, job_arn: str) -> Dict:
+
+        input_key = job_arn.split('/', 1)[1]
+        prefix    = input_key.rsplit('/', 1)[0]
+
+        return {
+            'status' : JobStatus.COMPLETED,
+            'input'  : S3Uri(Bucket = STORE_BUCKET, Object = input_key),
+            'output' : S3Uri(Bucket = STORE_BUCKET, Object = f'{prefix}/output/local/{input_key.split("/")[-1]}.out'),
+        }
+
+class BatchJob:
+    """
+    Layout of a batch job in the store, s3://<store>/batch/<stage>/<name>/
+
+        input.jsonl     one {recordId, modelInput} per document
+        records.json    recordId → DocumentID
+        output/         written by the job
+        fanning         lease of the await processor fanning the results out, taken over once older than LeaseSeconds
+        fanout          created once the results are fanned out completely, later runs skip the job
+    """
+
+    RoleArn      = GetEnvVar('BATCH_ROLE_ARN', default = '')
+    ModelId      = Inference.Foundation(EXTRACT_MODEL_ID) or None
+    TimeoutHours = GetEnvNumber('BATCH_TIMEOUT_HOURS', default = 24)
+    Runner       = LocalBatchRunner() if GetEnvVar('BATCH_RUNNER', default = 'bedrock') == 'local' else BedrockBatchRunner()
+    LeaseSeconds = 900 # the longest an await lambda runs
+
+    @staticmethod
+    def GetPrefix(input_uri: S3Uri) -> str:
+        return input_uri.Key.rsplit('/', 1)[0]
+
+    @staticmethod
+    def Head(input_uri: S3Uri, name: str) -> Dict:
+        """
+        Metadata of a marker object of the job, None when it does not exist
+        """
+
+        try:
+
+            return S3Client.head_object(Bucket = input_uri.Bucket, Key = f'{BatchJob.GetPrefix(input_uri)}/{name}')
+
+        except ClientError as e:
+
+            if  e.response['Error']['Code'] in ('NoSuchKey', 'NotFound', '404'):
+                return None
+
+            raise
+
+    @staticmethod
+    def FannedOut(input_uri: S3Uri) -> bool:
+
+        return BatchJob.Head(input_uri, 'fanout') is not None
+
+    @staticmethod
+    def Claim(input_uri: S3Uri) -> bool:
+        """
+        Conditionally take the fan-out lease, only one await processor publishes the results at a time, the lease of
+        one that raised or timed out part way is taken over once it expires
+        """
+
+        lease = BatchJob.Head(input_uri, 'fanning')
+
+        if  lease and (datetime.now(timezone.utc) - lease['LastModified']).total_seconds() < BatchJob.LeaseSeconds:
+            return False
+
+        condition = {'IfMatch' : lease['ETag']} if lease else {'IfNoneMatch' : '*'}
+
+        try:
+
+            S3Client.put_object(Bucket = input_uri.Bucket, Key = f'{BatchJob.GetPrefix(input_uri)}/fanning', Body = b'', **condition)
+
+            return True
+
+        except ClientError as e:
+
+            if  e.response['Error']['Code'] in ('PreconditionFailed', 'ConditionalRequestConflict', '412', '409'):
+                return False
+
+            raise
+
+    @staticmethod
+    def Release(input_uri: S3Uri, done: bool):
+        """
+        Give the lease back, marking the job fanned out when done, otherwise the next await processor retries it
+        """
+
+        if  done:
+            S3Client.put_object(Bucket = input_uri.Bucket, Key = f'{BatchJob.GetPrefix(input_uri)}/fanout', Body = b'')
+
+        S3Client.delete_object(Bucket = input_uri.Bucket, Key = f'{BatchJob.GetPrefix(input_uri)}/fanning')
+
+class BatchBeginProcessor(BeginProcessor):
+    """
+    Submits the waiting documents of the stage as one batch inference job once the backlog reaches minRecords,
+    smaller backlogs are dispatched to the actor on demand as usual
+    """
+
+    def __init__(self, stage, actor, retryLimit, minRecords = 100, maxRecords = 10000, maxBytes = 900 * 1024 * 1024, **kwArgs):
+
+        super().__init__(stage, actor, retryLimit, **kwArgs)
+
+        self.minRecords = minRecords # Bedrock rejects jobs with fewer records
+        self.maxRecords = maxRecords
+        self.maxBytes   = maxBytes   # bounded below the 1 GB input file quota
+
+    def process(self):
+
+        backlog = Database.CountDocuments(stages = [self.stage], states = [State.WAITING, State.HOLDING])
+
+        if  backlog < self.minRecords:
+
+            Logger.info(f'{self.stage.title()} Batch Begin Processor : Backlog = {backlog} < {self.minRecords}, Dispatching On Demand')
+
+            return self.processDocuments()
+
+        self.processBatch()
+
+    def getModelInput(self, document: Document) -> Dict:
+
+        source = document.SourceS3Uri
+        schema = Schemas.Get(document.ExtractMap.SchemaName)
+
+        return Inference.Request(source.Get(), Inference.MediaType(source.Key), schema.Body)
+
+    def processBatch(self):
+
+        # unique, two begin processors may submit within the same second
+        name      = f'{PREFIX}-{self.stage}-{strftime("%Y%m%d-%H%M%S")}-{uuid4().hex[:8]}'
+        prefix    = f'batch/{self.stage}/{name}'
+        input_uri = S3Uri(Bucket = STORE_BUCKET, Object = f'{prefix}/input.jsonl')
+        documents = list(Database.GetDocuments(stages = [self.stage], states = [State.WAITING, State.HOLDING], limit = self.maxRecords))
+        included  = []
+        records   = {}
+
+        def build(document):
+
+            try:
+                return document, self.getModelInput(document)
+            except Exception as e:
+                Logger.error(f'{self.stage.title()} Batch Begin Processor : Building Record for DocumentID = {document.DocumentID} > {str(e)}')
+                return document, None
+
+        with Database.BulkWriter() as writer, ThreadPoolExecutor(max_workers = self.maxWorkers) as executor:
+
+            with input_uri.Writer('application/jsonl') as input_writer:
+
+                # build a few records per worker at a time, the encoded documents are not all held in memory
+                for n in range(0, len(documents), 4 * self.maxWorkers):
+
+                    for document, model_input in executor.map(build, documents[n : n + 4 * self.maxWorkers]):
+
+                        if  model_input is None:
+                            self.processDispatch(writer, document, FAIL)
+                            continue
+
+                        record_id = f'R{len(included):010d}'
+                        record    = f'{dumps({"recordId" : record_id, "modelInput" : model_input})}\n'.encode('utf-8')
+
+                        # documents past the input size bound stay waiting for the next job
+                        if  input_writer.Bytes + len(record) > self.maxBytes:
+                            continue
+
+                        if  self.claimDocuments and Database.TransitionDocument(
+                            document_id = document.DocumentID,
+                            expected    = document.StageState,
+                            promoted    = f'{self.stage}{HASH}{State.RUNNING}'.title()
+                        ) != PASS:
+                            continue
+
+                        records[record_id] = document.DocumentID
+
+                        input_writer.Write(record)
+                        included.append(document)
+
+            if  not included:
+                return
+
+            S3Uri(Bucket = STORE_BUCKET, Object = f'{prefix}/records.json').PutJSON(records)
+
+            try:
+
+                job_arn = BatchJob.Runner.Submit(
+                    name       = name,
+                    model_id   = BatchJob.ModelId or Inference.ModelId(),
+                    input_uri  = input_uri,
+                    output_uri = S3Uri(Bucket = STORE_BUCKET, Object = f'{prefix}/output/'),
+                )
+                status  = PASS
+
+            except Exception as e:
+
+                Logger.error(f'{self.stage.title()} Batch Begin Processor : Submitting Job {name} > {str(e)}')
+
+                job_arn = ''
+                status  = FAIL
+
+            for document in included:
+                document.ExtractMap.BatchJobArn = job_arn
+                self.processDispatch(writer, document, status)
+
+        Logger.info(
+            f'{self.stage.title()} Batch Begin Processor : Job = {job_arn or name}, Records = {len(included)}, '
+            f'Bytes = {input_writer.Bytes}, Status = {status}'
+        )
+
+    def processRunning(self, writer, document, expected):
+        """
+        Buffered, results of a batch job only arrive once the job has finished
+        """
+
+        writer.PutDocument(document)
+
+class BatchAwaitProcessor(AwaitProcessor):
+    """
+    Polls the batch jobs of running documents and fans finished jobs out into per document outputs and stage
+    messages, which are then absorbed like any actor callback
+    """
+
+    def __init__(self, stage, timeoutMinutes, batchTimeoutMinutes = None, **kwArgs):
+
+        super().__init__(stage, timeoutMinutes, **kwArgs)
+
+        # a job may queue before its run time starts counting against the job timeout
+        self.batchTimeoutMinutes = batchTimeoutMinutes or 3 * BatchJob.TimeoutHours * 60
+
+    def process(self):
+
+        if  self.records is None:
+            self.processBatchJobs()
+
+        return super().process()
+
+    def getTimeoutMinutes(self, document):
+
+        return self.batchTimeoutMinutes if document.ExtractMap.BatchJobArn else self.timeoutMinutes
+
+    def processBatchJobs(self):
+
+        jobs = {}
+
+        for document in Database.GetDocuments(stages = [self.stage], states = [State.RUNNING]):
+            if  document.ExtractMap.BatchJobArn:
+                jobs.setdefault(document.ExtractMap.BatchJobArn, []).append(document.DocumentID)
+
+        for job_arn, document_ids in jobs.items():
+
+            job = BatchJob.Runner.Describe(job_arn)
+
+            Logger.info(f'{self.stage.title()} Batch Await Processor : Job = {job_arn}, Status = {job["status"]}, Documents = {len(document_ids)}')
+
+            if  job['status'] not in JobStatus.FINISHED or BatchJob.FannedOut(job['input']) or not BatchJob.Claim(job['input']):
+                continue
+
+            try:
+
+                self.fanOut(job_arn, job)
+
+            except Exception as e:
+
+                Logger.error(f'{self.stage.title()} Batch Await Processor : Fanning Out Job = {job_arn} > {str(e)}')
+
+                BatchJob.Release(job['input'], done = False)
+
+                continue
+
+            BatchJob.Release(job['input'], done = True)
+
+    def fanOut(self, job_arn, job):
+
+        records  = S3Uri(Bucket = STORE_BUCKET, Object = f'{BatchJob.GetPrefix(job["input"])}/records.json').GetJSON()
+        outputs  = {}
+        outcomes = {PASS : 0, FAIL : 0}
+
+        if  job['status'] in (JobStatus.COMPLETED, JobStatus.PARTIAL):
+            for line in job['output'].Lines():
+                if  line:
+                    output = loads(line)
+                    outputs[output.get('recordId')] = output
+
+        Database.Prefetch(list(records.values()))
+
+        running = f'{self.stage}{HASH}{State.RUNNING}'.title()
+
+        with Bus.Publisher(stage = self.stage) as publisher:
+
+            for record_id, document_id in records.items():
+
+                document = Database.GetDocument(document_id)
+
+                # absorbed after an earlier fan-out of the job raised part way, or no longer waiting on it
+                if  not document or document.StageState != running or document.ExtractMap.BatchJobArn != job_arn:
+                    continue
+
+                message = Message(DocumentID = document_id)
+                output  = outputs.get(record_id, {})
+                result  = Inference.ParseOutput(output['modelOutput']) if output.get('modelOutput') else None
+
+                message.MapUpdates.BatchJobArn = job_arn
+
+                if  result is None:
+
+                    Logger.warning(
+                        f'{self.stage.title()} Batch Await Processor : No Result for DocumentID = {document_id} > {output.get("error", job["status"])}'
+                    )
+
+                    message.ActorGrade = FAIL
+
+                else:
+
+                    schema = Schemas.Get(document.ExtractMap.SchemaName)
+
+                    Store.PutFile(self.stage, f'{document_id.split(".")[0]}.json', dumps(result).encode('utf-8'))
+
+                    message.MapUpdates.StageS3Uri  = S3Uri(Bucket = STORE_BUCKET, Prefix = f'{self.stage}/{document_id}')
+                    message.MapUpdates.SchemaName  = schema.Name
+                    message.MapUpdates.SchemaFault = len(schema.Validate(result))
+
+                message.FinalStamp = GetCurrentStamp()
+                outcomes[message.ActorGrade] += 1
+
+                publisher.PutMessage(message_body = message.to_json())
+
+        Logger.info(
+            f'{self.stage.title()} Batch Await Processor : Fanned Out Job = {job_arn}, PASS = {outcomes[PASS]}, FAIL = {outcomes[FAIL]}'
+        )
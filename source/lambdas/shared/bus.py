@@ -5,12 +5,285 @@ from shared.defines import *
 from shared.environ import *
 from shared.loggers import Logger
 from shared.clients import SQSResource, ServiceResource
+from shared.storage import S3Uri
+
+from base64    import b64encode, b64decode
+from gzip      import compress, decompress
+from random    import uniform
+from threading import Event, Lock, Thread
+from time      import time, sleep
+
+class Encoding:
+    PLAIN   = 'plain'
+    GZIP    = 'gzip+base64' # compressed body inlined in the message
+    OFFLOAD = 's3'          # body spilled to the store bucket, message carries its url
+
+class Publisher:
+    """
+    Buffered stage queue publisher, see Bus.Publisher
+    """
+
+    BatchSize   = 10         # SendMessageBatch entry limit
+    BatchBytes  = 256 * 1024 # SendMessageBatch payload limit
+    MaxAttempts = 5          # attempts per batch while retryable entries fail
+    BaseBackoff = 0.1        # seconds, doubled per attempt with full jitter
+
+    def __init__(self, stage):
+
+        self.stage   = stage
+        self.entries = []
+        self.bytes   = 0
+
+        self.Sent    = 0
+        self.Batches = 0
+        self.Retries = 0
+
+    def __enter__(self):
+
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+
+        self.Flush()
+
+        Logger.info(
+            f'Bus.Publisher : Stage = {self.stage}, Sent = {self.Sent}, Batches = {self.Batches}, Retries = {self.Retries}'
+        )
+
+        return False
+
+    def PutMessage(self, message_body = '', message_attributes = {}):
+
+        message_body, message_attributes = Bus.EncodeBody(self.stage, message_body, message_attributes)
+
+        size = Bus.MessageSize(message_body, message_attributes)
+
+        if  len(self.entries) >= Publisher.BatchSize or self.bytes + size > Publisher.BatchBytes:
+            self.Flush()
+
+        self.entries.append({
+            'Id'                : str(len(self.entries)),
+            'MessageBody'       : message_body,
+            'MessageAttributes' : message_attributes,
+        })
+
+        self.bytes += size
+
+        return PASS
+
+    def Flush(self):
+
+        entries, self.entries, self.bytes = self.entries, [], 0
+
+        for attempt in range(Publisher.MaxAttempts):
+
+            if  not entries:
+                break
+
+            if  attempt:
+                self.Retries += 1
+                sleep(uniform(0, Publisher.BaseBackoff * 2 ** attempt))
+
+            response = Bus.GetQueue(self.stage).send_messages(Entries = entries)
+            failed   = {failure['Id'] : failure for failure in response.get('Failed', [])}
+
+            self.Batches += 1
+            self.Sent    += len(response.get('Successful', []))
+
+            if  any(failure.get('SenderFault') for failure in failed.values()):
+                raise Exception(f'Bus.Publisher : Rejected Messages for Stage = {self.stage} > {list(failed.values())}')
+
+            entries = [entry for entry in entries if entry['Id'] in failed]
+
+        if  entries:
+            raise Exception(f'Bus.Publisher : Unsent after {Publisher.MaxAttempts} attempts, Stage = {self.stage}, Messages = {len(entries)}')
+
+class Record:
+    """
+    SQS event source mapping record exposed like a received SQS resource message
+    """
+
+    def __init__(self, record):
+
+        self.message_id         = record['messageId']
+        self.receipt_handle     = record['receiptHandle']
+        self.body               = record['body']
+        self.message_attributes = {
+            name : {'DataType' : value['dataType'], 'StringValue' : value.get('stringValue', '')}
+            for name, value in record.get('messageAttributes', {}).items()
+        }
+
+class Consumer:
+    """
+    Long-polling stage queue consumer, see Bus.Consumer
+    """
+
+    BatchSize = 10 # SQS receive, delete and visibility batch limit
+
+    def __init__(self, stage, context = None, budgetSeconds = 60, reserveSeconds = 30, waitSeconds = 20,
+                 visibilitySeconds = 120, idleReceives = 1, records = None):
+
+        self.stage             = stage
+        self.records           = [Record(record) for record in records] if records is not None else None
+        self.waitSeconds       = waitSeconds
+        self.visibilitySeconds = visibilitySeconds
+        self.idleReceives      = idleReceives
+
+        self.deadline = time() + budgetSeconds
+
+        if  context:
+            self.deadline = min(self.deadline, time() + context.get_remaining_time_in_millis() / 1000 - reserveSeconds)
+
+        self.inflight  = {} # MessageId → message received but not yet acknowledged
+        self.acked     = []
+        self.lock      = Lock()
+        self.stopped   = Event()
+        self.heartbeat = Thread(target = self.extendVisibility, daemon = True)
+
+        self.Received = 0
+        self.Receives = 0
+        self.Deleted  = 0
+        self.Extended = 0
+
+    def __enter__(self):
+
+        # the visibility of records is the event source mapping's, which holds them invisible for the invocation
+        if  self.records is None:
+            self.heartbeat.start()
+
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+
+        self.stopped.set()
+
+        if  self.heartbeat.is_alive():
+            self.heartbeat.join()
+
+        self.deleteAcked()
+
+        Logger.info(
+            f'Bus.Consumer : Stage = {self.stage}, Receives = {self.Receives}, Received = {self.Received}, '
+            f'Deleted = {self.Deleted}, Extended = {self.Extended}, Unacknowledged = {len(self.inflight)}'
+        )
+
+        return False
+
+    def Messages(self):
+        """
+        Yield messages until the queue stays empty or the time budget runs out, see Batches
+        """
+
+        for batch in self.Batches():
+            for message in batch:
+                yield message
+
+    def Batches(self):
+        """
+        Yield one receive batch at a time until the queue stays empty or the time budget runs out.
+        Acknowledged messages are deleted in batches between receives.
+        """
+
+        if  self.records is not None:
+
+            # messages already received by an event source mapping, which deletes them when the invocation succeeds
+            with self.lock:
+                self.inflight.update({record.message_id : record for record in self.records})
+
+            self.Receives += 1
+            self.Received += len(self.records)
+
+            for n in range(0, len(self.records), Consumer.BatchSize):
+                yield self.records[n:n + Consumer.BatchSize]
+
+            return
+
+        idle = 0
+
+        while idle < self.idleReceives and time() < self.deadline:
+
+            response = Bus.GetQueue(self.stage).receive_messages(
+                MaxNumberOfMessages   = Consumer.BatchSize,
+                WaitTimeSeconds       = max(0, min(self.waitSeconds, int(self.deadline - time()))),
+                VisibilityTimeout     = self.visibilitySeconds,
+                MessageAttributeNames = ['All'],
+            )
+
+            self.Receives += 1
+            self.Received += len(response)
+
+            idle = 0 if response else idle + 1
+
+            with self.lock:
+                self.inflight.update({message.message_id : message for message in response})
+
+            if  response:
+                yield response
+
+            self.deleteAcked()
+
+    def Ack(self, message):
+        """
+        Mark a message as handled, it is deleted with the next batch
+        """
+
+        with self.lock:
+            self.inflight.pop(message.message_id, None)
+            self.acked.append(message)
+
+    def Failures(self) -> List[str]:
+        """
+        MessageIds received but never acknowledged, reported back to an event source mapping as batch item failures
+        """
+
+        with self.lock:
+            return list(self.inflight)
+
+    def deleteAcked(self):
+
+        with self.lock:
+            acked, self.acked = self.acked, []
+
+        if  self.records is not None:
+            return
+
+        for n in range(0, len(acked), Consumer.BatchSize):
+
+            response = Bus.GetQueue(self.stage).delete_messages(Entries = [
+                {'Id' : str(i), 'ReceiptHandle' : message.receipt_handle} for i, message in enumerate(acked[n:n + Consumer.BatchSize])
+            ])
+
+            self.Deleted += len(response.get('Successful', []))
+
+            for failure in response.get('Failed', []):
+                Logger.warning(f'Bus.Consumer : Delete Failed for Stage = {self.stage} > {failure}')
+
+    def extendVisibility(self):
+        """
+        Keep unacknowledged messages invisible while slow handlers are still working on them
+        """
+
+        while not self.stopped.wait(self.visibilitySeconds / 2):
+
+            with self.lock:
+                inflight = list(self.inflight.values())
+
+            for n in range(0, len(inflight), Consumer.BatchSize):
+
+                response = Bus.GetQueue(self.stage).change_message_visibility_batch(Entries = [
+                    {'Id' : str(i), 'ReceiptHandle' : message.receipt_handle, 'VisibilityTimeout' : self.visibilitySeconds}
+                    for i, message in enumerate(inflight[n:n + Consumer.BatchSize])
+                ])
+
+                self.Extended += len(response.get('Successful', []))
 
 
 class Bus:
 
     Queue = {}
 
+    MaxMessageBytes = 256 * 1024 # SQS message size limit, body plus attributes
+
     def GetQueue(stage) -> ServiceResource:
 
         if  stage.lower() not in Bus.Queue:
@@ -25,11 +298,79 @@ class Bus:
 
         return Bus.Queue[stage.lower()]
 
+    def Consumer(stage = STAGE, context = None, **kwArgs) -> Consumer:
+        """
+        Context manager long-polling the stage queue within a time budget, deleting acknowledged messages in batches.
+        Given the records of an SQS event source mapping it consumes those instead of polling.
+
+            with Bus.Consumer(stage = STAGE, context = context) as consumer:
+                for message in consumer.Messages():
+                    consumer.Ack(message)
+        """
+
+        return Consumer(stage = stage, context = context, **kwArgs)
+
+    def Publisher(stage = STAGE) -> Publisher:
+        """
+        Context manager coalescing messages into SendMessageBatch calls of up to 10 entries / 256 KB, flushed on exit
+
+            with Bus.Publisher(stage = STAGE) as publisher:
+                publisher.PutMessage(message_body = message.to_json())
+        """
+
+        return Publisher(stage = stage)
+
+    def MessageSize(message_body = '', message_attributes = {}):
+
+        return len(message_body.encode('utf-8')) + sum(
+            len(name) + len(value['DataType']) + len(value.get('StringValue', '').encode('utf-8'))
+            for name, value in message_attributes.items()
+        )
+
+    def EncodeBody(stage = STAGE, message_body = '', message_attributes = {}):
+        """
+        Fit a message body within the SQS size limit, first by compressing it, otherwise by spilling it to the store bucket
+        """
+
+        if  Bus.MessageSize(message_body, message_attributes) <= Bus.MaxMessageBytes:
+            return message_body, message_attributes
+
+        encoding = Encoding.GZIP
+        encoded  = b64encode(compress(message_body.encode('utf-8'))).decode('ascii')
+        overhead = Bus.MessageSize('', {'BodyEncoding' : {'DataType' : 'String', 'StringValue' : encoding}})
+
+        if  Bus.MessageSize(encoded, message_attributes) + overhead > Bus.MaxMessageBytes:
+
+            encoding = Encoding.OFFLOAD
+            spilled  = S3Uri(Bucket = STORE_BUCKET, Object = f'bus/{stage}/{uuid4()}.json')
+            encoded  = spilled.Url
+
+            spilled.Put(message_body.encode('utf-8'), contentType = 'application/json')
+
+        Logger.info(f'Bus : Encoded Oversized Message for Stage = {stage} as {encoding}, {len(message_body)} → {len(encoded)} Bytes')
+
+        return encoded, {**message_attributes, 'BodyEncoding' : {'DataType' : 'String', 'StringValue' : encoding}}
+
+    def GetBody(message) -> str:
+        """
+        Message body as published, decoding compressed or offloaded bodies
+        """
+
+        encoding = (message.message_attributes or {}).get('BodyEncoding', {}).get('StringValue', Encoding.PLAIN)
+
+        if  encoding == Encoding.GZIP:
+            return decompress(b64decode(message.body)).decode('utf-8')
+
+        if  encoding == Encoding.OFFLOAD:
+            return S3Uri.FromUrl(message.body).GetText()
+
+        return message.body
+
     def GetMessages(stage = STAGE):
 
         while True:
 
-            response = Bus.GetQueue(stage).receive_messages(MaxNumberOfMessages = 10)
+            response = Bus.GetQueue(stage).receive_messages(MaxNumberOfMessages = 10, MessageAttributeNames = ['All'])
 
             for message in response:
                 yield message
@@ -37,6 +378,16 @@ class Bus:
             if  len(response) == 0:
                 break
 
+    def GetDepth(stage = STAGE) -> int:
+        """
+        Approximate number of messages ready to be received from the stage queue
+        """
+
+        queue = Bus.GetQueue(stage)
+        queue.reload()
+
+        return int(queue.attributes.get('ApproximateNumberOfMessages', 0))
+
     def DelMessages(stage = STAGE, receipt_handles = []):
 
         response = Bus.GetQueue(stage).delete_messages(Entries = receipt_handles)
@@ -45,6 +396,8 @@ class Bus:
 
     def PutMessage(stage = STAGE, message_body = '', message_attributes = {}):
 
+        message_body, message_attributes = Bus.EncodeBody(stage, message_body, message_attributes)
+
         response = Bus.GetQueue(stage).send_message(
             MessageBody       = message_body,
             MessageAttributes = message_attributes
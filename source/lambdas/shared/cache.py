@@ -0,0 +1,68 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+from collections import OrderedDict
+from threading   import Lock
+from time        import monotonic
+
+class LRUCache:
+    """
+    Bounded least recently used cache with a time to live per entry, safe to share between threads
+    """
+
+    def __init__(self, maxsize = 1024, ttl = 60):
+
+        self.maxsize = maxsize
+        self.ttl     = ttl
+        self.entries = OrderedDict() # key → (expiry, value)
+        self.lock    = Lock()
+
+        self.Hits   = 0
+        self.Misses = 0
+
+    def __contains__(self, key):
+
+        with self.lock:
+            return key in self.entries and self.entries[key][0] > monotonic()
+
+    def Get(self, key, default = None):
+
+        with self.lock:
+
+            expiry, value = self.entries.get(key, (0, default))
+
+            if  expiry <= monotonic():
+
+                self.entries.pop(key, None)
+                self.Misses += 1
+
+                return default
+
+            self.entries.move_to_end(key)
+            self.Hits += 1
+
+            return value
+
+    def Put(self, key, value):
+
+        with self.lock:
+
+            self.entries[key] = (monotonic() + self.ttl, value)
+            self.entries.move_to_end(key)
+
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last = False)
+
+    def Pop(self, key):
+
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def Clear(self):
+
+        with self.lock:
+            self.entries.clear()
+
+    def __str__(self):
+
+        return f'Entries = {len(self.entries)}, Hits = {self.Hits}, Misses = {self.Misses}'
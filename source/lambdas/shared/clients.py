@@ -15,6 +15,7 @@ A2IClient           = client('sagemaker-a2i-runtime')
 CloudWatchClient    = client('cloudwatch')
 LogsClient          = client('logs')
 BedrockClient       = client('bedrock-runtime')
+BedrockJobClient    = client('bedrock')
 DynamoDBClient      = client('dynamodb')
 LambdaClient        = client('lambda')
 SQSClient           = client('sqs')
@@ -2,6 +2,10 @@
 # SPDX-License-Identifier: MIT-0
 
 from boto3.dynamodb.conditions import Key
+from concurrent.futures        import ThreadPoolExecutor, as_completed
+from typing                    import Iterator, Callable
+from random                    import uniform
+from time                      import sleep
 
 from shared.defines import *
 from shared.environ import *
@@ -9,6 +13,112 @@ from shared.loggers import Logger
 from shared.clients import DynamoDBResource, Key
 
 from shared.document import Document
+from shared.cache    import LRUCache
+
+class DocumentWriter:
+    """
+    Buffered bulk writer, see Database.BulkWriter
+    """
+
+    BatchSize   = 25   # BatchWriteItem limit
+    MaxAttempts = 8    # attempts per batch while UnprocessedItems remain
+    BaseBackoff = 0.05 # seconds, doubled per attempt with full jitter
+
+    def __init__(self):
+
+        self.Buffer    = {} # DocumentID → (item, callbacks), in insertion order
+        self.Written   = 0
+        self.Batches   = 0
+        self.Retries   = 0
+        self.Coalesced = 0
+
+    def __enter__(self):
+
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+
+        # the block raised part way, its buffered writes are dropped with their callbacks and the exception propagates
+        if  exc_type:
+            Logger.warning(f'Database.BulkWriter : Discarding {len(self.Buffer)} Buffered Documents > {exc_type.__name__}: {exc_value}')
+            self.Buffer = {}
+        else:
+            self.Flush()
+
+        Logger.info(
+            f'Database.BulkWriter : Written = {self.Written}, Batches = {self.Batches}, Retries = {self.Retries}, Coalesced = {self.Coalesced}'
+        )
+
+        return False
+
+    def PutDocument(self, document: Document, callback: Callable = None):
+        """
+        Buffer a document write, a later write of the same DocumentID replaces the buffered one.
+        Database.Cache is updated and callbacks run once the write is acknowledged by DynamoDB.
+        """
+
+        document.DocID = document.DocID.lower()
+
+        if  document.DocumentID in self.Buffer:
+            self.Coalesced += 1
+
+        _, callbacks = self.Buffer.pop(document.DocumentID, (None, []))
+
+        if  callback:
+            callbacks.append(callback)
+
+        self.Buffer[document.DocumentID] = (document.to_dict(), callbacks)
+
+        if  len(self.Buffer) >= DocumentWriter.BatchSize:
+            self.Flush()
+
+        return PASS
+
+    def Flush(self):
+
+        while self.Buffer:
+
+            batch = dict(list(self.Buffer.items())[:DocumentWriter.BatchSize])
+
+            for document_id in batch:
+                del self.Buffer[document_id]
+
+            self.WriteBatch(batch)
+
+    def WriteBatch(self, batch: dict):
+
+        requests = [{'PutRequest' : {'Item' : item}} for item, _ in batch.values()]
+
+        for attempt in range(DocumentWriter.MaxAttempts):
+
+            if  attempt:
+                self.Retries += 1
+                sleep(uniform(0, DocumentWriter.BaseBackoff * 2 ** attempt))
+
+            response = DynamoDBResource.batch_write_item(RequestItems = {TABLE_PIPELINE : requests})
+            requests = response.get('UnprocessedItems', {}).get(TABLE_PIPELINE, [])
+
+            if  not requests:
+                break
+
+        self.Batches += 1
+
+        unprocessed = {request['PutRequest']['Item']['DocumentID'] for request in requests}
+
+        for document_id, (item, callbacks) in batch.items():
+
+            if  document_id in unprocessed:
+                continue
+
+            self.Written += 1
+
+            Database.Cache.Put(document_id, item)
+
+            for callback in callbacks:
+                callback()
+
+        if  unprocessed:
+            raise Exception(f'Database.BulkWriter : Unprocessed after {DocumentWriter.MaxAttempts} attempts, DocumentIDs = {sorted(unprocessed)}')
 
 class Database:
     """
@@ -17,15 +127,25 @@ class Database:
 
     Table = DynamoDBResource.Table(TABLE_PIPELINE)
 
+    QueryWorkers   =  8 # (stage, state) partitions of the progress index queried concurrently
+    PromoteWorkers = 16 # conditional promotions in flight
+    BatchGetSize   = 100 # BatchGetItem key limit
+
+    Cache = LRUCache(maxsize = 4096, ttl = 60) # items by DocumentID, see GetDocument
+
     Logger.info(f'Database Connecting! : DynamoDB Resource is {TABLE_PIPELINE}')
 
     @staticmethod
     def GetDocument(document_id: str) -> Document:
         """
-        Fetch a specific document
+        Fetch a specific document, served from Database.Cache when present
         """
 
         document_id = document_id.lower()
+        item        = Database.Cache.Get(document_id)
+
+        if  item is not None:
+            return Document.from_dict(item)
 
         try:
             response = Database.Table.get_item(Key = {'DocumentID': document_id})
@@ -42,27 +162,161 @@ class Database:
             response.get('Item') and
             response['ResponseMetadata']['HTTPStatusCode'] == 200
         ):
+            Database.Cache.Put(document_id, response['Item'])
+
             return Document.from_dict(response['Item'])
         else:
             return None
 
     @staticmethod
-    def GetDocuments(stages: List[Stage], states: List[State]) -> List[Document]:
+    def Prefetch(document_ids: List[str]):
+        """
+        Load documents missing from Database.Cache with BatchGetItem, 100 keys per call
+
+        The cache is write-through for PutDocument and for bulk writes once acknowledged, invalidated by partial updates and
+        promotions, so it only serves documents owned by the caller, e.g. RUNNING documents of the stage an await processor drains.
+        """
+
+        requested = {document_id.lower() for document_id in document_ids}
+        missing   = sorted(document_id for document_id in requested if document_id not in Database.Cache)
+
+        for n in range(0, len(missing), Database.BatchGetSize):
+
+            keys = [{'DocumentID' : document_id} for document_id in missing[n:n + Database.BatchGetSize]]
+
+            for attempt in range(DocumentWriter.MaxAttempts):
+
+                if  not keys:
+                    break
+
+                if  attempt:
+                    sleep(uniform(0, DocumentWriter.BaseBackoff * 2 ** attempt))
+
+                response = DynamoDBResource.batch_get_item(RequestItems = {TABLE_PIPELINE : {'Keys' : keys}})
+                keys     = response.get('UnprocessedKeys', {}).get(TABLE_PIPELINE, {}).get('Keys', [])
+
+                for item in response.get('Responses', {}).get(TABLE_PIPELINE, []):
+                    Database.Cache.Put(item['DocumentID'], item)
+
+        Logger.info(
+            f'Database.Prefetch : Requested = {len(document_ids)}, Fetched = {len(missing)}, Cache {Database.Cache}'
+        )
+
+    @staticmethod
+    def GetDocuments(
+        stages     : List[Stage],
+        states     : List[State],
+        limit      : int       = None,
+        order_from : str       = None,
+        order_till : str       = None,
+        attributes : List[str] = None,
+    ) -> Iterator[Document]:
         """
         Fetch a specific document set
+
+        Every (stage, state) partition of the progress index is queried concurrently and paged
+        through LastEvaluatedKey, keeping one page of read-ahead per partition. Documents are
+        yielded lazily in (stage, state, OrderStamp) order, bounded by limit and the optional
+        OrderStamp range. Passing attributes projects the items, documents fetched that way are
+        partial and must not be written back with PutDocument.
         """
 
+        partitions = [f'{stage}{HASH}{state}'.title() for stage in stages for state in states]
+        executor   = ThreadPoolExecutor(max_workers = max(1, min(Database.QueryWorkers, len(partitions))))
+
+        count, pages, capacity = 0, 0, 0.0
+
+        def query(partition, exclusive_start_key = None):
+
+            condition = Key('StageState').eq(partition)
+
+            if  order_from and order_till:
+                condition = condition & Key('OrderStamp').between(order_from, order_till)
+            elif order_from:
+                condition = condition & Key('OrderStamp').gte(order_from)
+            elif order_till:
+                condition = condition & Key('OrderStamp').lte(order_till)
+
+            params = {
+                'IndexName'              : INDEX_PROGRESS,
+                'KeyConditionExpression' : condition,
+                'ReturnConsumedCapacity' : 'TOTAL',
+            }
+
+            if  attributes:
+                params['ProjectionExpression']     = ', '.join(f'#p{n}' for n in range(len(attributes)))
+                params['ExpressionAttributeNames'] = {f'#p{n}' : name for n, name in enumerate(attributes)}
+
+            if  limit:
+                params['Limit'] = limit
+
+            if  exclusive_start_key:
+                params['ExclusiveStartKey'] = exclusive_start_key
+
+            return Database.Table.query(**params)
+
+        try:
+
+            futures = [executor.submit(query, partition) for partition in partitions]
+
+            for partition, future in zip(partitions, futures):
+
+                while future:
+
+                    if  limit and count >= limit:
+                        return
+
+                    response = future.result()
+                    items    = response.get('Items', [])
+                    pages   += 1
+                    capacity = capacity + response.get('ConsumedCapacity', {}).get('CapacityUnits', 0)
+
+                    # read ahead the next page of this partition while the current page is consumed
+                    future = executor.submit(query, partition, response['LastEvaluatedKey']) \
+                             if response.get('LastEvaluatedKey') and not (limit and count + len(items) >= limit) else None
+
+                    for item in items[:limit - count if limit else None]:
+
+                        count += 1
+
+                        yield Document.from_dict(item)
+
+        finally:
+
+            executor.shutdown(wait = False, cancel_futures = True)
+
+            Logger.info(
+                f'Database.GetDocuments : Partitions = {partitions}, Documents = {count}, Pages = {pages}, ConsumedRCU = {capacity}'
+            )
+
+    @staticmethod
+    def CountDocuments(stages: List[Stage], states: List[State]) -> int:
+        """
+        Count a specific document set without reading the items
+        """
+
+        count = 0
+
         for stage in stages:
             for state in states:
 
-                response = Database.Table.query(
-                    IndexName              = INDEX_PROGRESS,
-                    KeyConditionExpression = Key('StageState').eq(f'{stage}{HASH}{state}'.title())
-                )
+                params = {
+                    'IndexName'              : INDEX_PROGRESS,
+                    'KeyConditionExpression' : Key('StageState').eq(f'{stage}{HASH}{state}'.title()),
+                    'Select'                 : 'COUNT',
+                }
+
+                while True:
+
+                    response = Database.Table.query(**params)
+                    count   += response['Count']
 
-                for item in response['Items']:
-                    yield Document.from_dict(item)
-        return []
+                    if  not response.get('LastEvaluatedKey'):
+                        break
+
+                    params['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+        return count
 
     @staticmethod
     def PutDocument(document: Document) -> Document:
@@ -77,23 +331,166 @@ class Database:
             f'Database.PutDocument : DocumentID = {document.DocumentID}'
         )
 
-        return PASS if response['ResponseMetadata']['HTTPStatusCode'] == 200 else \
-               FAIL
+        if  response['ResponseMetadata']['HTTPStatusCode'] != 200:
+            return FAIL
+
+        Database.Cache.Put(document.DocumentID, document.to_dict())
+
+        document.Clean()
+
+        return PASS
 
     @staticmethod
-    def PromoteDocument(currentStage: Stage, nextStage: Stage):
+    def UpdateDocument(document: Document, expected: List[str] = None) -> str:
+        """
+        Update only the attributes of a document assigned since it was loaded, in one UpdateItem call.
+        Falls back to PutDocument for documents not yet stored, so do not use it on projected documents.
+        With expected, only updates a stored document whose StageState is one of expected, FAIL otherwise.
+        """
+
+        changes = document.Changes()
+
+        if  not changes:
+            return PASS
+
+        if  'DocumentID' in changes or document.DocumentID != document.DocumentID.lower():
+            return Database.PutDocument(document)
+
+        Database.Cache.Pop(document.DocumentID)
+
+        names, values, assignments = {}, {}, []
+
+        for n, (path, value) in enumerate(changes.items()):
+
+            for name in path.split('.'):
+                names[f'#{name}'] = name
+
+            values[f':v{n}'] = value
+            assignments.append(f'{".".join(f"#{name}" for name in path.split("."))} = :v{n}')
+
+        condition = 'attribute_exists(DocumentID)'
+
+        if  expected:
+
+            names['#StageState'] = 'StageState'
+            values.update({f':e{n}' : state for n, state in enumerate(expected)})
+
+            condition += f' AND #StageState IN ({", ".join(f":e{n}" for n in range(len(expected)))})'
+
+        try:
+
+            response = Database.Table.update_item(
+                Key                       = {'DocumentID' : document.DocumentID},
+                UpdateExpression          = f'SET {", ".join(assignments)}',
+                ConditionExpression       = condition,
+                ExpressionAttributeNames  = names,
+                ExpressionAttributeValues = values,
+            )
+
+        except Database.Table.meta.client.exceptions.ConditionalCheckFailedException:
+
+            if  expected:
+
+                Logger.info(f'Database.UpdateDocument : DocumentID = {document.DocumentID} is no longer {expected}, Skipping')
+
+                return FAIL
+
+            return Database.PutDocument(document)
+
+        Logger.info(
+            f'Database.UpdateDocument : DocumentID = {document.DocumentID}, Attributes = {list(changes)}'
+        )
+
+        if  response['ResponseMetadata']['HTTPStatusCode'] != 200:
+            return FAIL
+
+        document.Clean()
+
+        return PASS
+
+    @staticmethod
+    def BulkWriter() -> DocumentWriter:
+        """
+        Context manager buffering document writes into 25 item BatchWriteItem calls, flushed on exit
+
+            with Database.BulkWriter() as writer:
+                writer.PutDocument(document)
+        """
+
+        return DocumentWriter()
+
+    @staticmethod
+    def TransitionDocument(document_id: str, expected: str, promoted: str) -> str:
+        """
+        Move a document from the expected StageState to another with a conditional UpdateItem,
+        FAIL when the document is no longer in the expected StageState
+        """
+
+        Database.Cache.Pop(document_id)
+
+        try:
+
+            Database.Table.update_item(
+                Key                       = {'DocumentID' : document_id},
+                UpdateExpression          = 'SET #StageState = :promoted',
+                ConditionExpression       = '#StageState = :expected',
+                ExpressionAttributeNames  = {'#StageState' : 'StageState'},
+                ExpressionAttributeValues = {':promoted' : promoted, ':expected' : expected},
+            )
+
+        except Database.Table.meta.client.exceptions.ConditionalCheckFailedException:
+
+            Logger.info(f'Database.TransitionDocument : DocumentID = {document_id} is no longer {expected}, Skipping')
+
+            return FAIL
+
+        Logger.info(f'Database.TransitionDocument : DocumentID = {document_id}, {expected} → {promoted}')
+
+        return PASS
+
+    @staticmethod
+    def PromoteDocument(currentStage: Stage, nextStage: Stage) -> Dict[str, int]:
         """
         Promote documents in SUCCESS state from current stage to next stage WAITING state
         """
 
-        for documentToUpdate in Database.GetDocuments([currentStage], [State.SUCCESS]):
+        return Database.PromoteDocuments(transitions = [(currentStage, nextStage)])
+
+    @staticmethod
+    def PromoteDocuments(transitions: List[tuple], max_workers: int = None) -> Dict[str, int]:
+        """
+        Promote documents in SUCCESS state to the WAITING state of the next stage for every (current, next) transition
+
+        Each document is moved by a conditional UpdateItem on its expected StageState, run on a bounded thread pool.
+        Documents whose state changed since the index was read are counted as conflicted and left untouched.
+        """
+
+        counts = {'Promoted' : 0, 'Conflicted' : 0}
+
+        def promote(document_id, expected, promoted):
+
+            return 'Promoted' if Database.TransitionDocument(document_id, expected, promoted) == PASS else \
+                   'Conflicted'
+
+        with ThreadPoolExecutor(max_workers = max_workers or Database.PromoteWorkers) as executor:
+
+            futures = [
+                executor.submit(
+                    promote,
+                    document.DocumentID,
+                    f'{currentStage}{HASH}{State.SUCCESS}'.title(),
+                    f'{nextStage}{HASH}{State.WAITING}'.title()
+                )
+                for currentStage, nextStage in transitions
+                for document in Database.GetDocuments([currentStage], [State.SUCCESS], attributes = ['DocumentID'])
+            ]
 
-            Logger.info(f'Moving {documentToUpdate} stage to {nextStage}')
+            for future in as_completed(futures):
+                counts[future.result()] += 1
 
-            documentToUpdate.Stage = nextStage
-            documentToUpdate.State = State.WAITING
+        Logger.info(f'Database.PromoteDocuments : Transitions = {transitions}, Counts = {counts}')
 
-            Database.PutDocument(documentToUpdate)
+        return counts
 
 if __name__ == '__main__':
 
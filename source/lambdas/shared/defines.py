@@ -42,6 +42,17 @@ class Stage:
     AUGMENT  = 'augment'
     CATALOG  = 'catalog'
 
+# stages a document passes through in order, documents are promoted from one to the next
+STAGE_TRANSITIONS_ORDER = [
+                        #    Stage.ACQUIRE,
+                        #    Stage.CONVERT,
+                            Stage.EXTRACT,
+                            Stage.OPERATE,
+                            Stage.RESHAPE,
+                            Stage.AUGMENT,
+                            Stage.CATALOG
+                           ]
+
 class State:
     WAITING = 'waiting'
     RUNNING = 'running'
@@ -55,3 +66,11 @@ class AugmentState(State):
     RUNNING_PRIMARY = 'running-primary'
     WAITING_QUALITY = 'waiting-quality'
     RUNNING_QUALITY = 'running-quality'
+
+class PipelineMode:
+    POLLING = 'polling' # state machine promotes and processes every stage on a fixed cycle
+    EVENT   = 'event'   # table stream and queue events drive each transition, the state machine only sweeps
+
+class ExtractMode:
+    ONDEMAND = 'ondemand' # extract actor invokes Bedrock once per document
+    BATCH    = 'batch'    # waiting backlogs are submitted as Bedrock batch inference jobs
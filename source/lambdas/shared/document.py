@@ -2,10 +2,11 @@
 # SPDX-License-Identifier: MIT-0
 
 from shared.defines import *
+from shared.environ import STORE_BUCKET
 from shared.loggers import Logger
 from shared.storage import S3Uri
 
-from dataclasses import asdict, dataclass, fields, _MISSING_TYPE
+from dataclasses import asdict, dataclass, fields, is_dataclass, _MISSING_TYPE
 from typing      import Union, Any
 from json        import JSONEncoder, loads
 
@@ -15,8 +16,28 @@ class DocumentEncoder(JSONEncoder):
             return int(o)
         return super(DocumentEncoder, self).default(o)
 
+class Tracked:
+    """
+    Records assignments to dataclass fields so only changed attributes need to be written.
+    Only assignments are seen, mutate lists or nested objects by assigning a new value.
+    """
+
+    def __setattr__(self, name, value):
+
+        object.__setattr__(self, name, value)
+
+        if  name in self.__dataclass_fields__:
+            self.__dict__.setdefault('_dirty', set()).add(name)
+
+    @property
+    def Dirty(self) -> set:
+        return self.__dict__.get('_dirty', set())
+
+    def Clean(self):
+        self.__dict__['_dirty'] = set()
+
 @dataclass
-class StageMap:
+class StageMap(Tracked):
 
     RetryCount: Decimal = 0
     StageS3Uri: S3Uri   = field(default_factory = S3Uri)
@@ -38,6 +59,8 @@ class StageMap:
             else:
                 setattr(stageMap, field, value)
 
+        stageMap.Clean()
+
         return stageMap
 
 # region Stage Maps
@@ -53,6 +76,22 @@ class ConvertMap(StageMap):
 @dataclass
 class ExtractMap(StageMap):
     S3Uri: str = '' 
+    SchemaName: str      = 'invoice' # schema/<SchemaName>_schema.json in the store
+    SchemaFault: Decimal = 0         # output values violating the schema
+    ResultCache: str     = ''        # hit when the output was reused from an identical earlier extraction
+    BatchJobArn: str     = ''        # batch inference job extracting the document, empty when invoked on demand
+    PageChunks: Decimal  = 0         # page ranges extracted separately and merged, 0 when extracted whole
+    Throttles: Decimal   = 0         # Bedrock throttling responses retried while extracting
+    ModelId: str         = ''        # model whose output was kept when routing, empty when routing is off
+    Escalated: Decimal   = 0         # models escalated to after the output of a cheaper one failed its checks
+    Attempts: list       = field(default_factory = list) # ModelId, LatencyMs, InputTokens, OutputTokens, Faults per model tried
+    PromptCacheRead: Decimal  = 0    # input tokens of the schema and instructions read from the prompt cache
+    PromptCacheWrite: Decimal = 0    # input tokens written to the prompt cache, by the first call of a cached prefix
+    Language: str        = ''        # ISO 639-1 language detected from the text layer, 'und' without one
+    Script: str          = ''        # dominant script of the text layer, e.g. latin, han, kana
+    MaxTokens: Decimal   = 0         # output token budget sized for the language and length of the document
+    Path: str            = ''        # text when extracted from the PDF text layer, image when from its pages
+    TextConfidence: Decimal = 0      # percent confidence that the text layer holds everything its pages show
 
 @dataclass
 class ReshapeMap(StageMap):
@@ -60,7 +99,11 @@ class ReshapeMap(StageMap):
 
 @dataclass
 class OperateMap(StageMap):
-    pass
+    Reshaped: Decimal = 0 # 1 when the reshape step ran in the operate actor, StageS3Uri is then the reshaped document
+    RulesApplied: Decimal = 0 # business rules from rules/<SchemaName>_rules.json run on the document
+    RuleChanges: Decimal  = 0 # values the rules normalized, parsed or filled
+    RuleFaults: Decimal   = 0 # values the rules could not parse, reconcile or look up
+    Tables: str           = '' # json or parquet, the operated tables reshape reads, empty when it reads the extraction
 
 @dataclass
 class AugmentMap(StageMap):
@@ -74,7 +117,7 @@ class CatalogMap(StageMap):
 
 # endregion
 @dataclass
-class Document:
+class Document(Tracked):
     """
     Document Abstraction Object
     """
@@ -132,6 +175,18 @@ class Document:
     @property
     def CurrentMap(self) -> StageMap:
         return getattr(self, f'{self.Stage.title()}Map')
+
+    @property
+    def SourceS3Uri(self) -> S3Uri:
+        """
+        The uploaded document where the S3 trigger found it, e.g. acquire/<priority>/<schema>/<file>, or
+        acquire/<DocumentID> for documents ingested without it
+        """
+
+        if  self.AcquireMap.StageS3Uri.Object:
+            return self.AcquireMap.StageS3Uri
+
+        return S3Uri(Bucket = STORE_BUCKET, Object = f'acquire/{self.DocumentID}')
     
     @property
     def DocID(self):
@@ -152,6 +207,8 @@ class Document:
             else:
                 setattr(document, field, value)
 
+        document.Clean()
+
         return document
 
     @staticmethod
@@ -164,6 +221,37 @@ class Document:
     def to_dict(self):
         return asdict(self)
 
+    def Changes(self) -> Dict[str, Any]:
+        """
+        Attribute paths assigned since the document was loaded, e.g. 'StageState' or 'ExtractMap.ActorGrade'
+        """
+
+        def serialize(value):
+            return asdict(value) if is_dataclass(value) else value
+
+        changes = {}
+
+        for name in self.__dataclass_fields__:
+
+            value = getattr(self, name)
+
+            if  name in self.Dirty:
+                changes[name] = serialize(value)
+
+            elif isinstance(value, StageMap):
+                for key in value.Dirty:
+                    changes[f'{name}.{key}'] = serialize(getattr(value, key))
+
+        return changes
+
+    def Clean(self):
+
+        super().Clean()
+
+        for name in self.__dataclass_fields__:
+            if  isinstance(getattr(self, name), Tracked):
+                getattr(self, name).Clean()
+
 
 if  __name__ == '__main__':
 
@@ -1,7 +1,8 @@
 # Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
 # SPDX-License-Identifier: MIT-0
 
-from shared.helpers import GetEnvVar, GetAccount, GetRegion, GetPrefix, GetBranch
+from shared.helpers import GetEnvVar, GetEnvNumber, GetAccount, GetRegion, GetPrefix, GetBranch
+from shared.defines import Stage, STAGE_TRANSITIONS_ORDER
 
 # region Load Dependencies
 
@@ -23,14 +24,42 @@ else:
 
 # endregion
 
+PIPELINE_MODE = GetEnvVar('PIPELINE_MODE', default = 'polling').lower()
+
+# 'true' runs the reshape step in process at the end of the operate actor, documents skip the reshape stage
+FUSE_RESHAPE = GetEnvVar('FUSE_RESHAPE', default = 'false').lower() == 'true'
+
+# (stage, next stage) documents are promoted along, fused operate goes straight to augment while documents already
+# in reshape still drain to it
+STAGE_TRANSITIONS = [
+    (stage, Stage.AUGMENT if FUSE_RESHAPE and stage == Stage.OPERATE else following)
+    for stage, following in zip(STAGE_TRANSITIONS_ORDER, STAGE_TRANSITIONS_ORDER[1:])
+]
+
+# extract stage: 'ondemand' invokes Bedrock per document, 'batch' submits waiting backlogs as batch inference jobs
+EXTRACT_MODE     = GetEnvVar('EXTRACT_MODE',     default = 'ondemand').lower()
+EXTRACT_MODEL_ID = GetEnvVar('EXTRACT_MODEL_ID', default = '')
+
+# prompt caching of the schema and instructions for schemas without their own 'x-prompt-cache' setting
+PROMPT_CACHE = GetEnvVar('PROMPT_CACHE', default = 'false').lower() == 'true'
+
+# pipeline state machine standby between cycles, adapted by the promote manager to the backlog
+STANDBY_MIN_SECONDS = GetEnvNumber('STANDBY_MIN_SECONDS', default =   5)
+STANDBY_MAX_SECONDS = GetEnvNumber('STANDBY_MAX_SECONDS', default = 120)
+STANDBY_IDLE_CYCLES = GetEnvNumber('STANDBY_IDLE_CYCLES', default =   4)
+
 # region Construct Resource Names
 
 TABLE_PIPELINE  = f'{PREFIX}-table-pipeline'.lower()
+TABLE_LIMITER   = f'{PREFIX}-table-limiter'.lower()
 INDEX_PROGRESS  = f'{PREFIX}-index-progress'.lower()
 STORE_BUCKET    = f'{PREFIX}-store-document-{ACCOUNT}'.lower()
 STAGE_QUEUE     = f'{PREFIX}-queue-{STAGE}'.lower()
 STAGE_ACTOR     = f'{PREFIX}-processor-{STAGE}-actor'.lower()
 
+def STAGE_BEGIN(stage = STAGE):
+    return f'{PREFIX}-processor-{stage}-begin'.lower()
+
 STATE_PIPELINE_ARN = f'arn:aws:states:{REGION}:{ACCOUNT}:stateMachine:{PREFIX}-state-pipeline'
 
 # endregion
@@ -0,0 +1,130 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+from shared.defines   import *
+from shared.environ   import *
+from shared.loggers   import Logger
+from shared.inference import Inference, PROMPT
+from shared.pdf       import Pdf
+
+from concurrent.futures import ThreadPoolExecutor
+from time               import time
+
+class Merge:
+    """
+    Folds partial extractions of one document into a single result of its schema
+
+    - arrays are concatenated in page order, e.g. line items spread over several pages
+    - objects are merged field by field
+    - scalars keep the first value seen that is not empty, later disagreeing values are counted as conflicts
+    """
+
+    def __init__(self):
+        self.Conflicts = 0
+
+    @staticmethod
+    def isEmpty(value) -> bool:
+        return value is None or value == '' or value == [] or value == {}
+
+    def Results(self, results: List):
+
+        merged = None
+
+        for result in results:
+            merged = self.merge(merged, result)
+
+        return merged
+
+    def merge(self, first, later):
+
+        if  Merge.isEmpty(later):
+            return first
+
+        if  Merge.isEmpty(first):
+            return later
+
+        if  isinstance(first, list) and isinstance(later, list):
+            return first + later
+
+        if  isinstance(first, dict) and isinstance(later, dict):
+            return {key : self.merge(first.get(key), later.get(key)) for key in {**first, **later}}
+
+        if  first != later:
+            self.Conflicts += 1
+
+        return first
+
+class PageExtraction:
+    """
+    Extracts a PDF in page ranges of ChunkPages pages, at most Workers ranges at a time, and merges the results
+
+    Each range is sent as its own PDF, so output tokens are spent per range rather than capped for the whole
+    document and the model latency of the ranges overlaps.
+    """
+
+    ChunkPages = GetEnvNumber('EXTRACT_CHUNK_PAGES',   default = 0) # 0 extracts whole documents
+    Workers    = GetEnvNumber('EXTRACT_CHUNK_WORKERS', default = 4)
+
+    @staticmethod
+    def Applies(content: bytes, chunk_pages: int = None) -> bool:
+
+        chunk_pages = PageExtraction.ChunkPages if chunk_pages is None else chunk_pages
+
+        return chunk_pages > 0 and Pdf.IsPdf(content) and Pdf.PageCount(content) > chunk_pages
+
+    @staticmethod
+    def GetNote(pages: range, page_count: int) -> str:
+
+        return (
+            f'You are viewing pages {pages.start + 1} to {pages.stop} of a {page_count} page document. '
+            f'Extract only what appears on these pages and leave fields that do not appear on them empty.'
+        )
+
+    @staticmethod
+    def Run(content: bytes, schema: Dict, chunk_pages: int = None, workers: int = None, max_tokens = 5000, invoke = None, model_id: str = None, cache = False, prompt = PROMPT) -> Dict:
+        """
+        Returns {'output', 'token_usage', 'pages', 'chunks', 'conflicts', 'elapsed'}
+        """
+
+        chunk_pages = chunk_pages or PageExtraction.ChunkPages
+        workers     = workers     or PageExtraction.Workers
+        invoke      = invoke      or (lambda request: Inference.Invoke(request, model_id))
+        started     = time()
+
+        page_count  = Pdf.PageCount(content)
+        ranges      = Pdf.Ranges(page_count, chunk_pages)
+
+        def extract(pages, chunk):
+
+            response = invoke(Inference.Request(
+                chunk, 'application/pdf', schema, max_tokens = max_tokens, prompt = prompt, note = PageExtraction.GetNote(pages, page_count), cache = cache
+            ))
+
+            output = Inference.ParseOutput(response)
+
+            if  output is None:
+                raise Exception(f'PageExtraction : Pages {pages.start + 1}-{pages.stop} Returned No JSON')
+
+            return output, Inference.Usage(response)
+
+        with ThreadPoolExecutor(max_workers = workers) as executor:
+            extracted = list(executor.map(extract, ranges, Pdf.Split(content, ranges)))
+
+        merge = Merge()
+        usage = {key : sum(u[key] for _, u in extracted) for key in Inference.UsageKeys}
+
+        result = {
+            'output'      : merge.Results([output for output, _ in extracted]),
+            'token_usage' : usage,
+            'pages'       : page_count,
+            'chunks'      : len(ranges),
+            'conflicts'   : merge.Conflicts,
+            'elapsed'     : time() - started,
+        }
+
+        Logger.info(
+            f'PageExtraction.Run : Pages = {page_count}, Chunks = {len(ranges)}, Workers = {workers}, '
+            f'Conflicts = {merge.Conflicts}, Tokens = {usage}, Elapsed = {result["elapsed"]:.2f}s'
+        )
+
+        return result
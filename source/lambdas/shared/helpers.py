@@ -59,3 +59,14 @@ def GetEnvVar(name, default = None):
             return default
         raise Exception(f'Failed to load environment variable: "{name}"')
     return var
+
+def GetEnvNumber(name, default, kind = int):
+    """Environment variable parsed as a number of kind, the default when it is unset or does not parse."""
+
+    value = GetEnvVar(name, default = str(default))
+
+    try:
+        return kind(value)
+    except ValueError:
+        Logger.warning(f'GetEnvNumber : {name} = {value} Is Not {kind.__name__}, Using {default}')
+        return kind(default)
@@ -0,0 +1,200 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+from shared.defines import *
+from shared.environ import *
+from shared.helpers import GetEnvVar
+from shared.loggers import Logger
+from shared.clients import BedrockClient
+from shared.limiter import RateLimiter
+
+from base64 import b64decode, b64encode
+from re     import DOTALL, search
+
+# extraction instructions, shared by the on-demand actor and batch requests so both produce the same output
+PROMPT = '''Extract all textual and numerical information from the provided document with maximum accuracy and comprehensiveness.
+                        Output Instructions:
+                            Use the schema provided. Please in your generated output include only generated json nothing else
+                        
+                        Example Output Format:
+                        {'abc': 123, "bcd": [], cda: {}, dca: "abc"}
+                        '''
+
+SYSTEM = '''You are an expert document analysis system.
+- Given the pages of a document, answer truthfully and accurately with verbatim text from the document.
+- Do not add any preamble or conclusion to your responses, just provide the answer.
+- Do not guess or make assumptions without evidence.
+- Strictly extract the values from the document in the language present in the document. Do not translate the values unless specifically instructed to do so.
+- Always respond using the user provided JSON Schema and wrap it in three backticks.'''
+
+class Inference:
+    """
+    Anthropic messages requests for Bedrock, built directly where rhubarb does not reach (batch jobs)
+
+    Model ids are configured and recorded as foundation model ids, e.g. anthropic.claude-sonnet-4-6, and invoked
+    through the cross region inference profile of CrossRegion, e.g. us.anthropic.claude-sonnet-4-6, as rhubarb does
+    with its cross_region_inference. On demand Claude 4 models are only offered through inference profiles.
+    """
+
+    AnthropicVersion = 'bedrock-2023-05-31'
+    CrossRegion      = GetEnvVar('EXTRACT_CROSS_REGION', default = 'us').lower().replace('none', '')
+    Geographies      = ('us', 'eu', 'apac', 'global', 'us-gov', 'jp', 'au', 'ca')
+    UsageKeys        = ['input_tokens', 'output_tokens', 'cache_read_input_tokens', 'cache_creation_input_tokens']
+    PageTokens       = 1600 # input tokens of a document page or image, as a full page rendered at the model resolution
+
+    MediaTypes = {
+        'pdf'  : 'application/pdf',
+        'png'  : 'image/png',
+        'jpg'  : 'image/jpeg',
+        'jpeg' : 'image/jpeg',
+        'gif'  : 'image/gif',
+        'webp' : 'image/webp',
+    }
+
+    @staticmethod
+    def ModelId() -> str:
+        """
+        EXTRACT_MODEL_ID when configured, otherwise the default model of the installed rhubarb
+        """
+
+        if  EXTRACT_MODEL_ID:
+            return Inference.Foundation(EXTRACT_MODEL_ID)
+
+        from rhubarb import DocAnalysis
+
+        return DocAnalysis.model_fields['modelId'].default.value
+
+    @staticmethod
+    def Foundation(model_id: str) -> str:
+        """
+        The foundation model id of a model or inference profile id, us.anthropic.claude-sonnet-4-6 → anthropic.claude-sonnet-4-6
+        """
+
+        geography, _, rest = model_id.partition('.')
+
+        return rest if geography in Inference.Geographies and '.' in rest else model_id
+
+    @staticmethod
+    def Profile(model_id: str) -> str:
+        """
+        The id Bedrock is called with, the inference profile of CrossRegion or the foundation model when it is empty
+        """
+
+        model_id = Inference.Foundation(model_id)
+
+        return f'{Inference.CrossRegion}.{model_id}' if Inference.CrossRegion else model_id
+
+    @staticmethod
+    def MediaType(key: str) -> str:
+
+        return Inference.MediaTypes.get(key.split('.')[-1].lower(), 'application/pdf')
+
+    @staticmethod
+    def Request(content: bytes, media_type: str, schema: Dict, max_tokens = 5000, temperature = 0, prompt = PROMPT, note = '', cache = False) -> Dict:
+        """
+        Messages request extracting content into schema, note adds instructions for this request only
+
+        A text/plain content is the text layer of a document and is sent as text instead of a document or image.
+
+        With cache the schema and prompt move into the system prompt ahead of the document and are marked as a
+        cacheable prefix, so calls sharing them are billed and processed as cache reads after the first.
+        """
+
+        if  media_type == 'text/plain':
+
+            document = {'type' : 'text', 'text' : f'<document>\n{content.decode("utf-8")}\n</document>'}
+
+        else:
+
+            source   = {'type' : 'base64', 'media_type' : media_type, 'data' : b64encode(content).decode('ascii')}
+            document = {'type' : 'document' if media_type == 'application/pdf' else 'image', 'source' : source}
+
+        question = f'Given the following schema:\n<schema>{dumps(schema)}</schema>\n<question>{prompt}</question>'
+
+        if  cache:
+
+            system  = [{'type' : 'text', 'text' : f'{SYSTEM}\n\n{question}', 'cache_control' : {'type' : 'ephemeral'}}]
+            content = [document, {'type' : 'text', 'text' : note or 'Extract the document.'}]
+
+        else:
+
+            system  = SYSTEM
+            content = [document, {'type' : 'text', 'text' : f'{question}\n{note}' if note else question}]
+
+        return {
+            'anthropic_version' : Inference.AnthropicVersion,
+            'max_tokens'        : max_tokens,
+            'temperature'       : temperature,
+            'system'            : system,
+            'messages'          : [{'role' : 'user', 'content' : content}]
+        }
+
+    @staticmethod
+    def ParseOutput(response: Dict):
+        """
+        JSON object from the text of a messages response, with or without a fenced code block, None when unparsable
+        """
+
+        text  = ''.join(block.get('text', '') for block in response.get('content', []) if block.get('type') == 'text')
+        fence = search(r'```(?:json)?\s*(.*?)```', text, DOTALL)
+
+        try:
+
+            return loads(fence.group(1) if fence else text)
+
+        except ValueError:
+
+            Logger.warning(f'Inference.ParseOutput : Unparsable Output > {text[:200]}')
+
+            return None
+
+    @staticmethod
+    def Usage(response: Dict) -> Dict:
+
+        usage = response.get('usage', {})
+
+        return {key : usage.get(key, 0) for key in Inference.UsageKeys}
+
+    @staticmethod
+    def EstimateTokens(request: Dict) -> int:
+        """
+        Tokens a request counts against the tokens per minute quota before it runs, its input plus max_tokens
+        """
+
+        from shared.pdf import Pdf
+
+        system = request.get('system', '')
+        tokens = len(system if isinstance(system, str) else ''.join(block['text'] for block in system)) // 4 + request.get('max_tokens', 0)
+
+        for message in request.get('messages', []):
+            for block in message['content']:
+
+                # by bytes, a CJK character of a text layer is about a token where four latin ones are
+                if  block['type'] == 'text':
+                    tokens += len(block['text'].encode('utf-8')) // 4
+
+                elif block['source']['media_type'] == 'application/pdf':
+                    tokens += Inference.PageTokens * Pdf.PageCount(b64decode(block['source']['data']))
+
+                else:
+                    tokens += Inference.PageTokens
+
+        return tokens
+
+    @staticmethod
+    def Invoke(request: Dict, model_id: str = None) -> Dict:
+
+        model_id = Inference.Foundation(model_id or Inference.ModelId())
+
+        def invoke():
+
+            response = BedrockClient.invoke_model(
+                modelId     = Inference.Profile(model_id),
+                body        = dumps(request),
+                contentType = 'application/json',
+                accept      = 'application/json',
+            )
+
+            return loads(response['body'].read())
+
+        return RateLimiter.For(model_id).Call(invoke, tokens = Inference.EstimateTokens(request), usage = Inference.Usage)
@@ -0,0 +1,213 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+from shared.defines   import *
+from shared.environ   import *
+from shared.helpers   import GetEnvVar, GetEnvNumber
+from shared.loggers   import Logger
+from shared.inference import Inference, PROMPT
+from shared.pdf       import Pdf
+
+from collections import Counter
+from re          import findall
+
+# prompt notes per language, appended to the extraction instructions
+DECIMAL_COMMA = (
+    'Amounts may be written with a comma as the decimal separator and a period or space between thousands, '
+    'e.g. 1.234,56, output numbers with a period as the decimal separator. Dates are usually written day first.'
+)
+
+NOTES = {
+    'ja' : 'The document is in Japanese. Copy names, addresses and descriptions exactly as written, including '
+           'full-width characters. Dates may be written as 2024年6月5日 or in the Japanese era calendar.',
+    'zh' : 'The document is in Chinese. Copy names, addresses and descriptions exactly as written, without '
+           'converting between simplified and traditional characters. Dates may be written as 2024年6月5日.',
+    'ko' : 'The document is in Korean. Copy names, addresses and descriptions exactly as written in Hangul.',
+    **{
+        language : f'The document is in {name}. {DECIMAL_COMMA}'
+        for language, name in [('hr', 'Croatian'), ('de', 'German'), ('fr', 'French'), ('es', 'Spanish'), ('it', 'Italian'),
+                               ('pt', 'Portuguese'), ('nl', 'Dutch'), ('pl', 'Polish'), ('ru', 'Russian'), ('uk', 'Ukrainian'),
+                               ('sr', 'Serbian')]
+    },
+}
+
+class Script:
+    LATIN      = 'latin'
+    HAN        = 'han'
+    KANA       = 'kana'
+    HANGUL     = 'hangul'
+    CYRILLIC   = 'cyrillic'
+    GREEK      = 'greek'
+    ARABIC     = 'arabic'
+    HEBREW     = 'hebrew'
+    DEVANAGARI = 'devanagari'
+    THAI       = 'thai'
+
+    Ranges = [
+        (0x3040, 0x30FF, KANA),     (0x31F0, 0x31FF, KANA),
+        (0x3400, 0x4DBF, HAN),      (0x4E00, 0x9FFF, HAN),    (0xF900, 0xFAFF, HAN),
+        (0x1100, 0x11FF, HANGUL),   (0xAC00, 0xD7AF, HANGUL),
+        (0x0400, 0x04FF, CYRILLIC), (0x0370, 0x03FF, GREEK),
+        (0x0600, 0x06FF, ARABIC),   (0x0590, 0x05FF, HEBREW),
+        (0x0900, 0x097F, DEVANAGARI), (0x0E00, 0x0E7F, THAI),
+    ]
+
+    # output tokens per character of the script, CJK characters are about a token each, latin words several characters
+    TokensPerCharacter = {
+        LATIN : 0.3, CYRILLIC : 0.45, GREEK : 0.5, ARABIC : 0.5, HEBREW : 0.5,
+        DEVANAGARI : 0.8, THAI : 0.8, HANGUL : 0.9, HAN : 1.0, KANA : 1.0,
+    }
+
+    @staticmethod
+    def Of(ch: str) -> str:
+
+        code = ord(ch)
+
+        if  ch.isalpha() and code < 0x250:
+            return Script.LATIN
+
+        for first, last, script in Script.Ranges:
+            if  first <= code <= last:
+                return script
+
+        return None
+
+@dataclass
+class Detection:
+    """
+    Language and script detected from the text of a document, with the prompt, output budget and model they select
+    """
+
+    Language  : str = 'und' # ISO 639-1, 'und' when there is no text to detect from
+    Script    : str = ''
+    Characters: int = 0     # characters other than spaces in the text detected from, the text copied out when extracting
+
+    @property
+    def Prompt(self) -> str:
+
+        note = NOTES.get(self.Language)
+
+        return f'{PROMPT}\n{note}' if note else PROMPT
+
+    @property
+    def MaxTokens(self) -> int:
+        """
+        Output tokens for the document: its text copied out at the tokens per character of its script plus the
+        JSON around it, or the fixed default when nothing was detected. Never below the default, short documents
+        keep the budget they were extracted with before detection and only long ones are given more
+        """
+
+        if  not self.Characters:
+            return LanguageDetector.DefaultMaxTokens
+
+        tokens = 1500 + 2 * self.Characters * Script.TokensPerCharacter.get(self.Script, 0.5)
+
+        return int(min(LanguageDetector.MaxTokens, max(LanguageDetector.MinTokens, tokens)))
+
+    @property
+    def ModelId(self) -> str:
+        return LanguageDetector.Models.get(self.Language)
+
+class LanguageDetector:
+    """
+    Local script and language detection from the text layer of the first pages of a PDF
+
+    Scripts are counted per character. Kana marks Japanese, Han without kana Chinese, latin text is scored against
+    the letters and words distinctive of each language. Images and scanned PDFs have no text layer and stay 'und',
+    extracted with the default prompt and budget.
+    """
+
+    Enabled          = GetEnvVar('LANGUAGE_DETECTION', default = 'true').lower() == 'true'
+    MaxPages         = 3
+    DefaultMaxTokens = 5000
+    MinTokens        = DefaultMaxTokens # a truncated output is not retried, so the budget only ever grows
+    MaxTokens        = GetEnvNumber('EXTRACT_MAX_TOKENS', default = 8192)
+
+    # 'ja=<model id>,zh=<model id>', languages without a model use the extraction model
+    Models = {
+        language.strip() : Inference.Foundation(model.strip())
+        for language, model in (pair.split('=', 1) for pair in GetEnvVar('EXTRACT_LANGUAGE_MODELS', default = '').split(',') if '=' in pair)
+    }
+
+    # distinctive letters, frequent words on invoices and statements
+    Latin = {
+        'hr' : ('čćđšž',      {'i', 'je', 'za', 'na', 'od', 'računa', 'datum', 'ukupno', 'porez', 'cijena', 'količina', 'hvala', 'pdv'}),
+        'de' : ('äöüß',       {'und', 'der', 'die', 'das', 'rechnung', 'datum', 'betrag', 'gesamt', 'mwst', 'steuer', 'preis'}),
+        'fr' : ('éèêàçù',     {'le', 'la', 'les', 'et', 'de', 'facture', 'montant', 'total', 'tva', 'prix', 'quantité'}),
+        'es' : ('ñáíóú¿¡',    {'el', 'la', 'los', 'y', 'de', 'factura', 'fecha', 'importe', 'total', 'iva', 'precio'}),
+        'it' : ('àèìòù',      {'il', 'la', 'e', 'di', 'fattura', 'data', 'importo', 'totale', 'iva', 'prezzo'}),
+        'pt' : ('ãõç',        {'o', 'a', 'e', 'de', 'fatura', 'data', 'valor', 'total', 'preço', 'iva'}),
+        'nl' : ('ë',          {'de', 'het', 'en', 'van', 'factuur', 'datum', 'bedrag', 'totaal', 'btw', 'prijs'}),
+        'pl' : ('ąęłńśźż',    {'i', 'w', 'na', 'faktura', 'data', 'kwota', 'razem', 'vat', 'cena', 'sprzedaży'}),
+        'en' : ('',           {'the', 'and', 'of', 'invoice', 'date', 'amount', 'total', 'tax', 'price', 'due', 'qty'}),
+    }
+
+    @staticmethod
+    def Text(content: bytes) -> str:
+
+        return Pdf.Text(content, LanguageDetector.MaxPages) if Pdf.IsPdf(content) else ''
+
+    @staticmethod
+    def Detect(text: str, scale: float = 1.0) -> Detection:
+        """
+        scale extrapolates the letters counted to the whole document when only its first pages were read
+        """
+
+        scripts = Counter(script for script in map(Script.Of, text) if script)
+        letters = sum(scripts.values())
+
+        if  not letters:
+            return Detection()
+
+        script = scripts.most_common(1)[0][0]
+
+        if  scripts[Script.KANA] and scripts[Script.KANA] >= 0.05 * (scripts[Script.KANA] + scripts[Script.HAN]):
+            language, script = 'ja', Script.KANA
+
+        elif script == Script.HAN:
+            language = 'zh'
+
+        elif script == Script.LATIN:
+            language = LanguageDetector.scoreLatin(text)
+
+        elif script == Script.CYRILLIC:
+            language = 'uk' if set('іїєґ') & set(text.lower()) else 'sr' if set('ђћџљњ') & set(text.lower()) else 'ru'
+
+        else:
+            language = {
+                Script.HANGUL : 'ko', Script.GREEK : 'el', Script.ARABIC : 'ar', Script.HEBREW : 'he',
+                Script.DEVANAGARI : 'hi', Script.THAI : 'th',
+            }[script]
+
+        return Detection(Language = language, Script = script, Characters = int(len(''.join(text.split())) * scale))
+
+    @staticmethod
+    def scoreLatin(text: str) -> str:
+
+        lowered = text.lower()
+        words   = Counter(findall(r'[^\W\d_]+', lowered))
+        scores  = {
+            language : 2 * sum(lowered.count(ch) for ch in letters) + sum(words[word] for word in common)
+            for language, (letters, common) in LanguageDetector.Latin.items()
+        }
+
+        language, score = max(scores.items(), key = lambda item: item[1])
+
+        return language if score else 'en'
+
+    @staticmethod
+    def Run(content: bytes, layout: List[str] = None) -> Detection:
+        """
+        layout is the text of every page when already read, saving a second pass over the PDF
+        """
+
+        pages     = len(layout) if layout else Pdf.PageCount(content) if Pdf.IsPdf(content) else 1
+        text      = '\n'.join(layout[:LanguageDetector.MaxPages]) if layout else LanguageDetector.Text(content)
+        detection = LanguageDetector.Detect(text, scale = pages / min(pages, LanguageDetector.MaxPages))
+
+        Logger.info(
+            f'LanguageDetector.Run : Language = {detection.Language}, Script = {detection.Script}, '
+            f'Characters = {detection.Characters}, MaxTokens = {detection.MaxTokens}, ModelId = {detection.ModelId}'
+        )
+
+        return detection
@@ -0,0 +1,307 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+from shared.defines import *
+from shared.environ import *
+from shared.helpers import GetEnvVar, GetEnvNumber
+from shared.loggers import Logger
+from shared.metrics import Metrics
+
+from botocore.exceptions import ClientError
+from random              import uniform
+from threading           import Lock
+from time                import monotonic, sleep, time
+
+class MemoryBucket:
+    """
+    Token bucket refilled continuously to capacity every minute, shared by the threads of one container
+    """
+
+    def __init__(self, name: str, capacity: int):
+
+        self.name     = name
+        self.capacity = capacity
+        self.rate     = capacity / 60.0 # per second
+        self.level    = float(capacity)
+        self.stamp    = monotonic()
+        self.lock     = Lock()
+
+    def Take(self, amount: float) -> float:
+        """
+        Takes amount from the bucket and returns 0, or returns the seconds until amount is available
+        """
+
+        amount = min(amount, self.capacity)
+
+        with self.lock:
+
+            now        = monotonic()
+            self.level = min(self.capacity, self.level + (now - self.stamp) * self.rate)
+            self.stamp = now
+
+            if  self.level >= amount:
+
+                self.level -= amount
+
+                return 0
+
+            return (amount - self.level) / self.rate
+
+    def Give(self, amount: float):
+        """
+        Returns an over reservation to the bucket, or debits an under reservation when amount is negative
+        """
+
+        with self.lock:
+            self.level = min(self.capacity, self.level + amount)
+
+class DynamoDBBucket:
+    """
+    Token bucket kept as one item of the limiter table, shared by every concurrent actor of the deployment
+
+    Takes are optimistic: the level is refilled from the stamp of the item read and written back on condition that
+    no other actor has written it since.
+    """
+
+    MaxConflicts = 8
+
+    def __init__(self, name: str, capacity: int):
+
+        from shared.clients import DynamoDBResource
+
+        self.name     = name
+        self.capacity = capacity
+        self.rate     = capacity / 60.0 # per second
+        self.table    = DynamoDBResource.Table(TABLE_LIMITER)
+
+    def Take(self, amount: float) -> float:
+
+        amount = min(amount, self.capacity)
+
+        for _ in range(DynamoDBBucket.MaxConflicts):
+
+            item  = self.table.get_item(Key = {'Bucket' : self.name}, ConsistentRead = True).get('Item')
+            now   = time()
+            stamp = item['Stamp'] if item else None
+            level = float(self.capacity) if not item else min(self.capacity, float(item['Level']) + (now - float(stamp)) * self.rate)
+
+            if  level < amount:
+                return (amount - level) / self.rate
+
+            try:
+
+                self.table.put_item(
+                    Item                      = {'Bucket' : self.name, 'Level' : Decimal(f'{level - amount:.3f}'), 'Stamp' : Decimal(f'{now:.3f}')},
+                    ConditionExpression       = 'attribute_not_exists(Stamp) OR Stamp = :stamp',
+                    ExpressionAttributeValues = {':stamp' : stamp if stamp is not None else Decimal(0)},
+                )
+
+                return 0
+
+            except ClientError as e:
+
+                if  e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                    raise
+
+        # lost every race, wait a moment as if the bucket were empty
+        return uniform(0, 1)
+
+    def Give(self, amount: float):
+
+        if  not amount:
+            return
+
+        try:
+
+            self.table.update_item(
+                Key                       = {'Bucket' : self.name},
+                UpdateExpression          = 'ADD #level :amount',
+                ConditionExpression       = 'attribute_exists(Stamp)',
+                ExpressionAttributeNames  = {'#level' : 'Level'},
+                ExpressionAttributeValues = {':amount' : Decimal(f'{amount:.3f}')},
+            )
+
+        except ClientError as e:
+
+            if  e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                raise
+
+class RateLimiter:
+    """
+    Client side requests per minute and tokens per minute budgets for one Bedrock model, with jittered exponential
+    backoff when Bedrock throttles anyway
+
+    Tokens are reserved before each call from an estimate of its input plus max_tokens, as Bedrock quotas count them,
+    and settled against the usage it reports. A budget of 0 is not limited.
+    """
+
+    RequestsPerMinute = GetEnvNumber('BEDROCK_REQUESTS_PER_MINUTE', default = 0)
+    TokensPerMinute   = GetEnvNumber('BEDROCK_TOKENS_PER_MINUTE',   default = 0)
+    Backend           = GetEnvVar('RATE_LIMITER', default = 'dynamodb').lower() # 'dynamodb' or 'memory'
+
+    MaxAttempts    = 6
+    BaseBackoff    = 1.0   # seconds, doubled per attempt with full jitter
+    MaxBackoff     = 30.0
+    MaxWaitSeconds = 300.0 # waiting on the budgets longer than this fails the call
+
+    ThrottleCodes  = {'ThrottlingException', 'TooManyRequestsException', 'ServiceUnavailableException', 'ModelNotReadyException'}
+
+    Limiters = {}
+    Lock     = Lock()
+
+    def __init__(self, name: str, requests_per_minute: int = None, tokens_per_minute: int = None, backend: str = None):
+
+        requests_per_minute = RateLimiter.RequestsPerMinute if requests_per_minute is None else requests_per_minute
+        tokens_per_minute   = RateLimiter.TokensPerMinute   if tokens_per_minute   is None else tokens_per_minute
+        bucket              = DynamoDBBucket if (backend or RateLimiter.Backend) == 'dynamodb' else MemoryBucket
+
+        self.name     = name
+        self.requests = bucket(f'{name}#requests', requests_per_minute) if requests_per_minute else None
+        self.tokens   = bucket(f'{name}#tokens',   tokens_per_minute)   if tokens_per_minute   else None
+        self.lock     = Lock()
+
+        self.Calls     = 0
+        self.Throttles = 0
+        self.Retries   = 0
+        self.Waited    = 0.0
+
+    @staticmethod
+    def For(model_id: str) -> 'RateLimiter':
+        """
+        One limiter per model for the life of the container, quotas apply per model
+        """
+
+        with RateLimiter.Lock:
+
+            if  model_id not in RateLimiter.Limiters:
+                RateLimiter.Limiters[model_id] = RateLimiter(model_id)
+
+            return RateLimiter.Limiters[model_id]
+
+    @staticmethod
+    def IsThrottle(error: BaseException) -> bool:
+        """
+        True for Bedrock throttling, also when wrapped by another exception, e.g. the RuntimeError rhubarb's retry
+        context manager raises from its second attempt
+        """
+
+        while error is not None:
+
+            if  isinstance(error, ClientError) and error.response.get('Error', {}).get('Code') in RateLimiter.ThrottleCodes:
+                return True
+
+            error = error.__cause__ or error.__context__
+
+        return False
+
+    def count(self, **counts):
+
+        with self.lock:
+            for name, value in counts.items():
+                setattr(self, name, getattr(self, name) + value)
+
+    def Acquire(self, tokens: int = 0) -> float:
+        """
+        Blocks until one request and tokens are within budget, returns the seconds waited
+        """
+
+        waited = 0.0
+
+        for bucket, amount in [(self.requests, 1), (self.tokens, tokens)]:
+
+            while bucket and amount:
+
+                wait = bucket.Take(amount)
+
+                if  not wait:
+                    break
+
+                if  waited + wait > RateLimiter.MaxWaitSeconds:
+                    raise Exception(f'RateLimiter.Acquire : {bucket.name} Over Budget for {RateLimiter.MaxWaitSeconds:.0f}s')
+
+                # jitter spreads the actors that found the bucket empty at the same time
+                wait = uniform(wait, 1.5 * wait)
+
+                sleep(wait)
+
+                waited += wait
+
+        self.count(Waited = waited)
+
+        return waited
+
+    def Settle(self, reserved: int, used: int):
+
+        if  self.tokens and reserved != used:
+            self.tokens.Give(reserved - used)
+
+    def Call(self, invoke, tokens: int = 0, usage = None):
+        """
+        Calls invoke within the budgets and retries it while throttled, usage maps its response to
+        {'input_tokens', 'output_tokens'} to settle the tokens reserved
+        """
+
+        for attempt in range(RateLimiter.MaxAttempts):
+
+            self.Acquire(tokens)
+            self.count(Calls = 1)
+
+            try:
+
+                response = invoke()
+
+            except Exception as e:
+
+                if  not RateLimiter.IsThrottle(e):
+                    raise
+
+                self.count(Throttles = 1)
+
+                if  attempt + 1 == RateLimiter.MaxAttempts:
+                    raise
+
+                backoff = uniform(0, min(RateLimiter.MaxBackoff, RateLimiter.BaseBackoff * 2 ** attempt))
+
+                Logger.warning(f'RateLimiter.Call : {self.name} Throttled, Attempt = {attempt + 1}, Backoff = {backoff:.2f}s')
+
+                self.count(Retries = 1, Waited = backoff)
+
+                sleep(backoff)
+
+                continue
+
+            if  usage:
+
+                used = usage(response)
+
+                self.Settle(tokens, used.get('input_tokens', 0) + used.get('output_tokens', 0))
+
+            return response
+
+    @staticmethod
+    def Emit(stage: str = STAGE) -> Dict:
+        """
+        Emits the counts of every limiter of the container summed, returns them
+        """
+
+        totals = {}
+
+        for limiter in list(RateLimiter.Limiters.values()):
+
+            with limiter.lock:
+
+                counts = {'Calls' : limiter.Calls, 'Throttles' : limiter.Throttles, 'Retries' : limiter.Retries, 'Waited' : limiter.Waited}
+
+                limiter.Calls, limiter.Throttles, limiter.Retries, limiter.Waited = 0, 0, 0, 0.0
+
+            for name, value in counts.items():
+                totals[name] = totals.get(name, 0) + value
+
+        Metrics.Emit({'Stage' : stage}, {
+            'BedrockCalls'     : totals.get('Calls',     0),
+            'BedrockThrottles' : totals.get('Throttles', 0),
+            'BedrockRetries'   : totals.get('Retries',   0),
+            'RateLimitWait'    : totals.get('Waited',    0.0),
+        }, units = {'RateLimitWait' : 'Seconds'})
+
+        return totals
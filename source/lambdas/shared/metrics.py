@@ -0,0 +1,39 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+from shared.defines import *
+from shared.environ import *
+
+from time import time
+
+class Metrics:
+    """
+    CloudWatch Embedded Metric Format emitter
+    Metrics are printed as one JSON line and extracted from the Lambda log stream, no API calls are made.
+    """
+
+    Namespace = f'{PREFIX}-pipeline'
+
+    @staticmethod
+    def Emit(dimensions: Dict[str, str], metrics: Dict[str, float], units: Dict[str, str] = {}):
+
+        print(dumps({
+            '_aws' :
+            {
+                'Timestamp'         : int(time() * 1000),
+                'CloudWatchMetrics' :
+                [
+                    {
+                        'Namespace'  : Metrics.Namespace,
+                        'Dimensions' : [list(dimensions)],
+                        'Metrics'    : [{'Name' : name, 'Unit' : units.get(name, 'Count')} for name in metrics],
+                    }
+                ]
+            },
+            **dimensions,
+            **metrics,
+        }))
+
+if  __name__ == '__main__':
+
+    Metrics.Emit({'Stage' : STAGE}, {'Dispatched' : 10, 'Elapsed' : 1.5}, units = {'Elapsed' : 'Seconds'})
@@ -0,0 +1,148 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+from shared.defines import *
+
+from io        import BytesIO
+from pypdfium2 import PdfDocument
+
+class Pdf:
+    """
+    Page level operations on PDF bytes
+    """
+
+    @staticmethod
+    def IsPdf(content: bytes) -> bool:
+        return content[:5] == b'%PDF-'
+
+    @staticmethod
+    def PageCount(content: bytes) -> int:
+
+        pdf = PdfDocument(content)
+
+        try:
+            return len(pdf)
+        finally:
+            pdf.close()
+
+    @staticmethod
+    def Text(content: bytes, max_pages: int = None) -> str:
+        """
+        Text layer of the first max_pages pages, empty for scanned pages without one
+        """
+
+        pdf = PdfDocument(content)
+
+        try:
+
+            texts = []
+
+            for index in range(min(len(pdf), max_pages or len(pdf))):
+
+                page     = pdf[index]
+                textpage = page.get_textpage()
+
+                texts.append(textpage.get_text_range())
+
+                textpage.close()
+                page.close()
+
+            return '\n'.join(texts)
+
+        finally:
+            pdf.close()
+
+    @staticmethod
+    def Layout(content: bytes, columns: int = 120) -> List[str]:
+        """
+        Text layer of every page laid out as lines of text, its segments placed on a grid of columns across the page
+        so that tables keep their columns and labels stay beside their values
+        """
+
+        pdf   = PdfDocument(content)
+        pages = []
+
+        try:
+
+            for page in pdf:
+
+                textpage = page.get_textpage()
+                cell     = page.get_width() / columns
+                segments = []
+
+                for index in range(textpage.count_rects()):
+
+                    left, bottom, right, top = textpage.get_rect(index)
+                    text                     = textpage.get_text_bounded(left, bottom, right, top).strip()
+
+                    if  text:
+                        segments.append((top, bottom, left, text))
+
+                # top down, a segment joins the line whose height spans its middle
+                lines = []
+
+                for top, bottom, left, text in sorted(segments, key = lambda segment: (-segment[0], segment[2])):
+
+                    if  lines and lines[-1][1] <= (top + bottom) / 2 <= lines[-1][0]:
+                        lines[-1][2].append((left, text))
+                    else:
+                        lines.append((top, bottom, [(left, text)]))
+
+                texts = []
+
+                for _, _, parts in lines:
+
+                    line = ''
+
+                    for left, text in sorted(parts):
+                        line += ' ' * max(1 if line else 0, int(left / cell) - len(line)) + text
+
+                    texts.append(line)
+
+                # the left margin of the page carries no layout, only tokens
+                margin = min((len(text) - len(text.lstrip()) for text in texts), default = 0)
+
+                pages.append('\n'.join(text[margin:] for text in texts))
+
+                textpage.close()
+                page.close()
+
+        finally:
+            pdf.close()
+
+        return pages
+
+    @staticmethod
+    def Ranges(page_count: int, chunk_pages: int) -> List[range]:
+        """
+        Consecutive zero based page ranges of at most chunk_pages pages
+        """
+
+        return [range(start, min(start + chunk_pages, page_count)) for start in range(0, page_count, chunk_pages)]
+
+    @staticmethod
+    def Split(content: bytes, ranges: List[range]) -> List[bytes]:
+        """
+        One standalone PDF per page range
+        """
+
+        source = PdfDocument(content)
+        chunks = []
+
+        try:
+
+            for pages in ranges:
+
+                chunk  = PdfDocument.new()
+                buffer = BytesIO()
+
+                chunk.import_pages(source, list(pages))
+                chunk.save(buffer)
+                chunk.close()
+
+                chunks.append(buffer.getvalue())
+
+        finally:
+            source.close()
+
+        return chunks
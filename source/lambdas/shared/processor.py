@@ -10,13 +10,21 @@ from shared.database import Database
 from shared.action   import Action
 from shared.bus      import Bus
 from shared.message  import Message
+from shared.metrics  import Metrics
+
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, as_completed, wait
+from functools          import partial
+from time               import time
 
 class BeginProcessor(object):
-    def __init__(self, stage, actor, retryLimit, **kwArgs):
+    def __init__(self, stage, actor, retryLimit, maxWorkers = 1, maxInFlight = None, claimDocuments = False, **kwArgs):
 
-        self.stage      = stage
-        self.actor      = actor
-        self.retryLimit = retryLimit
+        self.stage          = stage
+        self.actor          = actor
+        self.retryLimit     = retryLimit
+        self.maxWorkers     = maxWorkers     # actor invocations dispatched concurrently
+        self.maxInFlight    = maxInFlight    # cap on RUNNING documents of the stage, None for no cap
+        self.claimDocuments = claimDocuments # claim each document before invoking, when begin processors may overlap
 
         self.__dict__.update(kwArgs)
 
@@ -26,64 +34,160 @@ class BeginProcessor(object):
 
     def processDocuments(self):
 
-        exitLoop = 0
-        outcomes = []
+        outcomes = {PASS : 0, FAIL : 0, SKIP : 0}
+        started  = time()
+        capacity = None
 
-        for document in Database.GetDocuments(
-            stages = [self.stage], states = [State.WAITING, State.HOLDING]
-        ):
-
-            status = Action.Invoke(
-                function_name = self.actor,
-                payload_bytes = document.to_json().encode('utf-8'),
-            )
+        if  self.maxInFlight is not None:
 
-            outcomes.append(status)
+            capacity = self.maxInFlight - Database.CountDocuments(stages = [self.stage], states = [State.RUNNING])
 
-            if  status == PASS:
+            if  capacity <= 0:
 
                 Logger.info(
-                    f'{self.stage.title()} Begin Processor : Launching Actor for DocumentID = {document.DocumentID}, Invoke = PASS'
+                    f'{self.stage.title()} Begin Processor : {self.maxInFlight} Documents In Flight, Skipping Dispatch'
                 )
+                return
 
-                document.State                 = State.RUNNING
-                document.CurrentMap.ActorGrade = Grade.BUSY
-                document.CurrentMap.StartStamp = GetCurrentStamp()
+        def dispatch(document):
 
-            else:
+            if  self.claimDocuments and Database.TransitionDocument(
+                document_id = document.DocumentID,
+                expected    = document.StageState,
+                promoted    = f'{self.stage}{HASH}{State.RUNNING}'.title()
+            ) != PASS:
+                return document, SKIP
 
-                Logger.info(
-                    f'{self.stage.title()} Begin Processor : Launching Actor for DocumentID = {document.DocumentID}, Invoke = FAIL'
+            try:
+
+                return document, Action.Invoke(
+                    function_name = self.actor,
+                    payload_bytes = document.to_json().encode('utf-8'),
+                )
+
+            except Exception as e:
+
+                Logger.error(
+                    f'{self.stage.title()} Begin Processor : Launching Actor for DocumentID = {document.DocumentID} > {str(e)}'
                 )
 
-                document.State                  = State.HOLDING
-                document.CurrentMap.ActorGrade  = Grade.WAIT
-                document.CurrentMap.RetryCount += 1
+                return document, FAIL
+
+        with Database.BulkWriter() as writer, ThreadPoolExecutor(max_workers = self.maxWorkers) as executor:
+
+            pending = set()
+
+            for document in Database.GetDocuments(
+                stages = [self.stage], states = [State.WAITING, State.HOLDING], limit = capacity
+            ):
+
+                pending.add(executor.submit(dispatch, document))
+
+                # keep at most two invocations queued per worker so documents keep streaming from the index
+                if  len(pending) >= 2 * self.maxWorkers:
+
+                    done, pending = wait(pending, return_when = FIRST_COMPLETED)
+
+                    for future in done:
+                        outcomes[self.processDispatch(writer, *future.result())] += 1
+
+            for future in as_completed(pending):
+                outcomes[self.processDispatch(writer, *future.result())] += 1
+
+        elapsed = time() - started
+
+        Logger.info(
+            f'{self.stage.title()} Begin Processor : {sum(outcomes.values())} Documents Processed, '
+            f'Invoke PASS = {outcomes[PASS]}, FAIL = {outcomes[FAIL]}, SKIP = {outcomes[SKIP]}, Elapsed = {elapsed:.2f}s, '
+            f'Throughput = {sum(outcomes.values()) / elapsed if elapsed else 0:.1f}/s'
+        )
+
+        Metrics.Emit(
+            dimensions = {'Stage' : self.stage},
+            metrics    =
+            {
+                'DispatchPass'       : outcomes[PASS],
+                'DispatchFail'       : outcomes[FAIL],
+                'DispatchElapsed'    : elapsed,
+                'DispatchThroughput' : sum(outcomes.values()) / elapsed if elapsed else 0,
+            },
+            units      = {'DispatchElapsed' : 'Seconds', 'DispatchThroughput' : 'Count/Second'}
+        )
+
+    def processDispatch(self, writer, document, status):
+        """
+        Record the outcome of one actor invocation on its document, failed documents are held for a retry
+        """
+
+        if  status == SKIP:
+
+            Logger.info(
+                f'{self.stage.title()} Begin Processor : DocumentID = {document.DocumentID} Claimed Elsewhere, Skipping'
+            )
+
+            return status
+
+        if  status == PASS:
+
+            Logger.info(
+                f'{self.stage.title()} Begin Processor : Launching Actor for DocumentID = {document.DocumentID}, Invoke = PASS'
+            )
 
-                if document.CurrentMap.RetryCount > self.retryLimit:
-                    document.State = State.FAILURE
+            # dispatched, or already claimed as running
+            expected = [document.StageState, f'{self.stage}{HASH}{State.RUNNING}'.title()]
 
-                exitLoop = True
+            document.State                 = State.RUNNING
+            document.CurrentMap.ActorGrade = Grade.BUSY
+            document.CurrentMap.StartStamp = GetCurrentStamp()
 
-            Database.PutDocument(document)
+            self.processRunning(writer, document, expected)
 
-            if  exitLoop:
-                break
+            return status
 
         Logger.info(
-            f'{self.stage.title()} Begin Processor : {len(outcomes)} Documents Processed'
+            f'{self.stage.title()} Begin Processor : Launching Actor for DocumentID = {document.DocumentID}, Invoke = FAIL'
         )
 
+        document.State                  = State.HOLDING
+        document.CurrentMap.ActorGrade  = Grade.WAIT
+        document.CurrentMap.RetryCount += 1
+
+        if document.CurrentMap.RetryCount > self.retryLimit:
+            document.State = State.FAILURE
+
+        writer.PutDocument(document)
+
+        return status
+
+    def processRunning(self, writer, document, expected):
+        """
+        Record a dispatched document as running, written now and only over its dispatched state: the actor is already
+        running and the await processor may have recorded its result, a buffered write landing after it would put the
+        document back to RUNNING until it times out
+        """
+
+        Database.UpdateDocument(document, expected = expected)
+
 
 class AwaitProcessor(object):
-    def __init__(self, stage, timeoutMinutes):
+    def __init__(self, stage, timeoutMinutes, context = None, drainSeconds = 60, records = None):
 
         self.stage          = stage
         self.timeoutMinutes = timeoutMinutes
+        self.context        = context      # lambda context, bounds the drain by the remaining execution time
+        self.drainSeconds   = drainSeconds # time budget for draining the stage queue
+        self.records        = records      # messages delivered by an SQS event source mapping, None to poll the queue
+        self.failures       = []
 
     def process(self):
 
         self.processCallbackEvents()
+
+        if  self.records is not None:
+
+            # time-outs are left to the sweeping state machine when driven by queue events
+            return {'batchItemFailures' : [{'itemIdentifier' : failure} for failure in self.failures]}
+
         self.processTimeouts()
 
     def processCallbackEvents(self):
@@ -92,62 +196,80 @@ class AwaitProcessor(object):
         Process completion events from asynchronous requests coming through the stage event bus.
         """
 
-        for wrapper in Bus.GetMessages(stage = self.stage):
+        # documents cached by an earlier invocation of a warm container may have moved on since
+        Database.Cache.Clear()
 
-            message  = Message(**loads(wrapper.body))
-            document = Database.GetDocument(document_id = message.DocumentID)
+        with Bus.Consumer(stage = self.stage, context = self.context, budgetSeconds = self.drainSeconds, records = self.records) as consumer, \
+             Database.BulkWriter() as writer:
 
-            if  not document:
+            for batch in consumer.Batches():
 
-                Logger.info(
-                    f'{self.stage.title()} Await Processor : Received Callback for DocumentID = {message.DocumentID}, Unable to Find in Database'
-                )
-                wrapper.delete()
-                continue
+                messages = [(wrapper, Message(**loads(Bus.GetBody(wrapper)))) for wrapper in batch]
 
-            # absorb message.MapUpdates into document
-            for key, value in message.MapUpdates.items():
+                Database.Prefetch(document_ids = [message.DocumentID for _, message in messages])
 
-                Logger.info(
-                    f'{self.stage.title()} Await Processor : Updating CurrentMap from Message > {key:>10} = {value}'
-                )
+                for wrapper, message in messages:
 
-                setattr(document.CurrentMap, key, value) # TODO Fix StageS3Uri from becoming a Dictionary
+                    document = Database.GetDocument(document_id = message.DocumentID)
 
-            print("document.CurrentMap", document.CurrentMap)
+                    if  not document:
 
-            if  message.ActorGrade == Grade.PASS:
+                        Logger.info(
+                            f'{self.stage.title()} Await Processor : Received Callback for DocumentID = {message.DocumentID}, Unable to Find in Database'
+                        )
+                        consumer.Ack(wrapper)
+                        continue
 
-                document.State = State.SUCCESS
+                    # absorb message.MapUpdates into document
+                    for key, value in message.MapUpdates.items():
 
-                self.processCallbackEventsMore(message)
+                        Logger.info(
+                            f'{self.stage.title()} Await Processor : Updating CurrentMap from Message > {key:>10} = {value}'
+                        )
 
-                document.CurrentMap.ActorGrade = message.ActorGrade
-                document.CurrentMap.FinalStamp = GetCurrentStamp()
+                        setattr(document.CurrentMap, key, value) # TODO Fix StageS3Uri from becoming a Dictionary
 
-                Logger.info(
-                    f'{self.stage.title()} Await Processor : Received Callback for DocumentID = {message.DocumentID}, Status is PASS'
-                )
+                    print("document.CurrentMap", document.CurrentMap)
 
-            else:
+                    if  message.ActorGrade == Grade.PASS:
 
-                document.State                 = State.FAILURE
-                document.CurrentMap.ActorGrade = message.ActorGrade
-                document.CurrentMap.FinalStamp = GetCurrentStamp()
+                        document.State = State.SUCCESS
 
-                self.processCallbackEventsMore(message)
+                        self.processCallbackEventsMore(message)
 
-                Logger.info(
-                    f'{self.stage.title()} Await Processor : Received Callback for DocumentID = {message.DocumentID}, Status is FAIL'
-                )
+                        document.CurrentMap.ActorGrade = message.ActorGrade
+                        document.CurrentMap.FinalStamp = GetCurrentStamp()
+
+                        Logger.info(
+                            f'{self.stage.title()} Await Processor : Received Callback for DocumentID = {message.DocumentID}, Status is PASS'
+                        )
+
+                    else:
+
+                        document.State                 = State.FAILURE
+                        document.CurrentMap.ActorGrade = message.ActorGrade
+                        document.CurrentMap.FinalStamp = GetCurrentStamp()
+
+                        self.processCallbackEventsMore(message)
 
-            Database.PutDocument(document)
+                        Logger.info(
+                            f'{self.stage.title()} Await Processor : Received Callback for DocumentID = {message.DocumentID}, Status is FAIL'
+                        )
 
-            wrapper.delete()
+                    writer.PutDocument(document, callback = partial(consumer.Ack, wrapper))
+
+        self.failures = consumer.Failures()
+
+        Logger.info(
+            f'{self.stage.title()} Await Processor : Document Cache {Database.Cache}'
+        )
 
     def processCallbackEventsMore(self, message):
         pass
 
+    def getTimeoutMinutes(self, document):
+        return self.timeoutMinutes
+
     def processTimeouts(self):
         """
         Ascertain errant asynchronous requests which have not yet completed by a pre-specified time limit.
@@ -157,21 +279,23 @@ class AwaitProcessor(object):
 
             return datetime.now() > datetime.fromisoformat(begin_stamp) + timedelta(minutes = minutes)
 
-        for document in Database.GetDocuments(
-            stages = [self.stage], states = [State.RUNNING]
-        ):
+        with Database.BulkWriter() as writer:
 
-            if  isOverTime(document.CurrentMap.StartStamp, minutes = self.timeoutMinutes):
+            for document in Database.GetDocuments(
+                stages = [self.stage], states = [State.RUNNING]
+            ):
 
-                document.State                 = State.TIMEOUT
-                document.CurrentMap.ActorGrade = Grade.TIME
-                document.CurrentMap.FinalStamp = GetCurrentStamp()
+                if  isOverTime(document.CurrentMap.StartStamp, minutes = self.getTimeoutMinutes(document)):
 
-                Logger.info(
-                    f'{self.stage.title()} Await Processor : Detected Time-Out for DocumentID = {document.DocumentID}'
-                )
+                    document.State                 = State.TIMEOUT
+                    document.CurrentMap.ActorGrade = Grade.TIME
+                    document.CurrentMap.FinalStamp = GetCurrentStamp()
+
+                    Logger.info(
+                        f'{self.stage.title()} Await Processor : Detected Time-Out for DocumentID = {document.DocumentID}'
+                    )
 
-                Database.PutDocument(document)
+                    writer.PutDocument(document)
 
 
 class ActorProcessor(object):
@@ -0,0 +1,117 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+from shared.defines import *
+from shared.environ import *
+from shared.loggers import Logger
+from shared.clients import S3Client
+from shared.storage import Codec
+
+from abc                 import ABC, abstractmethod
+from botocore.exceptions import ClientError
+from time                import monotonic
+
+class Registry(ABC):
+    """
+    Objects of the store kept for the lifetime of a warm container, compiled once from their JSON
+
+    An object is fetched on first use, served from memory within the time to live and revalidated afterwards with a
+    conditional GET on its ETag, so unchanged objects are not downloaded or compiled again. A subclass holds its own
+    Entries and Lock, names the key of an object, builds it from its body and may stand in for objects missing from
+    the store. Built objects carry their ETag and the monotonic() time they were last Checked.
+    """
+
+    Entries : Dict = None
+    Lock           = None
+    TTL            = 300
+    Default        = ''
+
+    def __init_subclass__(cls, **kwArgs):
+
+        super().__init_subclass__(**kwArgs)
+
+        # only used through its class methods, never instantiated, so a missing one is caught here instead of by ABC
+        missing = [name for name in ('GetKey', 'Build') if getattr(getattr(cls, name), '__isabstractmethod__', False)]
+
+        if  missing:
+            raise TypeError(f'Registry : {cls.__name__} Does Not Implement {", ".join(missing)}')
+
+    @classmethod
+    @abstractmethod
+    def GetKey(cls, name: str) -> str:
+        """
+        Store key of the named object
+        """
+
+    @classmethod
+    @abstractmethod
+    def Build(cls, name: str, body: Dict, etag: str):
+        """
+        Object built from the JSON body of the store object and its ETag
+        """
+
+    @classmethod
+    def Missing(cls, name: str):
+        """
+        Stands in for an object missing from the store, None raises the error of the GET
+        """
+
+        return None
+
+    @classmethod
+    def Get(cls, name: str = None):
+
+        name = (name or cls.Default).lower()
+
+        with cls.Lock:
+
+            entry = cls.Entries.get(name)
+
+            if  entry and monotonic() - entry.Checked < cls.TTL:
+                return entry
+
+            cls.Entries[name] = entry = cls.Load(name, entry)
+
+            return entry
+
+    @classmethod
+    def Load(cls, name: str, cached = None):
+
+        params = {'Bucket' : STORE_BUCKET, 'Key' : cls.GetKey(name)}
+
+        if  cached and cached.ETag:
+            params['IfNoneMatch'] = cached.ETag
+
+        try:
+
+            response = S3Client.get_object(**params)
+
+        except ClientError as e:
+
+            code = e.response['Error']['Code']
+
+            if  cached and code in ('304', 'NotModified'):
+
+                Logger.info(f'{cls.__name__}.Load : Name = {name}, Not Modified, ETag = {cached.ETag}')
+
+                cached.Checked = monotonic()
+
+                return cached
+
+            entry = cls.Missing(name) if code in ('404', 'NoSuchKey') else None
+
+            if  entry is None:
+                raise
+
+            Logger.info(f'{cls.__name__}.Load : Name = {name}, Not Found')
+
+            entry.Checked = monotonic()
+
+            return entry
+
+        entry         = cls.Build(name, loads(Codec.Read(response)), response['ETag'])
+        entry.Checked = monotonic()
+
+        Logger.info(f'{cls.__name__}.Load : Name = {name}, Loaded, ETag = {entry.ETag}')
+
+        return entry
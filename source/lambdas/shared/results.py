@@ -0,0 +1,97 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+from shared.defines import *
+from shared.environ import *
+from shared.loggers import Logger
+from shared.clients import S3Client
+from shared.storage import S3Uri
+
+from base64              import b64decode
+from botocore.exceptions import ClientError
+from hashlib             import sha256
+
+class CacheStatus:
+    HIT  = 'hit'
+    MISS = 'miss'
+    OFF  = 'off'
+
+class ResultCache:
+    """
+    Actor results keyed by the content they were derived from, kept in the store bucket under cache/<stage>/
+
+    The key is the SHA-256 over the source object bytes and everything that shapes the output (schema, prompt,
+    model and inference parameters), so a re-uploaded duplicate is answered without calling the model while any
+    change to the inputs misses. Entries expire through the bucket lifecycle rule on the cache/ prefix.
+    """
+
+    Enabled = GetEnvVar('RESULT_CACHE', default = 'disabled').lower() == 'enabled'
+
+    ChunkBytes = 1024 * 1024
+
+    @staticmethod
+    def Hash(value) -> str:
+
+        if  not isinstance(value, (bytes, str)):
+            value = dumps(value, sort_keys = True, default = str)
+
+        if  isinstance(value, str):
+            value = value.encode('utf-8')
+
+        return sha256(value).hexdigest()
+
+    @staticmethod
+    def SourceHash(uri: S3Uri, content: bytes = b'') -> str:
+        """
+        SHA-256 of the object bytes, hashed from content when the caller already holds them, otherwise taken from its
+        stored full object checksum when present and streamed without one
+        """
+
+        if  content:
+            return sha256(content).hexdigest()
+
+        params = {'Bucket' : uri.Bucket, 'Key' : uri.Object or uri.Prefix}
+
+        head     = S3Client.head_object(**params, ChecksumMode = 'ENABLED')
+        checksum = head.get('ChecksumSHA256', '')
+
+        if  checksum and '-' not in checksum and head.get('ChecksumType', 'FULL_OBJECT') == 'FULL_OBJECT':
+            return b64decode(checksum).hex()
+
+        digest = sha256()
+
+        for chunk in S3Client.get_object(**params)['Body'].iter_chunks(ResultCache.ChunkBytes):
+            digest.update(chunk)
+
+        return digest.hexdigest()
+
+    @staticmethod
+    def Key(**parts) -> str:
+
+        return ResultCache.Hash(parts)
+
+    @staticmethod
+    def GetUri(stage: str, key: str) -> S3Uri:
+
+        return S3Uri(Bucket = STORE_BUCKET, Object = f'cache/{stage}/{key}.json')
+
+    @staticmethod
+    def Get(stage: str, key: str):
+
+        try:
+
+            return ResultCache.GetUri(stage, key).GetJSON()
+
+        except ClientError as e:
+
+            if  e.response['Error']['Code'] in ('NoSuchKey', '404'):
+                return None
+
+            raise
+
+    @staticmethod
+    def Put(stage: str, key: str, result):
+
+        ResultCache.GetUri(stage, key).PutJSON(result)
+
+        Logger.info(f'ResultCache.Put : Stage = {stage}, Key = {key}')
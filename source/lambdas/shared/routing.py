@@ -0,0 +1,209 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+from shared.defines import *
+from shared.environ import *
+from shared.helpers import GetEnvVar
+from shared.loggers import Logger
+from shared.metrics import Metrics
+from shared.inference import Inference
+
+from time   import time
+from typing import Callable
+
+class Heuristics:
+    """
+    Plausibility checks of an extraction beyond its schema, driven by the field names the schemas share
+
+    - required string fields are not empty
+    - date fields parse as a date
+    - line items: quantity times unit or discounted price makes the total price
+    - totals: line item total prices make the subtotal, subtotal less discount plus tax and tip makes the total,
+      opening balance plus credits less debits makes the closing balance
+    """
+
+    DateFormats = [
+        '%Y-%m-%d', '%Y/%m/%d', '%Y.%m.%d', '%d.%m.%Y', '%d.%m.%y', '%d/%m/%Y', '%m/%d/%Y', '%d-%m-%Y',
+        '%d %B %Y', '%d %b %Y', '%B %d, %Y', '%b %d, %Y', '%Y年%m月%d日', '%Y년 %m월 %d일',
+    ]
+
+    Tolerance = 0.01 # relative, and never below one cent
+
+    @staticmethod
+    def IsDateField(name: str) -> bool:
+        return name == 'date' or name.endswith('_date') or name.startswith('period_')
+
+    @staticmethod
+    def IsDate(value: str) -> bool:
+
+        # '15. 01. 2024.' as written in Croatian, '2024-01-15T00:00:00' as returned at times
+        value = value.strip().rstrip('.').replace('. ', '.')
+
+        try:
+            datetime.fromisoformat(value)
+            return True
+        except ValueError:
+            pass
+
+        for format in Heuristics.DateFormats:
+            try:
+                datetime.strptime(value, format)
+                return True
+            except ValueError:
+                pass
+
+        return False
+
+    @staticmethod
+    def IsNumber(value) -> bool:
+        return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+    @staticmethod
+    def Agrees(expected: float, actual: float) -> bool:
+        return abs(expected - actual) <= max(0.01, Heuristics.Tolerance * abs(actual))
+
+    @staticmethod
+    def Check(output, schema: Dict) -> List[str]:
+        """
+        Messages describing implausible values of the output, empty when nothing stands out
+        """
+
+        faults = []
+
+        Heuristics.checkFields(output, schema, '$', faults)
+
+        if  isinstance(output, dict):
+            Heuristics.checkTotals(output, faults)
+
+        return faults
+
+    @staticmethod
+    def checkFields(value, schema: Dict, path: str, faults: List[str]):
+
+        if  isinstance(value, dict):
+
+            required = schema.get('required', [])
+
+            for name, field in schema.get('properties', {}).items():
+
+                item = value.get(name)
+
+                if  name in required and isinstance(item, str) and not item.strip():
+                    faults.append(f'{path}/{name} : required value is empty')
+
+                elif Heuristics.IsDateField(name) and isinstance(item, str) and item.strip() and not Heuristics.IsDate(item):
+                    faults.append(f'{path}/{name} : {item!r} is not a date')
+
+                else:
+                    Heuristics.checkFields(item, field, f'{path}/{name}', faults)
+
+        elif isinstance(value, list):
+
+            for index, item in enumerate(value):
+                Heuristics.checkFields(item, schema.get('items', {}), f'{path}/{index}', faults)
+
+    @staticmethod
+    def checkTotals(output: Dict, faults: List[str]):
+
+        number = lambda item, name: item.get(name) if isinstance(item, dict) and Heuristics.IsNumber(item.get(name)) else None
+        items  = output.get('line_items') if isinstance(output.get('line_items'), list) else []
+        totals = output.get('totals') if isinstance(output.get('totals'), dict) else {}
+
+        for index, item in enumerate(items):
+
+            quantity, total = number(item, 'quantity'), number(item, 'total_price')
+            prices          = [price for price in [number(item, 'unit_price'), number(item, 'discounted_price')] if price is not None]
+
+            if  quantity is not None and total is not None and prices and \
+                not any(Heuristics.Agrees(quantity * price, total) for price in prices):
+                faults.append(f'$/line_items/{index} : quantity {quantity} at {prices} does not make total price {total}')
+
+        prices   = [number(item, 'total_price') for item in items]
+        subtotal = number(totals, 'subtotal')
+
+        if  items and None not in prices and subtotal is not None and not Heuristics.Agrees(sum(prices), subtotal):
+            faults.append(f'$/totals/subtotal : line items add up to {sum(prices):.2f}, not {subtotal}')
+
+        total = number(totals, 'total')
+
+        if  subtotal is not None and total is not None:
+
+            computed = subtotal - abs(number(totals, 'discount') or 0) + (number(totals, 'tax') or 0) + (number(totals, 'tip') or 0)
+
+            # amounts are quoted either before or after tax, either agreeing is plausible
+            if  not Heuristics.Agrees(computed, total) and not Heuristics.Agrees(subtotal, total):
+                faults.append(f'$/totals/total : subtotal, discount, tax and tip add up to {computed:.2f}, not {total}')
+
+        opening, closing = number(totals, 'opening_balance'), number(totals, 'closing_balance')
+        credits, debits  = number(totals, 'total_credits'),   number(totals, 'total_debits')
+
+        if  None not in (opening, closing, credits, debits) and not Heuristics.Agrees(opening + credits - abs(debits), closing):
+            faults.append(f'$/totals/closing_balance : opening balance, credits and debits add up to {opening + credits - abs(debits):.2f}, not {closing}')
+
+class ModelRouter:
+    """
+    Extracts with the cheapest model of EXTRACT_ROUTE_MODELS first and escalates to the next model only when the
+    output fails its checks, the output of the last model is kept whatever its checks say
+
+    EXTRACT_ROUTE_MODELS lists comma separated Bedrock model ids from the smallest to the largest, routing is off
+    when it is empty.
+    """
+
+    Models = [Inference.Foundation(model.strip()) for model in GetEnvVar('EXTRACT_ROUTE_MODELS', default = '').split(',') if model.strip()]
+
+    @staticmethod
+    def Enabled() -> bool:
+        return len(ModelRouter.Models) > 1
+
+    @staticmethod
+    def Route(extract: Callable, check: Callable, models: List[str] = None):
+        """
+        extract(model_id) returns {'output', 'token_usage'}, check(output) returns the faults of an output.
+        Returns the response kept and one record per model tried.
+        """
+
+        models   = models or ModelRouter.Models
+        attempts = []
+
+        for index, model_id in enumerate(models):
+
+            last    = index == len(models) - 1
+            started = time()
+
+            try:
+
+                response = extract(model_id)
+                faults   = check(response['output'])
+
+            except Exception as e:
+
+                if  last:
+                    raise
+
+                response = None
+                faults   = [f'{type(e).__name__} : {str(e)}']
+
+            usage = (response or {}).get('token_usage') or {}
+
+            attempts.append({
+                'ModelId'      : model_id,
+                'LatencyMs'    : int((time() - started) * 1000),
+                'InputTokens'  : usage.get('input_tokens',  0),
+                'OutputTokens' : usage.get('output_tokens', 0),
+                'Faults'       : len(faults),
+            })
+
+            Logger.info(
+                f'ModelRouter.Route : ModelId = {model_id}, Faults = {len(faults)}, LatencyMs = {attempts[-1]["LatencyMs"]}'
+                + ''.join(f'\n    > {fault}' for fault in faults[:10])
+            )
+
+            Metrics.Emit({'Stage' : STAGE, 'ModelId' : model_id}, {
+                'RouteLatency'      : attempts[-1]['LatencyMs'],
+                'RouteInputTokens'  : attempts[-1]['InputTokens'],
+                'RouteOutputTokens' : attempts[-1]['OutputTokens'],
+                'RouteFaults'       : len(faults),
+            }, units = {'RouteLatency' : 'Milliseconds'})
+
+            if  not faults or last:
+                return response, attempts
@@ -0,0 +1,552 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+from shared.defines  import *
+from shared.environ  import *
+from shared.helpers  import GetEnvVar, GetEnvNumber
+from shared.loggers  import Logger
+from shared.clients  import S3Client
+from shared.storage  import Codec
+from shared.registry import Registry
+from shared.textract import TextractFormat
+
+from io                  import BytesIO
+from numpy               import append, arange
+from pandas              import DataFrame, NaT, Series, factorize, read_csv, to_datetime, to_numeric
+from re                  import compile, escape
+from threading           import Lock
+from time                import monotonic, perf_counter
+from typing              import Callable
+from unicodedata         import normalize
+
+class RuleType:
+    NORMALIZE = 'normalize' # string clean up, e.g. whitespace, case, full width characters
+    NUMBER    = 'number'    # amounts written with the separators of a locale into numbers
+    DATE      = 'date'      # dates written in the order of a locale into one format
+    RECONCILE = 'reconcile' # line totals against quantity times price, and their sum against the subtotal
+    LOOKUP    = 'lookup'    # values filled from a reference table, e.g. vendor identifiers by vendor name
+
+class Locale:
+    """
+    Number and date conventions per ISO 639-1 language, the language detected at extraction unless a rule names one
+    """
+
+    # decimal separator, dates day first
+    PERIOD = ('.', False)
+    COMMA  = (',', True)
+
+    Conventions = {
+        'en' : PERIOD, 'ja' : PERIOD, 'zh' : PERIOD, 'ko' : PERIOD,
+        **dict.fromkeys(['hr', 'de', 'fr', 'es', 'it', 'pt', 'nl', 'pl', 'ru', 'uk', 'sr'], COMMA),
+    }
+
+    @staticmethod
+    def Of(language: str):
+        return Locale.Conventions.get((language or '').lower().split('-')[0], Locale.PERIOD)
+
+@dataclass
+class RuleResult:
+    Name    : str
+    Type    : str
+    Seconds : float = 0.0
+    Changes : int   = 0     # values the rule changed or filled
+    Faults  : int   = 0     # values it could not parse, reconcile or look up
+    Skipped : bool  = False # not run, its table or columns absent or the deadline passed
+    Error   : str   = ''
+
+@dataclass
+class Rule:
+    """
+    A declarative rule compiled into a function over the frames of a document, (frames, locale) -> (changes, faults)
+    """
+
+    Name   : str
+    Type   : str
+    Table  : str
+    Apply  : Callable
+
+class Compile:
+    """
+    Rule specifications into vectorized column operations, patterns and reference tables prepared once
+
+    Column rules transform the distinct values of a column and spread the results back over its rows, line item
+    columns repeating the same quantities, prices, rates and dates. A kernel takes the distinct values and returns
+    their new values, None where a value stays as it is, and where a value could not be transformed.
+
+    Tables of fewer than VectorRows rows, the form and the line items of most documents, are transformed value by
+    value by the scalar form of the kernel instead, the column operations costing about a millisecond each however
+    few rows they run over.
+    """
+
+    Tolerance  = 0.01 # relative, and never below one cent, as the extraction plausibility checks
+    VectorRows = GetEnvNumber('RULES_VECTOR_ROWS', default = 1000)
+
+    # composed into one function per rule, a single pass over the values however many steps it names
+    Normalizers = {
+        'strip'    : str.strip,
+        'collapse' : lambda text: ' '.join(text.split()), # runs of whitespace to one space, trimmed
+        'upper'    : str.upper,
+        'lower'    : str.lower,
+        'title'    : str.title,
+        'casefold' : str.casefold,
+        'nfkc'     : lambda text: normalize('NFKC', text), # full width digits and letters to ascii
+    }
+
+    # all but digits, the sign, an opening parenthesis marking negative amounts and the decimal separator
+    NonDigits = {decimal : compile(rf'[^\d\-({escape(decimal)}]') for decimal in '.,'}
+    KanjiDate = compile(r'(\d+)\s*年\s*(\d+)\s*月\s*(\d+)\s*日?')
+    DateSpace = compile(r'\s*([./-])\s*')
+
+    @staticmethod
+    def Strings(values: Series) -> Series:
+        """
+        The string values, NaN where there are numbers or nothing
+        """
+
+        return values.where(values.map(lambda value: isinstance(value, str)))
+
+    @staticmethod
+    def Numbers(column: Series) -> Series:
+        return to_numeric(column, errors = 'coerce')
+
+    @staticmethod
+    def Key(text: Series) -> Series:
+        return text.str.normalize('NFKC').str.casefold().str.split().str.join(' ')
+
+    @staticmethod
+    def Distinct(column: Series, kernel: Callable):
+        """
+        (values, failed) of kernel over the distinct values of column, spread back over its rows
+        """
+
+        try:
+            codes, distinct = factorize(column)
+        except TypeError: # unhashable values, e.g. lists, are transformed row by row
+            codes, distinct = arange(len(column)), column.to_numpy(dtype = object)
+
+        values, failed = kernel(Series(distinct, dtype = object))
+
+        # missing values are coded -1, the None and False appended
+        values = append(values.to_numpy(dtype = object), None)[codes]
+        failed = append(failed.to_numpy(dtype = bool, na_value = False), False)[codes]
+
+        return Series(values, index = column.index, dtype = object), Series(failed, index = column.index)
+
+    @staticmethod
+    def Update(frame: DataFrame, column: str, values: Series) -> int:
+
+        changed       = values.notna()
+        frame[column] = frame[column].where(~changed, values)
+
+        return int(changed.sum())
+
+    @staticmethod
+    def Columns(spec: Dict) -> List[str]:
+        return spec.get('columns') or [spec['column']]
+
+    @staticmethod
+    def Rule(spec: Dict) -> Rule:
+
+        kind = spec.get('type')
+
+        if  kind not in [RuleType.NORMALIZE, RuleType.NUMBER, RuleType.DATE, RuleType.RECONCILE, RuleType.LOOKUP]:
+            raise Exception(f'Compile.Rule : Rule {spec.get("name")} Has Unknown Type {kind}')
+
+        return Rule(
+            Name  = spec.get('name') or kind,
+            Type  = kind,
+            Table = spec.get('table', TextractFormat.FormName),
+            Apply = getattr(Compile, kind.capitalize())(spec),
+        )
+
+    @staticmethod
+    def Scalars(column: Series, scalar: Callable):
+        """
+        (values, changes, faults) of scalar over the values of column, each distinct value transformed once, values
+        None when nothing changed
+        """
+
+        results = {}
+        values  = []
+        changes = faults = 0
+
+        for value in column.tolist():
+
+            try:
+                result = results.get(value) or results.setdefault(value, scalar(value))
+            except TypeError: # unhashable values, e.g. lists
+                result = scalar(value)
+
+            changes += result[0] is not None
+            faults  += result[1]
+
+            values.append(value if result[0] is None else result[0])
+
+        return values if changes else None, changes, faults
+
+    @staticmethod
+    def Columnwise(spec: Dict, kernel: Callable, scalar: Callable = None) -> Callable:
+        """
+        A rule running kernel(values, locale) over each of its columns, or scalar(value, locale) over each value of
+        tables smaller than VectorRows
+        """
+
+        columns = Compile.Columns(spec)
+        table   = spec.get('table', TextractFormat.FormName)
+        named   = Locale.Of(spec['locale']) if spec.get('locale') else None
+
+        def apply(frames, locale):
+
+            frame   = frames[table]
+            changes = faults = 0
+
+            if  scalar and len(frame) < Compile.VectorRows:
+
+                for column in columns:
+
+                    values, changed, failed = Compile.Scalars(frame[column], lambda value: scalar(value, named or locale))
+
+                    if  values is not None:
+                        frame[column] = Series(values, index = frame.index, dtype = object)
+
+                    changes += changed
+                    faults  += failed
+
+                return changes, faults
+
+            for column in columns:
+
+                values, failed = Compile.Distinct(frame[column], lambda distinct: kernel(distinct, named or locale))
+
+                changes += Compile.Update(frame, column, values)
+                faults  += int(failed.sum())
+
+            return changes, faults
+
+        return apply
+
+    @staticmethod
+    def Normalize(spec: Dict) -> Callable:
+
+        steps    = [Compile.Normalizers[name] for name in spec.get('operations', ['strip', 'collapse'])]
+        replaces = [(compile(pattern), replacement) for pattern, replacement in spec.get('replace', {}).items()]
+
+        def transform(value):
+
+            if  not isinstance(value, str):
+                return None
+
+            result = value
+
+            for step in steps:
+                result = step(result)
+
+            for pattern, replacement in replaces:
+                result = pattern.sub(replacement, result)
+
+            return result if result != value else None
+
+        def kernel(values, locale):
+            return values.map(transform), Series(False, index = values.index)
+
+        return Compile.Columnwise(spec, kernel, lambda value, locale: (transform(value), False))
+
+    @staticmethod
+    def Parse(value, decimal: str):
+        """
+        (number, failed) of an amount written with the decimal separator, group separators, currency symbols and
+        codes dropped, (12,50) negative
+        """
+
+        if  not isinstance(value, str):
+            return None, False
+
+        digits = Compile.NonDigits[decimal].sub('', normalize('NFKC', value)).replace('(', '-').replace(decimal, '.')
+
+        try:
+            return int(digits) if digits.lstrip('-').isdigit() else float(digits), False
+        except ValueError:
+            return None, bool(value.strip())
+
+    @staticmethod
+    def Number(spec: Dict) -> Callable:
+
+        def kernel(values, locale):
+
+            parsed = [Compile.Parse(value, locale[0]) for value in values]
+
+            return Series([number for number, _ in parsed], dtype = object), Series([failed for _, failed in parsed])
+
+        return Compile.Columnwise(spec, kernel, lambda value, locale: Compile.Parse(value, locale[0]))
+
+    @staticmethod
+    def Date(spec: Dict) -> Callable:
+
+        output = spec.get('format', '%Y-%m-%d')
+        given  = spec.get('input', 'mixed')
+
+        def kernel(values, locale):
+
+            _, dayfirst = locale
+
+            # 2024年6月5日 and 05. 06. 2024. as the parser reads them
+            text = Compile.Strings(values).str.normalize('NFKC').str.strip().str.rstrip('.')
+            text = text.str.replace(Compile.KanjiDate, r'\1-\2-\3', regex = True).str.replace(Compile.DateSpace, r'\1', regex = True)
+
+            parsed    = to_datetime(text, format = given, dayfirst = dayfirst, errors = 'coerce')
+            formatted = parsed.dt.strftime(output)
+
+            return formatted.where(formatted.notna() & formatted.ne(values)), text.str.len().gt(0) & parsed.isna()
+
+        def scalar(value, locale):
+
+            if  not isinstance(value, str):
+                return None, False
+
+            text = normalize('NFKC', value).strip().rstrip('.')
+            text = Compile.DateSpace.sub(r'\1', Compile.KanjiDate.sub(r'\1-\2-\3', text))
+
+            parsed = to_datetime(text, format = given, dayfirst = locale[1], errors = 'coerce')
+
+            if  parsed is NaT:
+                return None, bool(text)
+
+            formatted = parsed.strftime(output)
+
+            return formatted if formatted != value else None, False
+
+        return Compile.Columnwise(spec, kernel, scalar)
+
+    @staticmethod
+    def Reconcile(spec: Dict) -> Callable:
+
+        quantity, price, total = spec.get('quantity', 'quantity'), spec.get('price', 'unit_price'), spec.get('total', 'total_price')
+
+        subtotal  = spec.get('subtotal')
+        fill      = spec.get('fill', True)
+        tolerance = float(spec.get('tolerance', Compile.Tolerance))
+
+        def agrees(expected, actual):
+            return (expected - actual).abs() <= (actual.abs() * tolerance).clip(lower = 0.01)
+
+        def apply(frames, locale):
+
+            frame   = frames[spec['table']]
+            changes = faults = 0
+
+            computed = Compile.Numbers(frame[quantity]) * Compile.Numbers(frame[price])
+            totals   = Compile.Numbers(frame[total])
+            missing  = totals.isna() & computed.notna()
+
+            faults += int((totals.notna() & computed.notna() & ~agrees(computed, totals)).sum())
+
+            if  fill and missing.any():
+
+                frame[total] = frame[total].where(~missing, computed.round(2).astype(object))
+                totals       = totals.where(~missing, computed)
+                changes     += int(missing.sum())
+
+            form = frames[TextractFormat.FormName]
+
+            if  subtotal and totals.notna().all():
+
+                summed = Series([totals.sum()])
+                stated = Compile.Numbers(form[subtotal]) if subtotal in form else Series([None], dtype = float)
+
+                if  stated.isna().all() and fill:
+                    form[subtotal] = [round(float(summed[0]), 2)]
+                    changes       += 1
+
+                elif not agrees(summed, stated.reset_index(drop = True)).all():
+                    faults += 1
+
+            return changes, faults
+
+        return apply
+
+    @staticmethod
+    def Lookup(spec: Dict) -> Callable:
+
+        entries = spec.get('entries') or Compile.Reference(spec['source'])
+        key     = spec.get('key', 'name')
+        targets = spec.get('set', {})  # column : reference field
+        column  = spec['column']
+        replace = spec.get('overwrite', False)
+
+        # the key and its aliases normalized as the looked up values are
+        reference = DataFrame(entries, dtype = object)
+        names     = reference[key].astype(str)
+
+        if  'aliases' in reference:
+
+            aliases   = [[name, *(aliases if isinstance(aliases, list) else [])] for name, aliases in zip(names, reference['aliases'])]
+            reference = reference.assign(_names = aliases).explode('_names')
+            names     = reference['_names'].astype(str)
+
+        reference = reference.assign(_key = Compile.Key(names)).drop_duplicates('_key').set_index('_key')
+        rows      = reference.to_dict('index')
+
+        Logger.info(f'Compile.Lookup : Rule = {spec.get("name")}, Entries = {len(entries)}, Keys = {len(reference)}')
+
+        def missing(value):
+            return value is None or (isinstance(value, float) and value != value) # None or NaN
+
+        def scalar(frame):
+
+            keys    = [' '.join(normalize('NFKC', value).casefold().split()) if isinstance(value, str) else None for value in frame[column].tolist()]
+            changes = 0
+
+            for target, source in targets.items():
+
+                current = frame[target].tolist() if target in frame else [None] * len(frame)
+                values  = list(current)
+
+                for row, key in enumerate(keys):
+
+                    value = rows[key].get(source) if key in rows else None
+                    empty = missing(current[row]) or (isinstance(current[row], str) and not current[row].strip())
+
+                    if  not missing(value) and (empty if not replace else value != current[row]):
+                        values[row] = value
+                        changes    += 1
+
+                if  values != current or target not in frame:
+                    frame[target] = Series(values, index = frame.index, dtype = object)
+
+            return changes, sum(1 for key in keys if key and key not in rows)
+
+        def apply(frames, locale):
+
+            frame   = frames[spec.get('table', TextractFormat.FormName)]
+
+            if  len(frame) < Compile.VectorRows:
+                return scalar(frame)
+
+            keys, _ = Compile.Distinct(frame[column], lambda values: (Compile.Key(Compile.Strings(values)), values.isna()))
+            found   = keys.isin(reference.index)
+            changes = 0
+
+            for target, source in targets.items():
+
+                values  = keys.map(reference[source])
+                current = frame[target] if target in frame else Series(None, index = frame.index, dtype = object)
+                empty   = current.isna() | Compile.Strings(current).str.strip().eq('')
+                changed = found & values.notna() & (empty if not replace else values.ne(current))
+
+                frame[target]  = current.where(~changed, values)
+                changes       += int(changed.sum())
+
+            return changes, int((keys.str.len().gt(0) & ~found).sum())
+
+        return apply
+
+    @staticmethod
+    def Reference(key: str) -> List[Dict]:
+        """
+        Reference table of a lookup from the store, a JSON array of objects or a CSV file with a header row
+        """
+
+        body = Codec.Read(S3Client.get_object(Bucket = STORE_BUCKET, Key = key))
+
+        if  key.lower().endswith('.csv'):
+            return read_csv(BytesIO(body), dtype = str, keep_default_na = False).to_dict('records')
+
+        return loads(body)
+
+@dataclass
+class RuleSet:
+    """
+    Business rules of a schema loaded from the store, compiled once
+    """
+
+    Name    : str
+    Body    : Dict
+    ETag    : str
+    Checked : float = 0
+    Rules   : List[Rule] = field(default_factory = list)
+
+    def __post_init__(self):
+        self.Rules = [Compile.Rule(spec) for spec in self.Body.get('rules', [])]
+
+    @property
+    def Tables(self) -> set:
+        return {rule.Table for rule in self.Rules}
+
+    def Apply(self, frames: Dict[str, DataFrame], language: str = '', deadline: float = None) -> List[RuleResult]:
+        """
+        Runs every rule in order over the frames, each timed. A rule whose table or columns are absent, or that raises,
+        is reported and the next one runs. Once monotonic() passes deadline the remaining rules are skipped.
+        """
+
+        locale  = Locale.Of(self.Body.get('locale') or language)
+        results = []
+
+        for rule in self.Rules:
+
+            result = RuleResult(Name = rule.Name, Type = rule.Type)
+
+            results.append(result)
+
+            if  rule.Table not in frames or (deadline and monotonic() > deadline):
+                result.Skipped = True
+                continue
+
+            started = perf_counter()
+
+            try:
+
+                result.Changes, result.Faults = rule.Apply(frames, locale)
+
+            except KeyError as e:
+
+                result.Skipped = True
+
+                Logger.info(f'RuleSet.Apply : Rule = {rule.Name}, Skipped, Column {e} Absent')
+
+            except Exception as e:
+
+                result.Error = str(e)
+
+                Logger.error(f'RuleSet.Apply : Rule = {rule.Name}, Errored > {result.Error}')
+
+            result.Seconds = perf_counter() - started
+
+        Logger.info(
+            f'RuleSet.Apply : Name = {self.Name}, Rules = {len(results)}, '
+            f'Seconds = {sum(result.Seconds for result in results):.3f}, Faults = {sum(result.Faults for result in results)}'
+        )
+
+        return results
+
+class Rules(Registry):
+    """
+    Registry of rule sets kept for the lifetime of a warm container
+
+    A schema's rules are read from s3://<store>/rules/<name>_rules.json on first use and compiled, served from
+    memory within the time to live and revalidated afterwards with a conditional GET on their ETag, so unchanged
+    rules are not downloaded or compiled again. A schema without a rules file has an empty rule set.
+    """
+
+    Entries : Dict[str, RuleSet] = {}
+    Lock    = Lock()
+    TTL     = GetEnvNumber('RULES_TTL_SECONDS', default = 300)
+    Default = 'invoice'
+    Reserve = GetEnvNumber('RULES_RESERVE_SECONDS', default = 30, kind = float) # left of the invocation for writing after the rules
+
+    @classmethod
+    def GetKey(cls, name: str) -> str:
+        return f'rules/{name}_rules.json'
+
+    @classmethod
+    def Build(cls, name: str, body: Dict, etag: str) -> RuleSet:
+        return RuleSet(Name = name, Body = body, ETag = etag)
+
+    @classmethod
+    def Missing(cls, name: str) -> RuleSet:
+        return RuleSet(Name = name, Body = {}, ETag = '')
+
+if  __name__ == '__main__':
+
+    rules = Rules.Get('invoice')
+
+    print(rules.Name, rules.ETag, [rule.Name for rule in rules.Rules])
@@ -0,0 +1,79 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+from shared.defines import *
+from shared.environ import *
+from shared.registry import Registry
+
+from hashlib             import sha256
+from jsonschema          import Draft202012Validator
+from threading           import Lock
+
+class SchemaName:
+    INVOICE   = 'invoice'
+    RECEIPT   = 'receipt'
+    STATEMENT = 'statement'
+
+@dataclass
+class Schema:
+    """
+    Extraction schema loaded from the store, with its validator compiled once
+    """
+
+    Name     : str
+    Body     : Dict
+    ETag     : str
+    Checked  : float = 0
+    Validator: Draft202012Validator = None
+    Hash     : str   = ''
+    Cached   : bool  = False # prompt caching of the schema and instructions, 'x-prompt-cache' in the schema file
+
+    def __post_init__(self):
+
+        Draft202012Validator.check_schema(self.Body)
+
+        self.Validator = Draft202012Validator(self.Body)
+        self.Hash      = sha256(dumps(self.Body, sort_keys = True).encode('utf-8')).hexdigest()
+        self.Cached    = bool(self.Body.get('x-prompt-cache', PROMPT_CACHE))
+
+    @property
+    def Key(self):
+        return Schemas.GetKey(self.Name)
+
+    def Validate(self, output) -> List[str]:
+        """
+        Messages describing where the output violates the schema, empty when it is valid
+        """
+
+        return [
+            f'{"/".join(str(p) for p in error.absolute_path) or "$"} : {error.message}'
+            for error in self.Validator.iter_errors(output)
+        ]
+
+class Schemas(Registry):
+    """
+    Registry of extraction schemas kept for the lifetime of a warm container
+
+    A schema is fetched from s3://<store>/schema/<name>_schema.json on first use, served from memory within the
+    time to live and revalidated afterwards with a conditional GET on its ETag, so unchanged schemas are not
+    downloaded or recompiled again.
+    """
+
+    Entries : Dict[str, Schema] = {}
+    Lock    = Lock()
+    TTL     = GetEnvNumber('SCHEMA_TTL_SECONDS', default = 300)
+    Default = SchemaName.INVOICE
+
+    @classmethod
+    def GetKey(cls, name: str) -> str:
+        return f'schema/{name}_schema.json'
+
+    @classmethod
+    def Build(cls, name: str, body: Dict, etag: str) -> Schema:
+        return Schema(Name = name, Body = body, ETag = etag)
+
+if  __name__ == '__main__':
+
+    schema = Schemas.Get(SchemaName.INVOICE)
+
+    print(schema.Name, schema.ETag, schema.Validate({}))
@@ -4,8 +4,133 @@
 import json
 from typing import Dict, List
 from shared.clients import S3Client, S3Resource
+from shared.environ import STAGE
+from shared.helpers import GetEnvVar, GetEnvNumber
+from shared.loggers import Logger
+from shared.metrics import Metrics
 
 from dataclasses import asdict, dataclass, fields, _MISSING_TYPE
+from zlib        import compressobj, decompressobj, DEFLATED, MAX_WBITS
+from zstandard   import ZstdCompressor, ZstdDecompressor
+
+class ContentEncoding:
+    NONE = 'none'
+    GZIP = 'gzip'
+    ZSTD = 'zstd'
+
+class Codec:
+    """
+    Content-Encoding of the artifacts S3Uri stores
+
+    JSON bodies of Threshold bytes or more are compressed with Encoding, gzip or zstd, and stored with it as their
+    Content-Encoding. Reads decode whatever an object was stored with, so objects written before the setting changed,
+    uploads and the answers of other services read the same. Other media types, e.g. the JSON lines Bedrock batch
+    jobs read themselves, documents and Parquet, are stored as they are.
+    """
+
+    Encoding   = GetEnvVar('ARTIFACT_ENCODING', default = ContentEncoding.NONE).lower()
+    Threshold  = GetEnvNumber('ARTIFACT_ENCODING_MIN_BYTES', default = 4096)
+    Levels     = {ContentEncoding.GZIP : 6, ContentEncoding.ZSTD : 3}
+    MediaTypes = {'application/json'}
+    Counters   = {'Bytes' : 0, 'StoredBytes' : 0} # of the artifacts compressed by this container
+
+    @staticmethod
+    def Choose(size: int, contentType: str) -> str:
+        """
+        The encoding to store a body of size bytes with, empty to store it as it is
+        """
+
+        if  Codec.Encoding in Codec.Levels and contentType in Codec.MediaTypes and size >= Codec.Threshold:
+            return Codec.Encoding
+
+        return ''
+
+    @staticmethod
+    def Compressor(encoding: str):
+
+        if  encoding == ContentEncoding.GZIP:
+            return compressobj(Codec.Levels[encoding], DEFLATED, 16 + MAX_WBITS)
+
+        return ZstdCompressor(level = Codec.Levels[encoding]).compressobj()
+
+    @staticmethod
+    def Decompressor(encoding: str):
+
+        if  encoding == ContentEncoding.GZIP:
+            return decompressobj(16 + MAX_WBITS)
+
+        return ZstdDecompressor().decompressobj()
+
+    @staticmethod
+    def Encodings(contentEncoding: str) -> List[str]:
+        """
+        The encodings of a Content-Encoding header to undo, last applied first, others such as identity ignored
+        """
+
+        return [encoding for encoding in (part.strip().lower() for part in reversed((contentEncoding or '').split(','))) if encoding in Codec.Levels]
+
+    @staticmethod
+    def Encode(body: bytes, encoding: str) -> bytes:
+
+        compressor = Codec.Compressor(encoding)
+
+        return compressor.compress(body) + compressor.flush()
+
+    @staticmethod
+    def Decode(chunks, contentEncoding: str):
+        """
+        The decoded chunks of an object stored with contentEncoding
+        """
+
+        decoders = [Codec.Decompressor(encoding) for encoding in Codec.Encodings(contentEncoding)]
+
+        def feed(chunk: bytes, start: int) -> bytes:
+
+            for decoder in decoders[start:]:
+                chunk = decoder.decompress(chunk)
+
+            return chunk
+
+        for chunk in chunks:
+
+            chunk = feed(chunk, 0)
+
+            if  chunk:
+                yield chunk
+
+        for index, decoder in enumerate(decoders):
+
+            chunk = feed(decoder.flush(), index + 1)
+
+            if  chunk:
+                yield chunk
+
+    @staticmethod
+    def Read(response: Dict) -> bytes:
+        """
+        The decoded body of a get_object response
+        """
+
+        body = response['Body'].read()
+
+        if  not Codec.Encodings(response.get('ContentEncoding')):
+            return body
+
+        return b''.join(Codec.Decode([body], response['ContentEncoding']))
+
+    @staticmethod
+    def Count(uri: 'S3Uri', encoding: str, size: int, stored: int):
+
+        Codec.Counters['Bytes']       += size
+        Codec.Counters['StoredBytes'] += stored
+
+        Logger.info(f'Codec.Count : Key = {uri.Key}, Encoding = {encoding}, Bytes = {size}, Stored = {stored}, Saved = {size - stored}')
+
+        Metrics.Emit({'Stage' : STAGE, 'Encoding' : encoding}, {
+            'ArtifactBytes'       : size,
+            'ArtifactStoredBytes' : stored,
+            'ArtifactBytesSaved'  : size - stored,
+        }, units = {'ArtifactBytes' : 'Bytes', 'ArtifactStoredBytes' : 'Bytes', 'ArtifactBytesSaved' : 'Bytes'})
 
 @dataclass
 class S3Uri:
@@ -33,7 +158,7 @@ class S3Uri:
         
         response = S3Resource.Object(bucket_name = self.Bucket, key = self.Key).get()
 
-        return response['Body'].read()
+        return Codec.Read(response)
 
     def GetText(self) -> str:
 
@@ -44,13 +169,63 @@ class S3Uri:
         return json.loads(self.GetText())
 
     def Put(self, body : bytearray = b'', contentType = 'application/octet-stream'):
+        """
+        Stores body compressed when Codec chooses an encoding for it and compressing makes it smaller
+        """
+
+        encoding = Codec.Choose(len(body), contentType)
+        stored   = Codec.Encode(body, encoding) if encoding else body
+
+        if  len(stored) >= len(body):
+            encoding, stored = '', body
 
-        S3Resource.Object(bucket_name = self.Bucket, key = self.Key).put(Body = body, ContentType = contentType)
+        params = {'ContentEncoding' : encoding} if encoding else {}
+
+        response = S3Resource.Object(bucket_name = self.Bucket, key = self.Key).put(Body = stored, ContentType = contentType, **params)
+
+        if  encoding:
+            Codec.Count(self, encoding, len(body), len(stored))
+
+        return response
 
     def PutJSON(self, body : Dict = {}):
 
         self.Put(json.dumps(body).encode(), contentType = 'application/json')
 
+    def Writer(self, contentType = 'application/octet-stream') -> 'MultipartUpload':
+        """
+        Context manager uploading written bytes in parts, so large objects never have to be held whole
+        """
+
+        return MultipartUpload(self, contentType)
+
+    def Chunks(self, size: int = 64 * 1024):
+        """
+        Decoded chunks of the object, streamed
+        """
+
+        response = S3Client.get_object(Bucket = self.Bucket, Key = self.Key)
+
+        return Codec.Decode(response['Body'].iter_chunks(size), response.get('ContentEncoding'))
+
+    def Lines(self):
+        """
+        Lines of a text object, streamed
+        """
+
+        pending = b''
+
+        for chunk in self.Chunks():
+
+            lines   = (pending + chunk).splitlines(True)
+            pending = lines.pop()
+
+            for line in lines:
+                yield line.splitlines()[0].decode('utf-8')
+
+        if  pending:
+            yield pending.splitlines()[0].decode('utf-8')
+
     def List(self, key_predicate = lambda x : True) -> List['S3Uri']:
 
         params = {'Bucket' : self.Bucket, 'Prefix' : self.Prefix}
@@ -69,6 +244,114 @@ class S3Uri:
     @classmethod
     def FromUrl(cls, url: str):
 
-        b,o = url.lower().strip('s3://').split('/', 1)
+        # bucket names may start with s or 3 and keys are case sensitive, only the scheme is removed
+        b,o = url.removeprefix('s3://').split('/', 1)
 
         return cls(Bucket = b, Object = o)
+
+class MultipartUpload:
+    """
+    S3 multipart upload fed by Write, completed on a clean exit and aborted when the block raises
+
+    The upload is only created once a full part is written, bodies smaller than a part are put in one request. Once
+    Codec.Threshold bytes are written without a part uploaded, Codec chooses whether the rest is compressed as written.
+    """
+
+    PartBytes = 8 * 1024 * 1024 # every part but the last must be at least 5 MiB
+
+    def __init__(self, uri: S3Uri, contentType = 'application/octet-stream'):
+
+        self.uri         = uri
+        self.contentType = contentType
+        self.buffer      = bytearray()
+        self.parts       = []
+        self.uploadId    = None
+        self.encoding    = ''
+        self.compressor  = None
+        self.Bytes       = 0 # written, before compression
+        self.Stored      = 0
+
+    def __enter__(self):
+
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+
+        if  exc_type is not None:
+            self.Abort()
+            return False
+
+        if  self.compressor:
+            self.buffer += self.compressor.flush()
+
+        if  not self.uploadId:
+
+            S3Client.put_object(Bucket = self.uri.Bucket, Key = self.uri.Key, Body = bytes(self.buffer), ContentType = self.contentType, **self.params())
+
+            self.Stored += len(self.buffer)
+
+        else:
+
+            self.flush(final = True)
+
+            S3Client.complete_multipart_upload(
+                Bucket          = self.uri.Bucket,
+                Key             = self.uri.Key,
+                UploadId        = self.uploadId,
+                MultipartUpload = {'Parts' : self.parts},
+            )
+
+        if  self.encoding:
+            Codec.Count(self.uri, self.encoding, self.Bytes, self.Stored)
+
+        return False
+
+    def Write(self, data: bytes):
+
+        self.buffer += self.compressor.compress(data) if self.compressor else data
+        self.Bytes  += len(data)
+
+        # decided before the first part, the encoding of an upload is set when it is created
+        if  not self.compressor and not self.uploadId:
+
+            self.encoding = Codec.Choose(len(self.buffer), self.contentType)
+
+            if  self.encoding:
+                self.compressor = Codec.Compressor(self.encoding)
+                self.buffer     = bytearray(self.compressor.compress(bytes(self.buffer)))
+
+        if  len(self.buffer) >= self.PartBytes:
+            self.flush()
+
+    def Abort(self):
+
+        if  self.uploadId:
+            S3Client.abort_multipart_upload(Bucket = self.uri.Bucket, Key = self.uri.Key, UploadId = self.uploadId)
+            self.uploadId = None
+
+    def flush(self, final = False):
+
+        if  not self.buffer and not (final and not self.parts):
+            return
+
+        if  not self.uploadId:
+
+            self.uploadId = S3Client.create_multipart_upload(
+                Bucket = self.uri.Bucket, Key = self.uri.Key, ContentType = self.contentType, **self.params()
+            )['UploadId']
+
+        response = S3Client.upload_part(
+            Bucket     = self.uri.Bucket,
+            Key        = self.uri.Key,
+            UploadId   = self.uploadId,
+            PartNumber = len(self.parts) + 1,
+            Body       = bytes(self.buffer),
+        )
+
+        self.parts.append({'PartNumber' : len(self.parts) + 1, 'ETag' : response['ETag']})
+        self.Stored += len(self.buffer)
+        self.buffer  = bytearray()
+
+    def params(self) -> Dict:
+
+        return {'ContentEncoding' : self.encoding} if self.encoding else {}
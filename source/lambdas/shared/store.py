@@ -5,6 +5,7 @@ from shared.environ import STORE_BUCKET
 from shared.defines import *
 from shared.loggers import Logger
 from shared.clients import S3Resource, S3Client
+from shared.storage import S3Uri
 
 class Store:
 
@@ -25,7 +26,7 @@ class Store:
 
     def PutFile(stage = '',  file_path = '', byte_string = b''):
         """
-        Put file into stage folder within the store.
+        Put file into stage folder within the store, JSON files compressed as S3Uri.Put chooses.
         """
 
         key      = f'{stage}/{file_path}'
@@ -33,7 +34,9 @@ class Store:
 
         Logger.info(f'Store Putting File : Bucket = {bucket}, Key = {key}')
 
-        response = S3Resource.Object(bucket_name = bucket, key = key).put(Body = byte_string)
+        contentType = 'application/json' if key.endswith('.json') else 'application/octet-stream'
+
+        response = S3Uri(Bucket = bucket, Object = key).Put(byte_string, contentType = contentType)
 
         Logger.pretty(response)
 
@@ -0,0 +1,407 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+from shared.defines   import *
+from shared.environ   import *
+from shared.helpers   import GetEnvVar, GetEnvNumber
+from shared.loggers   import Logger
+from shared.clients   import BedrockClient
+from shared.inference import Inference, PROMPT
+from shared.limiter   import RateLimiter
+from shared.storage   import S3Uri
+
+from json       import JSONDecoder
+from jsonschema import Draft202012Validator
+from re         import compile
+from time       import time
+
+class StreamAborted(Exception):
+    """
+    Raised to stop a streamed extraction early, the partial output is discarded
+    """
+
+class JsonScanner:
+    """
+    Incremental scanner of a JSON object arriving in text deltas
+
+    Only the top level value being read is held: values of top level fields are returned as they complete and
+    arrays element by element, so a table of line items is never held whole. Text before the opening brace,
+    e.g. a code fence, and after the closing brace is skipped.
+
+    A value ending within the text fed is decoded whole by the json decoder, only values split across feeds are
+    scanned character run by run.
+    """
+
+    MaxValueChars = 1024 * 1024 # a single field or element longer than this is runaway output
+
+    # runs of characters without meaning to the scanner are taken whole, within an element or a nested value
+    # only brackets and strings matter
+    Structure = compile(r'["{}\[\],:]')
+    Nested    = compile(r'["{}\[\]]')
+    StringEnd = compile(r'["\\]')
+    Value     = compile(r'\S')
+    Decoder   = JSONDecoder()
+
+    def __init__(self):
+
+        self.started  = False
+        self.Done     = False
+        self.depth    = 0
+        self.inString = False
+        self.escape   = False
+        self.mode     = 'key'
+        self.key      = None
+        self.array    = False
+        self.arrayEnd = False
+        self.items    = 0
+        self.token    = []
+        self.size     = 0
+        self.expect   = False # a field value or array element starts next
+        self.decoded  = None  # (value,) of the token when decoded whole
+
+    def append(self, text: str):
+
+        self.token.append(text)
+        self.size += len(text)
+
+        if  self.size > JsonScanner.MaxValueChars:
+            raise StreamAborted(f'Value of {self.key} Longer Than {JsonScanner.MaxValueChars} Characters')
+
+    def Feed(self, text: str):
+        """
+        Returns the JSON text of the object within text and the events it completed:
+        ('field', key, value), ('item', key, index, value), ('array', key, count) and ('end',)
+        """
+
+        events = []
+        start  = None
+        stop   = len(text)
+        index  = 0
+
+        if  self.Done:
+            return '', events
+
+        while index < len(text):
+
+            if  not self.started:
+
+                index = text.find('{', index)
+
+                if  index < 0:
+                    break
+
+                self.started, self.depth, start = True, 1, index
+                index += 1
+
+                continue
+
+            start = 0 if start is None else start
+
+            if  self.expect:
+
+                self.expect = False
+                index       = self.decode(text, index)
+
+                continue
+
+            if  self.inString:
+
+                if  self.escape:
+
+                    self.append(text[index])
+                    self.escape = False
+                    index      += 1
+
+                    continue
+
+                match = JsonScanner.StringEnd.search(text, index)
+                end   = match.start() if match else len(text)
+
+                self.append(text[index:end + 1])
+
+                # a backslash escapes the next character, a quote ends the string
+                if  match:
+                    self.escape   = text[end] == '\\'
+                    self.inString = self.escape
+
+                index = end + 1
+
+                continue
+
+            match = (JsonScanner.Structure if self.depth == 1 or (self.depth == 2 and self.array) else JsonScanner.Nested).search(text, index)
+            end   = match.start() if match else len(text)
+
+            if  end > index:
+                self.append(text[index:end])
+
+            if  not match:
+                break
+
+            ch    = text[end]
+            index = end + 1
+
+            if  ch == '"':
+
+                self.inString = True
+                self.append(ch)
+
+            elif ch in '{[':
+
+                self.depth += 1
+
+                if  self.mode == 'value' and self.depth == 2 and ch == '[' and not ''.join(self.token).strip():
+                    self.array, self.items, self.expect = True, 0, True
+                else:
+                    self.append(ch)
+
+            elif ch in '}]':
+
+                self.depth -= 1
+
+                if  self.array and self.depth == 1 and ch == ']':
+
+                    self.endItem(events)
+                    self.array, self.arrayEnd = False, True
+
+                elif self.depth == 0:
+
+                    if  self.mode == 'value':
+                        self.endValue(events)
+
+                    events.append(('end',))
+
+                    self.Done = True
+                    stop      = index
+
+                    break
+
+                else:
+                    self.append(ch)
+
+            elif ch == ',' and self.array and self.depth == 2:
+
+                self.endItem(events)
+
+                self.expect = True
+
+            elif ch == ',' and self.depth == 1:
+
+                self.endValue(events)
+
+            elif ch == ':' and self.depth == 1 and self.mode == 'key':
+
+                self.key, self.token, self.size, self.mode, self.expect = loads(''.join(self.token)), [], 0, 'value', True
+
+            else:
+                self.append(ch)
+
+        return (text[start:stop] if start is not None else ''), events
+
+    def decode(self, text: str, index: int) -> int:
+        """
+        Decodes the value starting at index whole when it ends within text, returns the index to scan on from
+        """
+
+        match = JsonScanner.Value.search(text, index)
+
+        if  not match:
+            self.expect = True
+            return len(text)
+
+        begin = match.start()
+
+        # arrays of top level fields are read element by element
+        if  text[begin] in ']}' or (text[begin] == '[' and self.depth == 1):
+            return begin
+
+        try:
+            value, end = JsonScanner.Decoder.raw_decode(text, begin)
+        except ValueError:
+            return begin
+
+        # a number cut at the end of text, e.g. '-0.' of '-0.5', decodes to a prefix of itself, a value decoded
+        # whole is followed by a separator within text
+        if  end >= len(text) or text[end] not in ' \t\r\n,]}':
+            return begin
+
+        self.append(text[begin:end])
+
+        self.decoded = (value,)
+
+        return end
+
+    def value(self):
+
+        value        = self.decoded[0] if self.decoded else loads(''.join(self.token))
+        self.decoded = None
+
+        return value
+
+    def endItem(self, events):
+
+        if  ''.join(self.token).strip():
+
+            events.append(('item', self.key, self.items, self.value()))
+
+            self.items += 1
+
+        self.token, self.size = [], 0
+
+    def endValue(self, events):
+
+        if  self.arrayEnd:
+            events.append(('array', self.key, self.items))
+        else:
+            events.append(('field', self.key, self.value()))
+
+        self.token, self.size, self.mode, self.arrayEnd = [], 0, 'key', False
+
+class StreamExtraction:
+    """
+    Extracts a document with Bedrock's streaming API, writing the JSON to the store with a multipart upload
+    as it arrives
+
+    Fields and array elements are validated against the schema as they complete. The stream is aborted, and
+    the upload with it, once more than MaxFaults values violate the schema or the output runs away: the same
+    element repeated more than MaxRepeats times in a row, more than MaxItems elements or no end of the object.
+    """
+
+    Enabled    = GetEnvVar('EXTRACT_STREAM', default = 'false').lower() == 'true'
+    MaxFaults  = GetEnvNumber('EXTRACT_STREAM_MAX_FAULTS', default = 5)
+    MaxRepeats = 20
+    MaxItems   = 10000
+
+    def __init__(self, schema: Dict):
+
+        self.schema     = schema
+        self.validators = {}
+        self.Faults     = []
+        self.Output     = {} # top level fields, arrays as their element count
+        self.Usage      = {key : 0 for key in Inference.UsageKeys}
+        self.FirstByte  = None # seconds until the first text arrived
+
+    def validator(self, key: str, item: bool) -> Draft202012Validator:
+
+        if  (key, item) not in self.validators:
+
+            schema = self.schema.get('properties', {}).get(key, {})
+
+            self.validators[(key, item)] = Draft202012Validator(schema.get('items', {}) if item else schema)
+
+        return self.validators[(key, item)]
+
+    def check(self, path: str, value, validator: Draft202012Validator):
+
+        self.Faults += [f'{path} : {error.message}' for error in validator.iter_errors(value)]
+
+        if  len(self.Faults) > StreamExtraction.MaxFaults:
+            raise StreamAborted(f'{len(self.Faults)} Schema Violations, Last {self.Faults[-1]}')
+
+    def consume(self, event, repeats: Dict):
+
+        if  event[0] == 'field':
+
+            _, key, value = event
+
+            self.Output[key] = value
+
+            self.check(f'$/{key}', value, self.validator(key, item = False))
+
+        elif event[0] == 'item':
+
+            _, key, index, value = event
+
+            repeats['count'] = repeats['count'] + 1 if value == repeats.get('last') else 0
+            repeats['last']  = value
+
+            if  repeats['count'] >= StreamExtraction.MaxRepeats:
+                raise StreamAborted(f'$/{key} : Same Element Repeated {repeats["count"] + 1} Times')
+
+            if  index >= StreamExtraction.MaxItems:
+                raise StreamAborted(f'$/{key} : More Than {StreamExtraction.MaxItems} Elements')
+
+            self.check(f'$/{key}/{index}', value, self.validator(key, item = True))
+
+        elif event[0] == 'array':
+
+            _, key, count = event
+
+            self.Output[key] = count
+
+        elif event[0] == 'end':
+
+            self.Faults += [f'$ : {key!r} is a required property' for key in self.schema.get('required', []) if key not in self.Output]
+
+    def Run(self, content: bytes, media_type: str, target: S3Uri, max_tokens = 5000, model_id: str = None, cache = False, prompt = PROMPT) -> Dict:
+        """
+        Streams the extraction of content into target, returns {'output', 'token_usage', 'faults', 'bytes', 'first_byte', 'elapsed'}
+        """
+
+        model_id = Inference.Foundation(model_id or Inference.ModelId())
+        request  = Inference.Request(content, media_type, self.schema, max_tokens = max_tokens, prompt = prompt, cache = cache)
+
+        return RateLimiter.For(model_id).Call(
+            lambda: self.stream(request, model_id, target),
+            tokens = Inference.EstimateTokens(request),
+            usage  = lambda result: result['token_usage'],
+        )
+
+    def stream(self, request: Dict, model_id: str, target: S3Uri) -> Dict:
+
+        started = time()
+        scanner = JsonScanner()
+        repeats = {'count' : 0}
+
+        self.Faults, self.Output, self.FirstByte = [], {}, None
+
+        response = BedrockClient.invoke_model_with_response_stream(
+            modelId     = Inference.Profile(model_id),
+            body        = dumps(request),
+            contentType = 'application/json',
+            accept      = 'application/json',
+        )
+
+        with target.Writer('application/json') as writer:
+
+            for event in response['body']:
+
+                chunk = loads(event['chunk']['bytes'])
+
+                if  chunk['type'] == 'message_start':
+                    self.Usage.update(Inference.Usage(chunk['message']), output_tokens = 0)
+
+                elif chunk['type'] == 'message_delta':
+                    self.Usage['output_tokens'] = chunk.get('usage', {}).get('output_tokens', 0)
+
+                elif chunk['type'] == 'content_block_delta' and chunk['delta'].get('type') == 'text_delta':
+
+                    self.FirstByte = self.FirstByte or time() - started
+
+                    if  scanner.Done:
+                        continue
+
+                    text, events = scanner.Feed(chunk['delta']['text'])
+
+                    writer.Write(text.encode('utf-8'))
+
+                    for event in events:
+                        self.consume(event, repeats)
+
+            if  not scanner.Done:
+                raise StreamAborted(f'Output Ended Before the JSON Object, {self.Usage["output_tokens"]} Output Tokens')
+
+        result = {
+            'output'      : self.Output,
+            'token_usage' : self.Usage,
+            'faults'      : self.Faults,
+            'bytes'       : writer.Bytes,
+            'first_byte'  : self.FirstByte,
+            'elapsed'     : time() - started,
+        }
+
+        Logger.info(
+            f'StreamExtraction.Run : Target = {target.Url}, Bytes = {writer.Bytes}, Faults = {len(self.Faults)}, '
+            f'Tokens = {self.Usage}, FirstByte = {self.FirstByte or 0:.2f}s, Elapsed = {result["elapsed"]:.2f}s'
+        )
+
+        return result
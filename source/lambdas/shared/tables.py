@@ -0,0 +1,272 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+from shared.defines  import *
+from shared.environ  import *
+from shared.helpers  import GetEnvVar
+from shared.loggers  import Logger
+from shared.storage  import S3Uri
+from shared.textract import TextractFormat
+
+from io     import BytesIO
+from pandas import DataFrame
+
+import pyarrow         as pa
+import pyarrow.parquet as pq
+
+class TablesFormat:
+    JSON    = 'json'
+    PARQUET = 'parquet'
+
+class Tables:
+    """
+    Extraction events gathered into frames, and events again afterwards
+
+    Every field, flattened as in the review format, is a column of the single row form frame. Arrays of objects
+    become frames, a row per item, all of them or those named, and other arrays are kept as they are. Events come
+    back in their original order, so the review format is written from the frames as it is from the extraction,
+    except that items missing a key other items have hold None for it, in line with the columns of their table.
+    """
+
+    def __init__(self, names: set = None):
+
+        self.names  = names # None frames every array of objects
+        self.order  = []    # ('field' | 'array', name)
+        self.form   = {}
+        self.arrays = {}
+        self.Frames : Dict[str, DataFrame] = {}
+
+    def Read(self, events) -> 'Tables':
+
+        for event in events:
+
+            if  event[0] == 'item':
+                self.arrays.setdefault(event[1], []).append(event[3])
+
+            elif event[0] == 'array':
+
+                _, key, _ = event
+
+                items = self.arrays.get(key, [])
+
+                if  (self.names is None or key in self.names) and items and all(isinstance(item, dict) for item in items):
+                    self.Frames[key] = DataFrame(items, dtype = object)
+                    del self.arrays[key]
+
+                self.order.append(('array', key))
+
+            elif event[0] == 'field':
+
+                for name, value in TextractFormat.Flatten(event[1], event[2]):
+                    self.form[name] = value
+                    self.order.append(('field', name))
+
+        self.Frames[TextractFormat.FormName] = DataFrame([self.form], dtype = object)
+
+        return self
+
+    @staticmethod
+    def Records(frame: DataFrame) -> List[Dict]:
+
+        columns = list(frame.columns)
+
+        return [dict(zip(columns, row)) for row in frame.where(frame.notna(), None).itertuples(index = False, name = None)]
+
+    def Events(self):
+
+        form   = next(iter(Tables.Records(self.Frames[TextractFormat.FormName])), {})
+        fields = set()
+
+        for kind, name in self.order:
+
+            if  kind == 'field':
+
+                fields.add(name)
+
+                yield ('field', name, form.get(name))
+
+                continue
+
+            items = Tables.Records(self.Frames[name]) if name in self.Frames else self.arrays.get(name, [])
+
+            for index, item in enumerate(items):
+                yield ('item', name, index, item)
+
+            yield ('array', name, len(items))
+
+        # columns added to the form, e.g. looked up values
+        for name, value in form.items():
+            if  name not in fields:
+                yield ('field', name, value)
+
+    def Write(self, writer) -> int:
+        """
+        The tables as one JSON object, fields flattened, read back with TextractFormat.Read. writer takes bytes, e.g.
+        S3Uri.Writer. Returns the items written.
+        """
+
+        parts = ['{']
+        items = 0
+        first = True
+
+        def flush():
+
+            writer.Write(''.join(parts).encode())
+
+            parts.clear()
+
+        for event in self.Events():
+
+            separator = '' if first else ', '
+
+            if  event[0] == 'field':
+                parts.append(f'{separator}{dumps(event[1])}: {dumps(event[2])}')
+
+            elif event[0] == 'item':
+
+                parts.append(f'{separator}{dumps(event[1])}: [{dumps(event[3])}' if event[2] == 0 else f', {dumps(event[3])}')
+
+                items += 1
+
+            else:
+                parts.append(']' if event[2] else f'{separator}{dumps(event[1])}: []')
+
+            first = False
+
+            if  len(parts) >= TextractFormat.RowBatch:
+                flush()
+
+        parts.append('}')
+
+        flush()
+
+        return items
+
+    @staticmethod
+    def Location(document_id: str, format: str) -> S3Uri:
+        """
+        Where the operate stage hands the tables of a document to the reshape stage
+        """
+
+        if  format == TablesFormat.PARQUET:
+            return S3Uri(Bucket = STORE_BUCKET, Prefix = f'{Stage.OPERATE}/{document_id}/tables')
+
+        return S3Uri(Bucket = STORE_BUCKET, Object = f'{Stage.OPERATE}/{document_id}/tables.json')
+
+class Columnar:
+    """
+    Tables of an extraction stored as Parquet, a file per frame under a prefix, for stages to read without parsing
+    the JSON they were extracted as
+
+    The form file lists the order of the fields and arrays, the file of each frame and the arrays kept as they are in
+    its schema metadata, so the events, and the review format written from them, come back as they were. Columns
+    holding one type of value are stored as that type, columns mixing types, lists or objects as JSON text marked in
+    the field metadata, so every value reads back as it was written.
+    """
+
+    Enabled     = GetEnvVar('COLUMNAR_TABLES', default = 'false').lower() == 'true'
+    Compression = 'zstd'
+    MediaType   = 'application/vnd.apache.parquet'
+    FormFile    = 'form.parquet'
+    Manifest    = b'x-tables'
+    Json        = b'x-json'
+
+    @staticmethod
+    def Encode(frame: DataFrame) -> pa.Table:
+
+        arrays = []
+        fields = []
+
+        for name in frame.columns:
+
+            values = frame[name].where(frame[name].notna(), None).tolist()
+            kinds  = {type(value) for value in values if value is not None}
+            array  = None
+
+            if  len(kinds) <= 1 and not kinds & {list, dict}:
+                try:
+                    array = pa.array(values)
+                except (pa.ArrowInvalid, pa.ArrowTypeError, OverflowError):
+                    pass
+
+            encoded = array is None
+
+            if  encoded:
+                array = pa.array([None if value is None else dumps(value) for value in values], pa.string())
+
+            fields.append(pa.field(str(name), array.type, metadata = {Columnar.Json : b'1'} if encoded else None))
+            arrays.append(array)
+
+        return pa.Table.from_arrays(arrays, schema = pa.schema(fields))
+
+    @staticmethod
+    def Decode(table: pa.Table) -> DataFrame:
+
+        columns = {}
+
+        for field, column in zip(table.schema, table.columns):
+
+            values = column.to_pylist()
+
+            if  field.metadata and field.metadata.get(Columnar.Json):
+                values = [None if value is None else loads(value) for value in values]
+
+            columns[field.name] = values
+
+        return DataFrame(columns, index = range(table.num_rows), dtype = object)
+
+    @staticmethod
+    def Serialize(table: pa.Table) -> bytes:
+
+        buffer = BytesIO()
+
+        pq.write_table(table, buffer, compression = Columnar.Compression)
+
+        return buffer.getvalue()
+
+    @staticmethod
+    def Write(tables: Tables, uri: S3Uri) -> int:
+        """
+        Writes the frames of tables under the prefix of uri, the form file last. Returns the bytes written.
+        """
+
+        files = {name : f'table-{index:03d}.parquet' for index, name in enumerate(name for name in tables.Frames if name != TextractFormat.FormName)}
+        size  = 0
+
+        for name, file in files.items():
+
+            body  = Columnar.Serialize(Columnar.Encode(tables.Frames[name]))
+            size += len(body)
+
+            S3Uri(Bucket = uri.Bucket, Object = f'{uri.Prefix}/{file}').Put(body, contentType = Columnar.MediaType)
+
+        manifest = {'order' : tables.order, 'files' : files, 'arrays' : tables.arrays}
+        form     = Columnar.Encode(tables.Frames[TextractFormat.FormName])
+        body     = Columnar.Serialize(form.replace_schema_metadata({Columnar.Manifest : dumps(manifest).encode()}))
+        size    += len(body)
+
+        S3Uri(Bucket = uri.Bucket, Object = f'{uri.Prefix}/{Columnar.FormFile}').Put(body, contentType = Columnar.MediaType)
+
+        Logger.info(f'Columnar.Write : Prefix = {uri.Prefix}, Frames = {len(files)}, Bytes = {size}')
+
+        return size
+
+    @staticmethod
+    def Read(uri: S3Uri) -> Tables:
+
+        def read(file: str) -> pa.Table:
+            return pq.read_table(BytesIO(S3Uri(Bucket = uri.Bucket, Object = f'{uri.Prefix}/{file}').Get()))
+
+        form     = read(Columnar.FormFile)
+        manifest = loads(form.schema.metadata[Columnar.Manifest])
+        tables   = Tables()
+
+        tables.order  = [tuple(entry) for entry in manifest['order']]
+        tables.arrays = manifest['arrays']
+        tables.Frames = {name : Columnar.Decode(read(file)) for name, file in manifest['files'].items()}
+
+        tables.Frames[TextractFormat.FormName] = Columnar.Decode(form)
+
+        tables.form = next(iter(Tables.Records(tables.Frames[TextractFormat.FormName])), {})
+
+        return tables
@@ -0,0 +1,85 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+from shared.defines import *
+from shared.environ import *
+from shared.helpers import GetEnvVar, GetEnvNumber
+from shared.loggers import Logger
+from shared.pdf     import Pdf
+
+@dataclass
+class TextLayer:
+    """
+    Text layer of a PDF laid out page by page, with the confidence that it holds everything the pages show
+    """
+
+    Pages     : List[str] = field(default_factory = list)
+    Characters: int       = 0   # characters other than spaces
+    Confidence: float     = 0.0 # the lowest of the page coverage and readable character ratios, 0 to 1
+
+    @property
+    def Usable(self) -> bool:
+        return NativeText.Enabled and self.Confidence >= NativeText.MinConfidence
+
+    @property
+    def Text(self) -> str:
+        """
+        Document sent in place of the rendered pages, one element per page so page numbers survive
+        """
+
+        return '\n'.join(f'<page number="{index}">\n{text}\n</page>' for index, text in enumerate(self.Pages, 1))
+
+class NativeText:
+    """
+    Born digital PDFs are extracted from their text layer with a text only prompt, a fraction of the input tokens
+    and latency of their pages rendered for a multimodal model
+
+    The text layer is trusted when every page has at least MinPageCharacters characters and they are readable, not
+    control, private use or replacement characters left by fonts without a unicode mapping. Images, scanned PDFs and
+    PDFs mixing scanned pages are extracted from their pages as before.
+    """
+
+    Enabled           = GetEnvVar('EXTRACT_NATIVE_TEXT', default = 'false').lower() == 'true'
+    MinConfidence     = GetEnvNumber('EXTRACT_NATIVE_TEXT_CONFIDENCE', default = 0.95, kind = float)
+    MinPageCharacters = 50
+
+    MediaType = 'text/plain'
+
+    @staticmethod
+    def IsReadable(ch: str) -> bool:
+
+        code = ord(ch)
+
+        return ch in '\n\t' or not (code < 0x20 or code == 0xFFFD or 0xE000 <= code <= 0xF8FF or 0x7F <= code < 0xA0)
+
+    @staticmethod
+    def Score(pages: List[str]) -> float:
+
+        if  not pages:
+            return 0.0
+
+        characters = ''.join(''.join(text.split()) for text in pages)
+        covered    = sum(1 for text in pages if len(''.join(text.split())) >= NativeText.MinPageCharacters)
+
+        if  not characters:
+            return 0.0
+
+        readable = sum(1 for ch in characters if NativeText.IsReadable(ch))
+
+        return min(covered / len(pages), readable / len(characters))
+
+    @staticmethod
+    def Analyze(content: bytes) -> TextLayer:
+
+        if  not Pdf.IsPdf(content):
+            return TextLayer()
+
+        pages = Pdf.Layout(content)
+        layer = TextLayer(Pages = pages, Characters = sum(len(''.join(text.split())) for text in pages), Confidence = NativeText.Score(pages))
+
+        Logger.info(
+            f'NativeText.Analyze : Pages = {len(pages)}, Characters = {layer.Characters}, '
+            f'Confidence = {layer.Confidence:.2f}, Usable = {layer.Usable}'
+        )
+
+        return layer
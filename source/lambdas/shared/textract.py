@@ -0,0 +1,277 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+from shared.defines   import *
+from shared.environ   import *
+from shared.loggers   import Logger
+from shared.storage   import S3Uri
+from shared.streaming import JsonScanner
+
+from codecs import getincrementaldecoder
+
+class TextractFormat:
+    """
+    Single pass conversion of an extraction into the Textract like table format of the human review task
+
+    Nested objects are flattened into keys joined by Separator. Every array becomes a table, its columns the keys
+    of its first element, and every other value a row of the 'formdata' form, the last table. The extraction is
+    read as scanner events, its top level arrays element by element, and the output written row by row, so a table
+    of line items is never held whole on either side.
+    """
+
+    Separator  = '_'
+    Confidence = 99.9
+    FormName   = 'formdata'
+    ChunkBytes = 64 * 1024
+    RowBatch   = 256
+
+    KeyBox   = {'top' : 0.0, 'left' : 0.0, 'width' : 0.1, 'height' : 0.02}
+    ValueBox = {'top' : 0.0, 'left' : 0.2, 'width' : 0.3, 'height' : 0.02}
+    CellBox  = {'top' : 0.0, 'left' : 0.0, 'width' : 0.0, 'height' : 0.0}
+
+    @staticmethod
+    def Events(doc: Dict):
+        """
+        The events JsonScanner reads from the text of doc, from doc already in memory
+        """
+
+        for key, value in doc.items():
+
+            if  isinstance(value, list):
+
+                for index, item in enumerate(value):
+                    yield ('item', key, index, item)
+
+                yield ('array', key, len(value))
+
+            else:
+                yield ('field', key, value)
+
+    @staticmethod
+    def Scan(chunks):
+        """
+        The events of a JSON object arriving in byte chunks
+        """
+
+        decoder = getincrementaldecoder('utf-8')()
+        scanner = JsonScanner()
+
+        for chunk in chunks:
+
+            _, events = scanner.Feed(decoder.decode(chunk))
+
+            yield from events
+
+        if  not scanner.Done:
+            raise Exception('TextractFormat.Scan : Source Holds No Complete JSON Object')
+
+    @staticmethod
+    def Read(uri: S3Uri):
+        """
+        The events of a JSON object in the store, streamed and decoded
+        """
+
+        return TextractFormat.Scan(uri.Chunks(TextractFormat.ChunkBytes))
+
+    @staticmethod
+    def Flatten(key: str, value):
+        """
+        (key, value) pairs of a nested value depth first in order, keys joined by Separator, without recursion
+        """
+
+        stack = [('', iter([(key, value)]))]
+
+        while stack:
+
+            prefix, items = stack[-1]
+
+            for name, item in items:
+
+                name = f'{prefix}{TextractFormat.Separator}{name}' if prefix else name
+
+                if  isinstance(item, dict):
+                    stack.append((name, iter(item.items())))
+                    break
+
+                yield name, item
+
+            else:
+                stack.pop()
+
+    @staticmethod
+    def Columns(item) -> List[str]:
+        return list(item.keys()) if isinstance(item, dict) else []
+
+    @staticmethod
+    def Row(item, index: int) -> List[Dict]:
+
+        values = item.values() if isinstance(item, dict) else [item]
+
+        return [
+            {'text' : value, 'confidence' : TextractFormat.Confidence, 'boundingBox' : TextractFormat.CellBox, 'tag' : f'row-{index}-r-br'}
+            for value in values
+        ]
+
+    @staticmethod
+    def FormRow(key: str, value) -> List[Dict]:
+
+        return [
+            {'text' : key,   'confidence' : TextractFormat.Confidence, 'boundingBox' : TextractFormat.KeyBox,   'tag' : f'{key.lower()}-key'},
+            {'text' : value, 'confidence' : TextractFormat.Confidence, 'boundingBox' : TextractFormat.ValueBox, 'tag' : f'{key.lower()}-value'},
+        ]
+
+    @staticmethod
+    def Parts(events):
+        """
+        The output as ('table', header), ('row', cells) and ('close',) parts in table order, headers without rows
+        """
+
+        attributes = {}
+        opened     = None
+
+        for event in events:
+
+            if  event[0] == 'item':
+
+                _, key, index, item = event
+
+                if  index == 0:
+                    opened = key
+                    yield ('table', {'tableType' : 'Table', 'name' : key, 'columnTypes' : TextractFormat.Columns(item)})
+
+                yield ('row', TextractFormat.Row(item, index))
+
+            elif event[0] == 'array':
+
+                _, key, count = event
+
+                if  not count:
+                    yield ('table', {'tableType' : 'Table', 'name' : key, 'columnTypes' : []})
+
+                opened = None
+
+                yield ('close',)
+
+            elif event[0] == 'field':
+
+                _, key, value = event
+
+                # arrays nested in objects arrive whole with their object
+                for name, item in TextractFormat.Flatten(key, value):
+
+                    if  not isinstance(item, list):
+                        attributes[name] = item
+                        continue
+
+                    yield ('table', {'tableType' : 'Table', 'name' : name, 'columnTypes' : TextractFormat.Columns(item[0]) if item else []})
+
+                    for index, element in enumerate(item):
+                        yield ('row', TextractFormat.Row(element, index))
+
+                    yield ('close',)
+
+        if  opened is not None:
+            raise Exception(f'TextractFormat.Parts : Array {opened} Not Closed')
+
+        if  attributes:
+
+            yield ('table', {'name' : TextractFormat.FormName, 'tableType' : 'Form', 'columnTypes' : ['Key', 'Value']})
+
+            for key, value in attributes.items():
+                yield ('row', TextractFormat.FormRow(key, value))
+
+            yield ('close',)
+
+    @staticmethod
+    def Metadata(document_id: str, source: S3Uri = None) -> Dict:
+        """
+        The document the reviewer sees, source when given, e.g. Document.SourceS3Uri
+        """
+
+        return {'sourceDocumentUrl' : (source or S3Uri(Bucket = STORE_BUCKET, Object = f'acquire/{document_id}')).Url}
+
+    @staticmethod
+    def Convert(events, document_id: str, header_column_types = False, source: S3Uri = None) -> Dict:
+        """
+        The output held in memory, for stages working on its tables
+        """
+
+        tables = []
+
+        for part in TextractFormat.Parts(events):
+
+            if  part[0] == 'table':
+                tables.append({**part[1], 'rows' : []})
+
+            elif part[0] == 'row':
+                tables[-1]['rows'].append(part[1])
+
+            elif header_column_types:
+                tables[-1]['headerColumnTypes'] = {}
+
+        return {
+            'numPages'   : 1,
+            'pages'      : [{'pageNumber' : 1, 'tables' : tables}],
+            'tableTypes' : [{'name' : table['tableType'], 'columnTypes' : table['columnTypes']} for table in tables],
+            'metadata'   : TextractFormat.Metadata(document_id, source),
+        }
+
+    @staticmethod
+    def Write(events, document_id: str, writer, header_column_types = False, source: S3Uri = None) -> Dict:
+        """
+        Writes the output as it is converted, the same JSON text Convert serializes to. writer takes bytes, e.g.
+        S3Uri.Writer. Only RowBatch rows and the names and columns of the tables are held. Returns the counts written.
+        """
+
+        types  = []
+        rows   = []
+        counts = {'tables' : 0, 'rows' : 0}
+        first  = True
+
+        # rows are serialized a batch at a time, one encoder call per row would cost as much as the conversion
+        def flush():
+
+            nonlocal first
+
+            if  rows:
+
+                writer.Write(f'{"" if first else ", "}{dumps(rows)[1:-1]}'.encode())
+
+                counts['rows'] += len(rows)
+                first           = False
+
+                rows.clear()
+
+        writer.Write(b'{"numPages": 1, "pages": [{"pageNumber": 1, "tables": [')
+
+        for part in TextractFormat.Parts(events):
+
+            if  part[0] == 'table':
+
+                header = dumps(part[1])
+
+                writer.Write(f'{"" if not counts["tables"] else ", "}{header[:-1]}, "rows": ['.encode())
+
+                types.append({'name' : part[1]['tableType'], 'columnTypes' : part[1]['columnTypes']})
+
+                counts['tables'] += 1
+                first             = True
+
+            elif part[0] == 'row':
+
+                rows.append(part[1])
+
+                if  len(rows) >= TextractFormat.RowBatch:
+                    flush()
+
+            else:
+
+                flush()
+
+                writer.Write(b'], "headerColumnTypes": {}}' if header_column_types else b']}')
+
+        writer.Write(f']}}], "tableTypes": {dumps(types)}, "metadata": {dumps(TextractFormat.Metadata(document_id, source))}}}'.encode())
+
+        Logger.info(f'TextractFormat.Write : DocumentID = {document_id}, Tables = {counts["tables"]}, Rows = {counts["rows"]}')
+
+        return counts
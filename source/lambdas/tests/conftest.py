@@ -0,0 +1,37 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+# Run from source/lambdas: python -m pytest tests
+#
+# Under pytest GetEnvVar answers 'dummyenv' for every variable, so the shared modules import with their defaults and
+# resource names such as STORE_BUCKET are derived from it. Clients are created on import and need a region and
+# credentials, never real ones, and moto is imported first so its stub reaches clients created on import.
+
+import os
+import pytest
+
+from moto import mock_aws
+
+os.environ.setdefault('AWS_DEFAULT_REGION',    'us-east-1')
+os.environ.setdefault('AWS_ACCESS_KEY_ID',     'testing')
+os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'testing')
+
+@pytest.fixture
+def aws():
+    """
+    AWS services stubbed by moto, the store bucket created and the cached queues forgotten
+    """
+
+    from shared.bus     import Bus
+    from shared.clients import S3Client
+    from shared.environ import STORE_BUCKET
+
+    with mock_aws():
+
+        Bus.Queue.clear()
+
+        S3Client.create_bucket(Bucket = STORE_BUCKET)
+
+        yield
+
+        Bus.Queue.clear()
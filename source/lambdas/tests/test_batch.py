@@ -0,0 +1,117 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import pytest
+
+from shared.batch    import BatchJob, BatchAwaitProcessor, LocalBatchRunner
+from shared.bus      import Bus
+from shared.clients  import DynamoDBResource, SQSResource
+from shared.database import Database
+from shared.defines  import FAIL, PASS, dumps, loads
+from shared.document import Document
+from shared.environ  import PREFIX, STORE_BUCKET, TABLE_PIPELINE
+from shared.message  import Message
+from shared.storage  import S3Uri
+
+STAGE   = 'extract'
+RECORDS = 12
+
+def respond(model_input):
+
+    if  model_input['document'] == 'doc-005.pdf':
+        raise Exception('ModelStreamErrorException')
+
+    return {'content' : [{'type' : 'text', 'text' : dumps({'total' : 1.5})}]}
+
+@pytest.fixture
+def job(aws):
+    """
+    A batch job of RECORDS running documents answered by the local runner, one record answered with an error
+    """
+
+    DynamoDBResource.create_table(
+        TableName            = TABLE_PIPELINE,
+        KeySchema            = [{'AttributeName' : 'DocumentID', 'KeyType' : 'HASH'}],
+        AttributeDefinitions = [{'AttributeName' : 'DocumentID', 'AttributeType' : 'S'}],
+        BillingMode          = 'PAY_PER_REQUEST',
+    )
+
+    Database.Cache.Clear()
+
+    SQSResource.create_queue(QueueName = f'{PREFIX}-queue-{STAGE}'.lower())
+    S3Uri(Bucket = STORE_BUCKET, Object = 'schema/invoice_schema.json').PutJSON({'type' : 'object'})
+
+    prefix    = f'batch/{STAGE}/job'
+    input_uri = S3Uri(Bucket = STORE_BUCKET, Object = f'{prefix}/input.jsonl')
+    records   = {f'R{n:010d}' : f'doc-{n:03d}.pdf' for n in range(RECORDS)}
+
+    input_uri.Put(''.join(
+        f'{dumps({"recordId" : record_id, "modelInput" : {"document" : document_id}})}\n' for record_id, document_id in records.items()
+    ).encode('utf-8'))
+
+    S3Uri(Bucket = STORE_BUCKET, Object = f'{prefix}/records.json').PutJSON(records)
+
+    job_arn = LocalBatchRunner(respond = respond).Submit(name = 'job', model_id = '', input_uri = input_uri, output_uri = None)
+
+    with Database.BulkWriter() as writer:
+        for document_id in records.values():
+            document = Document(DocumentID = document_id, StageState = f'{STAGE}#running'.title())
+            document.ExtractMap.BatchJobArn = job_arn
+            writer.PutDocument(document)
+
+    Database.Cache.Clear()
+
+    return job_arn
+
+def received():
+
+    queue    = Bus.GetQueue(STAGE)
+    messages = []
+
+    while response := queue.receive_messages(MaxNumberOfMessages = 10, MessageAttributeNames = ['All']):
+        messages += [Message(**loads(Bus.GetBody(message))) for message in response]
+        queue.delete_messages(Entries = [{'Id' : str(i), 'ReceiptHandle' : m.receipt_handle} for i, m in enumerate(response)])
+
+    return {message.DocumentID : message for message in messages}
+
+def test_fan_out_publishes_one_message_per_record(job):
+
+    BatchAwaitProcessor(stage = STAGE, timeoutMinutes = 15).fanOut(job, LocalBatchRunner().Describe(job))
+
+    messages = received()
+
+    assert sorted(messages) == [f'doc-{n:03d}.pdf' for n in range(RECORDS)]
+    assert {document_id : message.ActorGrade for document_id, message in messages.items() if message.ActorGrade != PASS} == {'doc-005.pdf' : FAIL}
+    assert all(message.MapUpdates['BatchJobArn'] == job for message in messages.values())
+
+    assert S3Uri(Bucket = STORE_BUCKET, Object = f'{STAGE}/doc-000.json').GetJSON() == {'total' : 1.5}
+
+def test_fan_out_skips_documents_moved_on(job):
+
+    document = Database.GetDocument('doc-003.pdf')
+    document.StageState = f'{STAGE}#failed'.title()
+
+    with Database.BulkWriter() as writer:
+        writer.PutDocument(document)
+
+    Database.Cache.Clear()
+
+    BatchAwaitProcessor(stage = STAGE, timeoutMinutes = 15).fanOut(job, LocalBatchRunner().Describe(job))
+
+    assert len(received()) == RECORDS - 1
+
+def test_fan_out_lease(job):
+
+    input_uri = LocalBatchRunner().Describe(job)['input']
+
+    assert BatchJob.Claim(input_uri)
+    assert not BatchJob.Claim(input_uri)
+
+    BatchJob.Release(input_uri, done = False)
+
+    assert not BatchJob.FannedOut(input_uri)
+    assert BatchJob.Claim(input_uri)
+
+    BatchJob.Release(input_uri, done = True)
+
+    assert BatchJob.FannedOut(input_uri)
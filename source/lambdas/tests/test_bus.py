@@ -0,0 +1,65 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import pytest
+
+from shared.bus     import Bus, Publisher, Encoding
+from shared.clients import SQSResource
+from shared.defines import dumps, loads
+from shared.environ import PREFIX
+
+STAGE = 'await'
+
+@pytest.fixture
+def queue(aws):
+
+    return SQSResource.create_queue(QueueName = f'{PREFIX}-queue-{STAGE}'.lower())
+
+def receive(queue):
+
+    bodies = []
+
+    while response := queue.receive_messages(MaxNumberOfMessages = 10, MessageAttributeNames = ['All']):
+        bodies += [Bus.GetBody(message) for message in response]
+        queue.delete_messages(Entries = [{'Id' : str(i), 'ReceiptHandle' : m.receipt_handle} for i, m in enumerate(response)])
+
+    return bodies
+
+def test_publisher_sends_batches(queue):
+
+    with Bus.Publisher(stage = STAGE) as publisher:
+        for n in range(25):
+            publisher.PutMessage(message_body = dumps({'DocumentID' : f'{n:03d}'}))
+
+    assert publisher.Sent    == 25
+    assert publisher.Batches == 3
+    assert publisher.Retries == 0
+
+    assert sorted(loads(body)['DocumentID'] for body in receive(queue)) == [f'{n:03d}' for n in range(25)]
+
+def test_publisher_flushes_by_size(queue):
+
+    body = 'x' * (Publisher.BatchBytes // 3)
+
+    with Bus.Publisher(stage = STAGE) as publisher:
+        for n in range(4):
+            publisher.PutMessage(message_body = body)
+
+    assert publisher.Sent    == 4
+    assert publisher.Batches == 2
+
+    assert receive(queue) == [body] * 4
+
+@pytest.mark.parametrize('body, encoding', [
+    (dumps({'text' : 'abc' * Bus.MaxMessageBytes}),                                       Encoding.GZIP),
+    (dumps({'text' : [str(n * 7919 % 100003) for n in range(Bus.MaxMessageBytes // 2)]}), Encoding.OFFLOAD),
+], ids = ['gzip', 'offload'])
+def test_publisher_encodes_oversized(queue, body, encoding):
+
+    with Bus.Publisher(stage = STAGE) as publisher:
+        publisher.PutMessage(message_body = body)
+
+    messages = queue.receive_messages(MessageAttributeNames = ['All'])
+
+    assert messages[0].message_attributes['BodyEncoding']['StringValue'] == encoding
+    assert Bus.GetBody(messages[0]) == body
@@ -0,0 +1,61 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import pytest
+
+from shared.clients  import DynamoDBResource
+from shared.database import Database, DocumentWriter
+from shared.document import Document
+from shared.environ  import TABLE_PIPELINE
+
+@pytest.fixture
+def table(aws):
+
+    Database.Cache.Clear()
+
+    yield DynamoDBResource.create_table(
+        TableName            = TABLE_PIPELINE,
+        KeySchema            = [{'AttributeName' : 'DocumentID', 'KeyType' : 'HASH'}],
+        AttributeDefinitions = [{'AttributeName' : 'DocumentID', 'AttributeType' : 'S'}],
+        BillingMode          = 'PAY_PER_REQUEST',
+    )
+
+    Database.Cache.Clear()
+
+def test_cached_once_acknowledged(table):
+
+    acknowledged = []
+
+    with Database.BulkWriter() as writer:
+
+        writer.PutDocument(Document(DocumentID = 'A.pdf', StageState = 'Extract#Running'), callback = lambda : acknowledged.append('a.pdf'))
+
+        assert 'a.pdf' not in Database.Cache
+        assert not acknowledged
+
+    assert acknowledged == ['a.pdf']
+    assert Database.Cache.Get('a.pdf')['StageState'] == 'Extract#Running'
+    assert table.get_item(Key = {'DocumentID' : 'a.pdf'})['Item']['StageState'] == 'Extract#Running'
+
+def test_batches_and_coalesces(table):
+
+    with Database.BulkWriter() as writer:
+        for n in range(DocumentWriter.BatchSize + 5):
+            writer.PutDocument(Document(DocumentID = f'{n:03d}.pdf', StageState = 'Extract#Waiting'))
+        writer.PutDocument(Document(DocumentID = f'{DocumentWriter.BatchSize:03d}.pdf', StageState = 'Extract#Running'))
+
+    assert (writer.Written, writer.Batches, writer.Coalesced) == (DocumentWriter.BatchSize + 5, 2, 1)
+    assert Database.GetDocument(f'{DocumentWriter.BatchSize:03d}.pdf').StageState == 'Extract#Running'
+
+def test_not_flushed_when_raising(table):
+
+    acknowledged = []
+
+    with pytest.raises(RuntimeError):
+        with Database.BulkWriter() as writer:
+            writer.PutDocument(Document(DocumentID = 'a.pdf'), callback = lambda : acknowledged.append('a.pdf'))
+            raise RuntimeError('actor failed')
+
+    assert not acknowledged
+    assert 'a.pdf' not in Database.Cache
+    assert 'Item' not in table.get_item(Key = {'DocumentID' : 'a.pdf'})
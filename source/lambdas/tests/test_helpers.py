@@ -0,0 +1,19 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+from shared.helpers import GetEnvNumber, GetEnvVar
+
+def test_env_number_falls_back_to_default():
+
+    # under pytest every variable reads 'dummyenv', which parses as no number
+    assert GetEnvVar('STANDBY_MAX_SECONDS', default = '120') == 'dummyenv'
+
+    assert GetEnvNumber('STANDBY_MAX_SECONDS', default = 120) == 120
+    assert GetEnvNumber('EXTRACT_NATIVE_TEXT_CONFIDENCE', default = 0.95, kind = float) == 0.95
+
+def test_env_number_parses(monkeypatch):
+
+    monkeypatch.setattr('shared.helpers.GetEnvVar', lambda name, default = None: ' 42 ')
+
+    assert GetEnvNumber('RULES_VECTOR_ROWS', default = 1000) == 42
+    assert GetEnvNumber('RULES_RESERVE_SECONDS', default = 30, kind = float) == 42.0
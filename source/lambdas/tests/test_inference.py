@@ -0,0 +1,73 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+from base64 import b64decode
+
+import pytest
+
+from shared.inference import PROMPT, SYSTEM, Inference
+
+SCHEMA = {'type' : 'object', 'properties' : {'total' : {'type' : 'number'}}}
+
+def test_request_sends_a_pdf_as_a_document():
+
+    request = Inference.Request(b'%PDF-1.7', 'application/pdf', SCHEMA, max_tokens = 6000)
+    content = request['messages'][0]['content']
+
+    assert (request['max_tokens'], request['temperature'], request['system']) == (6000, 0, SYSTEM)
+    assert content[0]['type'] == 'document'
+    assert b64decode(content[0]['source']['data']) == b'%PDF-1.7'
+    assert '"total"' in content[1]['text'] and PROMPT in content[1]['text']
+
+def test_request_sends_images_and_text():
+
+    image = Inference.Request(b'png', 'image/png', SCHEMA)['messages'][0]['content'][0]
+    text  = Inference.Request('Račun 1'.encode(), 'text/plain', SCHEMA)['messages'][0]['content'][0]
+
+    assert (image['type'], image['source']['media_type']) == ('image', 'image/png')
+    assert text == {'type' : 'text', 'text' : '<document>\nRačun 1\n</document>'}
+
+def test_request_caches_schema_and_prompt_ahead_of_the_document():
+
+    request = Inference.Request(b'%PDF-1.7', 'application/pdf', SCHEMA, note = 'Pages 3 to 4.', cache = True)
+    system  = request['system'][0]
+    content = request['messages'][0]['content']
+
+    assert system['cache_control'] == {'type' : 'ephemeral'}
+    assert system['text'].startswith(SYSTEM) and '"total"' in system['text']
+    assert content[0]['type'] == 'document'
+    assert content[1] == {'type' : 'text', 'text' : 'Pages 3 to 4.'}
+
+@pytest.mark.parametrize('model_id, foundation', [
+    ('anthropic.claude-sonnet-4-6',                   'anthropic.claude-sonnet-4-6'),
+    ('us.anthropic.claude-sonnet-4-6',                'anthropic.claude-sonnet-4-6'),
+    ('global.anthropic.claude-haiku-4-5-20251001-v1:0', 'anthropic.claude-haiku-4-5-20251001-v1:0'),
+    ('amazon.nova-pro-v1:0',                          'amazon.nova-pro-v1:0'),
+])
+def test_foundation_ids(model_id, foundation):
+
+    assert Inference.Foundation(model_id) == foundation
+
+def test_profile_ids(monkeypatch):
+
+    monkeypatch.setattr(Inference, 'CrossRegion', 'eu')
+
+    assert Inference.Profile('us.anthropic.claude-sonnet-4-6') == 'eu.anthropic.claude-sonnet-4-6'
+
+    monkeypatch.setattr(Inference, 'CrossRegion', '')
+
+    assert Inference.Profile('us.anthropic.claude-sonnet-4-6') == 'anthropic.claude-sonnet-4-6'
+
+@pytest.mark.parametrize('text', ['```json\n{"total": 1.5}\n```', '{"total": 1.5}', 'Here it is: ```{"total": 1.5}```'])
+def test_parse_output(text):
+
+    assert Inference.ParseOutput({'content' : [{'type' : 'text', 'text' : text}]}) == {'total' : 1.5}
+
+def test_parse_output_without_json():
+
+    assert Inference.ParseOutput({'content' : [{'type' : 'text', 'text' : 'no json here'}]}) is None
+
+def test_media_types():
+
+    assert Inference.MediaType('scan.JPG') == 'image/jpeg'
+    assert Inference.MediaType('invoice') == 'application/pdf'
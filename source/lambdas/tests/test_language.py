@@ -0,0 +1,46 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import pytest
+
+from shared.inference import PROMPT
+from shared.language  import Detection, LanguageDetector, Script
+
+@pytest.mark.parametrize('text, language, script', [
+    ('Račun broj 1, datum izdavanja, ukupno za platiti, iznos PDV-a', 'hr',  Script.LATIN),
+    ('Rechnung Nr. 1 für die Lieferung, Betrag und Datum der Rechnung', 'de', Script.LATIN),
+    ('Invoice number 1, the date and the total amount due',            'en',  Script.LATIN),
+    ('請求書 お支払い金額 合計',                                          'ja',  Script.KANA),
+    ('发票 金额 合计 日期',                                               'zh',  Script.HAN),
+    ('Счёт на оплату, итого к оплате',                                  'ru',  Script.CYRILLIC),
+    ('Рахунок фактура, усього їх',                                      'uk',  Script.CYRILLIC),
+])
+def test_detects_language_and_script(text, language, script):
+
+    detection = LanguageDetector.Detect(text)
+
+    assert (detection.Language, detection.Script) == (language, script)
+
+def test_nothing_detected_without_letters():
+
+    detection = LanguageDetector.Detect('12 345 678')
+
+    assert detection.Language == 'und'
+    assert detection.MaxTokens == LanguageDetector.DefaultMaxTokens
+    assert LanguageDetector.Run(b'not a pdf').Language == 'und'
+
+def test_output_budget_never_drops_below_the_default():
+
+    assert Detection(Language = 'en', Script = Script.LATIN, Characters = 100).MaxTokens == LanguageDetector.DefaultMaxTokens
+    assert Detection(Language = 'ja', Script = Script.KANA, Characters = 3000).MaxTokens == 7500
+    assert Detection(Language = 'ja', Script = Script.KANA, Characters = 10 ** 6).MaxTokens == LanguageDetector.MaxTokens
+
+def test_characters_extrapolated_from_the_pages_read():
+
+    assert LanguageDetector.Detect('abc def', scale = 4).Characters == 24
+
+def test_prompt_notes_per_language():
+
+    assert Detection().Prompt == PROMPT
+    assert Detection(Language = 'hr').Prompt.startswith(PROMPT)
+    assert Detection(Language = 'hr').Prompt != PROMPT
@@ -0,0 +1,63 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import pytest
+
+from threading import Lock
+
+from shared.clients  import S3Client
+from shared.environ  import STORE_BUCKET
+from shared.registry import Registry
+from shared.storage  import S3Uri
+
+class Entry:
+
+    def __init__(self, name, body, etag):
+
+        self.Name = name
+        self.Body = body
+        self.ETag = etag
+
+class Entries(Registry):
+
+    Entries = {}
+    Lock    = Lock()
+    TTL     = 0
+
+    @classmethod
+    def GetKey(cls, name):
+        return f'entries/{name}.json'
+
+    @classmethod
+    def Build(cls, name, body, etag):
+        return Entry(name, body, etag)
+
+@pytest.mark.parametrize('missing', ['GetKey', 'Build'])
+def test_subclass_missing_a_method_fails_when_defined(missing):
+
+    methods = {name : classmethod(lambda cls, *args : None) for name in ('GetKey', 'Build') if name != missing}
+
+    with pytest.raises(TypeError, match = missing):
+        type('Incomplete', (Registry,), methods)
+
+def test_load_and_revalidate(aws):
+
+    Entries.Entries.clear()
+
+    S3Uri(Bucket = STORE_BUCKET, Object = 'entries/a.json').PutJSON({'n' : 1})
+
+    first = Entries.Get('A')
+
+    assert (first.Name, first.Body) == ('a', {'n' : 1})
+    assert Entries.Get('a') is first
+
+    S3Uri(Bucket = STORE_BUCKET, Object = 'entries/a.json').PutJSON({'n' : 2})
+
+    assert Entries.Get('a').Body == {'n' : 2}
+
+def test_missing_object_raises(aws):
+
+    Entries.Entries.clear()
+
+    with pytest.raises(S3Client.exceptions.NoSuchKey):
+        Entries.Get('b')
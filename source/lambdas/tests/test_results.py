@@ -0,0 +1,40 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+from hashlib import sha256
+
+from shared.clients import S3Client
+from shared.environ import STORE_BUCKET
+from shared.results import ResultCache
+from shared.storage import S3Uri
+
+BODY = b'%PDF-1.7 invoice' * 1000
+
+def test_disabled_by_default():
+
+    assert not ResultCache.Enabled
+
+def test_source_hash_of_content_without_a_request(monkeypatch):
+
+    def request(**params):
+        raise AssertionError('S3 requested')
+
+    monkeypatch.setattr(S3Client, 'head_object', request)
+    monkeypatch.setattr(S3Client, 'get_object',  request)
+
+    assert ResultCache.SourceHash(S3Uri(Bucket = STORE_BUCKET, Object = 'acquire/a.pdf'), BODY) == sha256(BODY).hexdigest()
+
+def test_source_hash_fetched_when_not_loaded(aws):
+
+    S3Client.put_object(Bucket = STORE_BUCKET, Key = 'acquire/a.pdf', Body = BODY)
+    S3Client.put_object(Bucket = STORE_BUCKET, Key = 'acquire/b.pdf', Body = BODY, ChecksumAlgorithm = 'SHA256')
+
+    for key in ('acquire/a.pdf', 'acquire/b.pdf'):
+        assert ResultCache.SourceHash(S3Uri(Bucket = STORE_BUCKET, Object = key)) == sha256(BODY).hexdigest()
+
+def test_key_changes_with_any_part():
+
+    parts = {'source' : sha256(BODY).hexdigest(), 'schema' : 'a', 'model' : 'anthropic.claude-sonnet-4-6', 'max_tokens' : 5000}
+
+    assert ResultCache.Key(**parts) == ResultCache.Key(**dict(reversed(parts.items())))
+    assert ResultCache.Key(**parts) != ResultCache.Key(**{**parts, 'max_tokens' : 8192})
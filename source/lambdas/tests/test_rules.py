@@ -0,0 +1,97 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import pytest
+
+from shared.rules    import Compile, Locale, RuleSet
+from shared.tables   import Tables
+from shared.textract import TextractFormat
+
+BODY = {'rules' : [
+    {'name' : 'text',    'type' : 'normalize', 'table' : 'line_items', 'columns' : ['description', 'product_id'], 'operations' : ['nfkc', 'strip', 'collapse']},
+    {'name' : 'amounts', 'type' : 'number',    'table' : 'line_items', 'columns' : ['quantity', 'unit_price', 'total_price']},
+    {'name' : 'totals',  'type' : 'number',    'columns' : ['totals_subtotal']},
+    {'name' : 'dates',   'type' : 'date',      'columns' : ['issue_date', 'due_date']},
+    {'name' : 'lines',   'type' : 'reconcile', 'table' : 'line_items', 'subtotal' : 'totals_subtotal'},
+    {'name' : 'vendors', 'type' : 'lookup',    'column' : 'issuer_name', 'set' : {'issuer_identifier' : 'vat'},
+     'entries' : [{'name' : 'AWSome Company d.o.o.', 'aliases' : ['AWSomecompany'], 'vat' : 'HR123'}]},
+    {'name' : 'absent',  'type' : 'number',    'table' : 'line_items', 'columns' : ['nope']},
+]}
+
+def invoice():
+
+    return {
+        'issue_date' : '05.06.2024.',
+        'due_date'   : '2024年7月5日',
+        'issuer'     : {'name' : '  awsome   COMPANY d.o.o. ', 'identifier' : ''},
+        'line_items' : [
+            {'product_id' : 'ＡＢ１', 'description' : '  Widget \n big', 'quantity' : '2', 'unit_price' : '1.234,50 €', 'total_price' : '2.469,00'},
+            {'product_id' : 'X', 'description' : 'Gadget', 'quantity' : 'abc', 'unit_price' : 10.0, 'total_price' : None},
+            {'product_id' : 'Y', 'description' : 'Gadget', 'quantity' : 3, 'unit_price' : '(12,50)', 'total_price' : None},
+        ],
+        'totals'     : {'subtotal' : ''},
+    }
+
+def apply(rows: int):
+
+    Compile.VectorRows = rows
+
+    rules   = RuleSet(Name = 'invoice', Body = BODY, ETag = '')
+    tables  = Tables(rules.Tables).Read(TextractFormat.Events(invoice()))
+    results = {result.Name : result for result in rules.Apply(tables.Frames, 'hr')}
+
+    return results, tables
+
+@pytest.fixture(autouse = True)
+def vector_rows():
+
+    rows = Compile.VectorRows
+
+    yield
+
+    Compile.VectorRows = rows
+
+def test_rules_transform_the_tables():
+
+    results, tables = apply(1000)
+
+    items = Tables.Records(tables.Frames['line_items'])
+    form  = Tables.Records(tables.Frames[TextractFormat.FormName])[0]
+
+    assert [item['description'] for item in items] == ['Widget big', 'Gadget', 'Gadget']
+    assert items[0]['product_id'] == 'AB1'
+    assert [item['unit_price'] for item in items] == [1234.5, 10.0, -12.5]
+    assert items[2]['total_price'] == -37.5
+    assert (form['issue_date'], form['due_date']) == ('2024-06-05', '2024-07-05')
+    assert form['issuer_identifier'] == 'HR123'
+
+    assert results['amounts'].Faults == 1 # 'abc'
+    assert results['lines'].Changes == 1  # the third total filled, no subtotal while the second has no total
+    assert results['absent'].Skipped
+
+def test_scalar_and_vector_paths_agree():
+
+    scalar, scalar_tables = apply(1000)
+    vector, vector_tables = apply(0)
+
+    assert list(scalar_tables.Events()) == list(vector_tables.Events())
+    assert {name : (result.Changes, result.Faults, result.Skipped) for name, result in scalar.items()} == \
+           {name : (result.Changes, result.Faults, result.Skipped) for name, result in vector.items()}
+
+@pytest.mark.parametrize('value, locale, expected', [
+    ('1.234,50 €', Locale.COMMA,  (1234.5, False)),
+    ('1,234.50',   Locale.PERIOD, (1234.5, False)),
+    ('(12,50)',    Locale.COMMA,  (-12.5,  False)),
+    ('42',         Locale.PERIOD, (42,     False)),
+    ('n/a',        Locale.PERIOD, (None,   True)),
+    ('',           Locale.PERIOD, (None,   False)),
+    (12.5,         Locale.PERIOD, (None,   False)),
+])
+def test_parse_amounts(value, locale, expected):
+
+    assert Compile.Parse(value, locale[0]) == expected
+
+def test_unknown_rule_type_fails_compilation():
+
+    with pytest.raises(Exception):
+        RuleSet(Name = 'invoice', Body = {'rules' : [{'type' : 'guess'}]}, ETag = '')
@@ -0,0 +1,43 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import pytest
+
+from shared.defines import dumps
+from shared.storage import Codec, ContentEncoding, S3Uri
+
+BODY = dumps({'line_items' : [{'description' : f'Item {index % 7}', 'quantity' : index} for index in range(500)]}).encode()
+
+@pytest.mark.parametrize('encoding', [ContentEncoding.GZIP, ContentEncoding.ZSTD])
+def test_codec_round_trip(encoding):
+
+    stored = Codec.Encode(BODY, encoding)
+
+    assert len(stored) < len(BODY)
+    assert b''.join(Codec.Decode([stored], encoding)) == BODY
+
+@pytest.mark.parametrize('encoding', [ContentEncoding.GZIP, ContentEncoding.ZSTD])
+def test_codec_decodes_chunks(encoding):
+
+    stored = Codec.Encode(BODY, encoding)
+    chunks = [stored[index : index + 100] for index in range(0, len(stored), 100)]
+
+    assert b''.join(Codec.Decode(chunks, encoding)) == BODY
+
+def test_codec_encodings():
+
+    assert Codec.Encodings('') == []
+    assert Codec.Encodings('identity') == []
+    assert Codec.Encodings('gzip, zstd') == [ContentEncoding.ZSTD, ContentEncoding.GZIP]
+    assert b''.join(Codec.Decode([BODY], '')) == BODY
+
+@pytest.mark.parametrize('url, bucket, key', [
+    ('s3://store/bus/await/a.json',     'store',     'bus/await/a.json'),
+    ('s3://s3-bucket/S3/Key.json',      's3-bucket', 'S3/Key.json'),
+    ('s3://3store/nested/s3://key.pdf', '3store',    'nested/s3://key.pdf'),
+])
+def test_s3uri_from_url(url, bucket, key):
+
+    uri = S3Uri.FromUrl(url)
+
+    assert (uri.Bucket, uri.Object, uri.Url) == (bucket, key, url)
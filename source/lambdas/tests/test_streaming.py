@@ -0,0 +1,50 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import pytest
+
+from shared.defines   import dumps
+from shared.streaming import JsonScanner, StreamAborted
+from shared.textract  import TextractFormat
+
+DOC = {
+    'invoice_number' : 'INV-1',
+    'vendor'         : {'name' : 'AWSome {d.o.o.}', 'note' : 'quote " and [brackets]'},
+    'line_items'     : [{'description' : f'Item, {index}', 'total' : index * 1.5} for index in range(5)],
+    'tags'           : ['a', 'b'],
+    'empty'          : [],
+    'total'          : 7.5,
+}
+
+def scan(text: str, size: int):
+
+    scanner = JsonScanner()
+    events  = []
+
+    for index in range(0, len(text), size):
+        events += scanner.Feed(text[index : index + size])[1]
+
+    return scanner, events
+
+@pytest.mark.parametrize('size', [1, 3, 17, 10000])
+def test_scanner_events_match_the_document(size):
+
+    scanner, events = scan(f'```json\n{dumps(DOC)}\n```', size)
+
+    assert scanner.Done
+    assert events[-1] == ('end',)
+    assert events[:-1] == list(TextractFormat.Events(DOC))
+
+def test_scanner_returns_the_object_text():
+
+    scanner = JsonScanner()
+    text, _ = scanner.Feed(f'preamble {dumps(DOC)} trailing')
+
+    assert text == dumps(DOC)
+
+def test_scanner_aborts_runaway_values(monkeypatch):
+
+    monkeypatch.setattr(JsonScanner, 'MaxValueChars', 64)
+
+    with pytest.raises(StreamAborted):
+        scan(dumps({'notes' : 'x' * 1000}), 10)
@@ -0,0 +1,73 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+from shared.tables   import Columnar, Tables
+from shared.textract import TextractFormat
+
+DOC = {
+    'invoice_number' : 'INV-1',
+    'vendor'         : {'name' : 'AWSome d.o.o.', 'address' : {'city' : 'Solin'}},
+    'line_items'     : [
+        {'description' : 'Widget', 'quantity' : 2, 'price' : 1.5, 'tags' : ['a']},
+        {'description' : 'Gadget', 'quantity' : '3', 'discount' : 0.1},
+    ],
+    'notes'          : ['paid', 'thanks'],
+    'empty'          : [],
+    'total'          : 7.5,
+}
+
+class Sink:
+
+    def __init__(self):
+        self.parts = []
+
+    def Write(self, data: bytes):
+        self.parts.append(data)
+
+def test_tables_give_the_events_back():
+
+    tables = Tables().Read(TextractFormat.Events(DOC))
+
+    assert set(tables.Frames) == {'line_items', TextractFormat.FormName}
+    assert tables.arrays == {'notes' : ['paid', 'thanks']}
+
+    # items missing a key other items have hold None for it
+    assert Tables.Records(tables.Frames['line_items'])[1]['price'] is None
+
+    events = list(tables.Events())
+
+    assert ('field', 'vendor_address_city', 'Solin') in events
+    assert ('array', 'line_items', 2) in events
+    assert ('item', 'notes', 1, 'thanks') in events
+
+def test_tables_written_as_json_scan_back():
+
+    tables = Tables().Read(TextractFormat.Events(DOC))
+    sink   = Sink()
+
+    assert tables.Write(sink) == 4
+
+    copy = Tables().Read(TextractFormat.Scan(sink.parts))
+
+    assert list(copy.Events()) == list(tables.Events())
+
+def test_columnar_round_trip():
+
+    tables = Tables().Read(TextractFormat.Events(DOC))
+
+    for name, frame in tables.Frames.items():
+
+        decoded = Columnar.Decode(Columnar.Encode(frame))
+
+        assert Tables.Records(decoded) == Tables.Records(frame), name
+
+def test_columnar_keeps_types():
+
+    frame = Tables().Read(TextractFormat.Events(DOC)).Frames['line_items']
+    table = Columnar.Encode(frame)
+
+    # one type stored as that type, mixed types and lists as JSON text
+    assert str(table.schema.field('description').type) == 'string'
+    assert str(table.schema.field('price').type) == 'double'
+    assert table.schema.field('quantity').metadata == {Columnar.Json : b'1'}
+    assert table.schema.field('tags').metadata == {Columnar.Json : b'1'}
@@ -36,11 +36,13 @@ def ingestDocumentFromS3(notification):
     object       = notification['s3']['object']['key']
     create_stamp = notification['eventTime']
     priority     = object.split('/')[1] if object.count('/') > 1 else '0' # initial priority
+    schema       = object.split('/')[2] if object.count('/') > 2 else ''  # extraction schema, invoice when omitted
     # document_id  = splitext(object.split('/')[-1])[0]
     document_id  = object.split('/')[-1]
     print('document_id', document_id)
 
    #"<bucket>/acquire/<initial_priority>/<document_id>.pdf"
+   #"<bucket>/acquire/<initial_priority>/<schema_name>/<document_id>.pdf"
     
     document = Document(DocumentID = document_id)
 
@@ -51,7 +53,10 @@ def ingestDocumentFromS3(notification):
 
     document.AcquireMap.StageS3Uri = S3Uri(Bucket = bucket, Object = object)
 
-    Logger.info(f'S3 Trigger : Ingesting New DocumentID = {document.DocumentID}, Priority = {document.Order}')
+    if  schema:
+        document.ExtractMap.SchemaName = schema.lower()
+
+    Logger.info(f'S3 Trigger : Ingesting New DocumentID = {document.DocumentID}, Priority = {document.Order}, Schema = {document.ExtractMap.SchemaName}')
 
     Database.PutDocument(document)
 